@@ -0,0 +1,75 @@
+import asyncio
+import contextvars
+import time
+import torch
+
+
+class DynamicBatcher:
+    """Gathers concurrent single-image requests into one tensor batch.
+
+    submit() enqueues a (1, C, H, W) tensor and waits for its result. A background task
+    takes the first waiting image, keeps collecting until max_batch_size images are queued
+    or max_wait_ms has passed, then calls run_batch once on the concatenated tensor.
+    run_batch must return one result per image, in order. With an executor (see
+    api/executor.py) run_batch runs on its thread pool instead of the event loop.
+    """
+
+    def __init__(self, run_batch, max_batch_size=32, max_wait_ms=5.0, executor=None):
+        self.run_batch = run_batch
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = None
+        self.worker = None
+        self.loop = None
+
+        # Batch size histogram, useful to tune max_wait_ms
+        self.batch_sizes = {}
+
+    def _ensure_started(self):
+        # Started lazily on the serving loop (and restarted if the loop changes, e.g. in tests)
+        loop = asyncio.get_running_loop()
+        if self.worker is None or self.worker.done() or self.loop is not loop:
+            self.loop = loop
+            self.queue = asyncio.Queue()
+            # Empty context: the worker outlives the request that started it and serves all requests
+            self.worker = contextvars.Context().run(loop.create_task, self._run(self.queue))
+
+    async def submit(self, image_tensor):
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((image_tensor, future))
+        return await future
+
+    async def _collect(self, queue):
+        batch = [await queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self, queue):
+        while True:
+            batch = await self._collect(queue)
+            futures = [future for _, future in batch]
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            try:
+                batch_tensor = torch.cat([tensor for tensor, _ in batch])
+                if self.executor is not None:
+                    results = await self.executor.run(self.run_batch, batch_tensor)
+                else:
+                    results = self.run_batch(batch_tensor)
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for future, result in zip(futures, results):
+                if not future.done():
+                    future.set_result(result)
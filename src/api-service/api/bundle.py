@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+import numpy as np
+
+BUNDLE_FORMAT = 1
+MANIFEST = "manifest.json"
+
+# Bundle array name -> drug database column (imprints are stored with NaN as "")
+COLUMNS = {
+    "imprints": "splimprint",
+    "color_codes": "splcolor_text_encoded",
+    "shape_codes": "splshape_text_encoded",
+    "medicine_codes": "medicine_name_encoded",
+}
+
+
+def source_stamp(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def compile_bundle(database_csv, label_encoder_path, output_dir):
+    """Pack the drug database columns and the label encoder classes into .npy files.
+
+    Fixed-width arrays load with np.load(mmap_mode="r"), so the service neither parses the CSV
+    nor unpickles the encoder at startup. The manifest records the size and mtime of both
+    sources so a stale bundle is detected. The bundle is written to a staging directory next to
+    output_dir and only renamed into place once complete, so output_dir never holds a
+    half-written bundle.
+    """
+    import joblib
+    import pandas as pd
+
+    data = pd.read_csv(database_csv)
+    arrays = {
+        "imprints": np.array(data[COLUMNS["imprints"]].fillna("").astype(str).tolist()),
+        "color_codes": np.asarray(data[COLUMNS["color_codes"]]),
+        "shape_codes": np.asarray(data[COLUMNS["shape_codes"]]),
+        "medicine_codes": np.asarray(data[COLUMNS["medicine_codes"]]),
+    }
+    with open(label_encoder_path, 'rb') as file:
+        arrays["label_classes"] = np.asarray(joblib.load(file).classes_).astype(str)
+
+    staging_dir = output_dir.rstrip("/") + ".tmp"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+    for name, array in arrays.items():
+        np.save(os.path.join(staging_dir, f"{name}.npy"), array)
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "rows": len(data),
+        "sources": {"database_csv": source_stamp(database_csv), "label_encoder": source_stamp(label_encoder_path)},
+    }
+    with open(os.path.join(staging_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Same swap as LocalVectorStore.build: the old bundle is renamed aside, not deleted, until the
+    # new one is in place, so a crash in between leaves it intact at output_dir + ".old"
+    old_dir = output_dir.rstrip("/") + ".old"
+    if os.path.exists(output_dir):
+        shutil.rmtree(old_dir, ignore_errors=True)
+        os.replace(output_dir, old_dir)
+    os.replace(staging_dir, output_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return manifest
+
+
+class LabelClasses:
+    """Drop-in for the fitted LabelEncoder at inference time: only inverse_transform is needed."""
+
+    def __init__(self, classes):
+        self.classes_ = classes
+
+    def inverse_transform(self, y):
+        return self.classes_[np.asarray(y)]
+
+
+class DrugBundle:
+    """Memory-mapped drug database bundle written by compile_bundle()."""
+
+    def __init__(self, bundle_dir):
+        self.bundle_dir = bundle_dir
+        with open(os.path.join(bundle_dir, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"Unsupported bundle format {self.manifest.get('format')} in {bundle_dir}")
+
+        arrays = {
+            name: np.load(os.path.join(bundle_dir, f"{name}.npy"), mmap_mode="r")
+            for name in list(COLUMNS) + ["label_classes"]
+        }
+        self.imprints = arrays["imprints"]
+        self.color_codes = arrays["color_codes"]
+        self.shape_codes = arrays["shape_codes"]
+        self.medicine_codes = arrays["medicine_codes"]
+        self.label_encoder = LabelClasses(arrays["label_classes"])
+
+    @staticmethod
+    def exists(bundle_dir):
+        return os.path.exists(os.path.join(bundle_dir, MANIFEST))
+
+    def is_fresh(self, database_csv, label_encoder_path):
+        """False if a source file present on disk differs from the one the bundle was built from."""
+        sources = self.manifest["sources"]
+        for key, path in [("database_csv", database_csv), ("label_encoder", label_encoder_path)]:
+            if not os.path.exists(path):
+                continue  # bundle-only deployment
+            stamp = source_stamp(path)
+            if (stamp["size"], stamp["mtime_ns"]) != (sources[key]["size"], sources[key]["mtime_ns"]):
+                return False
+        return True
@@ -0,0 +1,48 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class ServerBusy(Exception):
+    """Raised when the inference pipeline already has max_in_flight requests."""
+
+
+class BoundedExecutor:
+    """Runs the CPU-bound inference stages off the asyncio event loop.
+
+    Stages (image decoding, torch forwards, OCR, drug matching) run on a fixed thread pool
+    so the event loop keeps serving other connections. admit() bounds the number of requests
+    in the pipeline: max_workers running plus max_queue waiting. Beyond that, requests are
+    rejected immediately with ServerBusy instead of queueing without limit.
+
+    admit() and run() must be called from the event loop thread, which owns the counter.
+    """
+
+    def __init__(self, max_workers=4, max_queue=32):
+        self.max_workers = max_workers
+        self.max_in_flight = max_workers + max_queue
+        self.in_flight = 0
+        self.rejected = 0
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="infer")
+
+    @contextmanager
+    def admit(self):
+        if self.in_flight >= self.max_in_flight:
+            self.rejected += 1
+            raise ServerBusy(f"{self.in_flight} requests in flight")
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    async def run(self, fn, *args, **kwargs):
+        # Carry the caller's context into the thread so per-request state (stage timings) follows
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.pool, functools.partial(context.run, fn, *args, **kwargs))
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
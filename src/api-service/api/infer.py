@@ -1,19 +1,36 @@
-from fastapi import FastAPI, UploadFile, HTTPException
+from fastapi import FastAPI, UploadFile, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 import torch
 from torchvision import transforms
 from PIL import Image
-from paddleocr import PaddleOCR
-from Levenshtein import distance as levenshtein_distance
 import numpy as np
-import pandas as pd
-import joblib
+import asyncio
+import hashlib
+import io
 import os
+import threading
+import time
+from typing import List
+from api.bundle import DrugBundle
+from api.drug_index import DrugIndex
+from api.batcher import DynamicBatcher
+from api.executor import BoundedExecutor, ServerBusy
+from api.model import artifact_path, load_artifact, load_classifier
+from api.perf import autocast, bf16_supported, channels_last, compile_model
+from api.ocr_pool import OCRPool
+from api.result_cache import ResultCache
+from api.metrics import Metrics
+from api.profiler import SlowRequestProfiler
 
 # Initialize FastAPI app
 app = FastAPI()
 
-# Load models and configurations at startup
+# Upper limit for the number of ranked drugs returned by /infer/
+MAX_TOP_K = 50
+
+# Configuration is read at import; models, database and OCR are loaded by load() in the
+# background after startup so uvicorn accepts connections (and liveness probes) immediately
 class InferConfig:
     def __init__(self):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -23,98 +40,474 @@ class InferConfig:
         self.shape_model_path = os.getenv("SHAPE_MODEL_PATH", "shape_model.pth")
         self.database_csv = os.getenv("DATABASE_CSV", "drug_database.csv")
         self.label_encoder_path = os.getenv("LABEL_ENCODER_PATH", "label_encoder.pkl")
+        # Memory-mapped database/label bundle built by compile_bundle.py; the CSV is used without it
+        self.drug_bundle_dir = os.getenv("DRUG_BUNDLE_DIR", "drug_bundle")
+        # Optional shared-backbone checkpoint; when absent the two separate models are used
+        self.multihead_model_path = os.getenv("MULTIHEAD_MODEL_PATH", "")
+        # Which export of the checkpoints to serve: pth (the checkpoint itself), torchscript or int8
+        # (written by export_model.py in src/models next to each checkpoint; int8 runs on CPU only)
+        self.model_artifact = os.getenv("MODEL_ARTIFACT", "pth")
+        if self.model_artifact == "int8":
+            self.device = torch.device("cpu")
+
+        # Opt-in performance mode: bfloat16 autocast, channels_last and torch.compile of the classifiers
+        self.perf_mode = os.getenv("INFER_PERF_MODE", "0") == "1"
+        self.use_bf16 = False
+
+        # Dynamic batching of concurrent /infer/ requests
+        self.batch_max_size = int(os.getenv("BATCH_MAX_SIZE", "32"))
+        self.batch_max_wait_ms = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+        # Most images one /infer/batch request may send; it holds a single admission slot for all of them
+        self.max_batch_files = int(os.getenv("MAX_BATCH_FILES", "32"))
+
+        # CPU-bound stages run on a bounded thread pool; excess requests get 503
+        self.infer_workers = int(os.getenv("INFER_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.infer_max_queue = int(os.getenv("INFER_MAX_QUEUE", "32"))
+        self.retry_after_seconds = int(os.getenv("RETRY_AFTER_SECONDS", "1"))
+
+        # OCR worker processes; 0 keeps a single in-process PaddleOCR instance
+        self.ocr_workers = int(os.getenv("OCR_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.ocr_timeout_seconds = float(os.getenv("OCR_TIMEOUT_SECONDS", "60"))
+
+        # Result cache for resubmitted images; RESULT_CACHE_SIZE=0 disables it
+        self.result_cache_size = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+        self.result_cache_max_mb = float(os.getenv("RESULT_CACHE_MAX_MB", "64"))
+        self.result_cache_ttl_seconds = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+        self.result_cache_mode = os.getenv("RESULT_CACHE_MODE", "exact")  # exact or phash
+        self.result_cache_phash_distance = int(os.getenv("RESULT_CACHE_PHASH_DISTANCE", "4"))
+
+        # Stage timers for /metrics and Server-Timing; optional flamegraph dumps of slow requests
+        self.metrics_enabled = os.getenv("METRICS_ENABLED", "1") == "1"
+        self.profile_slow_request_ms = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "0"))  # 0 disables
+        self.profile_interval_ms = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+        self.profile_dir = os.getenv("PROFILE_DIR", "/tmp/infer-profiles")
+
+        # Set by load()
+        self.ready = threading.Event()
+        self.load_error = None
+        self.startup_seconds = {}
+        self.multihead_model = None
+        self.color_model = None
+        self.shape_model = None
+        self.drug_index = None
+        self.medicine_name_list = None
+        self.label_encoder = None
+        self.ocr = None
+        self.ocr_pool = None
+        self.ocr_lock = threading.Lock()
+
+    def use_multihead(self):
+        return bool(self.multihead_model_path) and os.path.exists(self.model_file(self.multihead_model_path))
+
+    def model_file(self, model_path):
+        return artifact_path(model_path, self.model_artifact)
+
+    def load(self):
+        """Load everything /infer/ needs, then mark the service ready. Runs once, in a background thread."""
+        steps = [("database", self.load_database), ("models", self.load_models), ("ocr", self.load_ocr)]
+        try:
+            for name, step in steps:
+                start = time.perf_counter()
+                step()
+                self.startup_seconds[name] = time.perf_counter() - start
+                print(f"Loaded {name} in {self.startup_seconds[name]:.2f}s")
+            self.ready.set()
+        except Exception as e:
+            self.load_error = repr(e)
+            print(f"Startup failed: {self.load_error}")
+
+    def load_database(self):
+        bundle = DrugBundle(self.drug_bundle_dir) if DrugBundle.exists(self.drug_bundle_dir) else None
+        if bundle is not None and not bundle.is_fresh(self.database_csv, self.label_encoder_path):
+            print(f"{self.drug_bundle_dir} was built from a different {self.database_csv}/{self.label_encoder_path}, using the CSV")
+            bundle = None
+
+        if bundle is not None:
+            imprints = bundle.imprints.tolist()
+            color_codes, shape_codes = bundle.color_codes, bundle.shape_codes
+            self.medicine_name_list = bundle.medicine_codes
+            self.label_encoder = bundle.label_encoder
+        else:
+            # Slow path: parse the CSV and unpickle the encoder (imported here, only this path needs them)
+            import joblib
+            import pandas as pd
+            database_data = pd.read_csv(self.database_csv)
+            imprints = database_data['splimprint'].fillna("").tolist()
+            color_codes = np.array(database_data['splcolor_text_encoded'].tolist())
+            shape_codes = np.array(database_data['splshape_text_encoded'].tolist())
+            self.medicine_name_list = np.array(database_data['medicine_name_encoded'].tolist())
+            with open(self.label_encoder_path, 'rb') as file:
+                self.label_encoder = joblib.load(file)
+
+        # Precompute imprint/color/shape lookup structures once instead of per request
+        self.drug_index = DrugIndex(imprints, color_codes, shape_codes, self.medicine_name_list)
 
-        # Load models
-        self.color_model = self.load_model(self.color_model_path)
-        self.shape_model = self.load_model(self.shape_model_path)
+    def load_models(self):
+        # One multi-head pass if available, else the existing two-model checkpoints
+        if self.use_multihead() and self.model_artifact != "pth":
+            self.multihead_model = load_artifact(self.model_file(self.multihead_model_path), self.device)
+            models = [self.multihead_model]
+        elif self.use_multihead():
+            self.multihead_model = load_classifier(self.multihead_model_path, self.device)
+            models = [self.multihead_model]
+        else:
+            self.color_model = self.load_model(self.color_model_path)
+            self.shape_model = self.load_model(self.shape_model_path)
+            models = [self.color_model, self.shape_model]
 
-        # Load drug database
-        self.database_data = pd.read_csv(self.database_csv)
-        self.splimprint_database = self.database_data['splimprint'].fillna("").tolist()
-        self.splcolor_text_encoded = np.array(self.database_data['splcolor_text_encoded'].tolist())
-        self.splshape_text_encoded = np.array(self.database_data['splshape_text_encoded'].tolist())
-        self.medicine_name_list = np.array(self.database_data['medicine_name_encoded'].tolist())
+        warmup = torch.zeros(1, 3, 512, 512, device=self.device)
+        if self.perf_mode and self.model_artifact != "pth":
+            print(f"Performance mode applies to pth checkpoints, serving the {self.model_artifact} artifact as exported")
+            self.perf_mode = False
+        if self.perf_mode:
+            self.enable_perf_mode(models, warmup)
 
-        # Load label encoder
-        with open(self.label_encoder_path, 'rb') as file:
-            self.label_encoder = joblib.load(file)
+        # Warm-up forward so the first request does not pay for lazy kernel/allocator setup
+        # (and, in performance mode, for compilation)
+        with torch.no_grad(), autocast(self.device, self.use_bf16):
+            for model in self.forward_models():
+                model(self.prepare_batch(warmup))
 
-        # Initialize OCR
-        self.ocr = PaddleOCR(use_angle_cls=True, lang='en', use_gpu=torch.cuda.is_available())
+    def forward_models(self):
+        if self.multihead_model is not None:
+            return [self.multihead_model]
+        return [self.color_model, self.shape_model]
+
+    def enable_perf_mode(self, models, warmup):
+        # Any failure (no bf16 kernels, compiler errors) leaves the fp32 eager models in place
+        try:
+            self.use_bf16 = bf16_supported(self.device)
+            optimized = []
+            for model in models:
+                model = model.to(memory_format=torch.channels_last)
+                optimized.append(compile_model(model, channels_last(warmup)))
+            with torch.no_grad(), autocast(self.device, self.use_bf16):
+                for model in optimized:
+                    model(channels_last(warmup))
+        except Exception as e:
+            print(f"Performance mode unavailable ({e!r}), serving fp32")
+            self.perf_mode = False
+            self.use_bf16 = False
+            for model in models:
+                model.to(memory_format=torch.contiguous_format)
+            return
+        if self.multihead_model is not None:
+            (self.multihead_model,) = optimized
+        else:
+            self.color_model, self.shape_model = optimized
+        print(f"Performance mode on (bf16 autocast: {self.use_bf16})")
+
+    def prepare_batch(self, image_tensor):
+        image_tensor = image_tensor.to(self.device)
+        return channels_last(image_tensor) if self.perf_mode else image_tensor
+
+    def load_ocr(self):
+        # A pool of warmed worker processes, or one in-process instance whose calls are
+        # serialized since it is not thread-safe
+        ocr_kwargs = dict(use_angle_cls=True, lang='en', use_gpu=torch.cuda.is_available())
+        if self.ocr_workers > 0:
+            self.ocr_pool = OCRPool(self.ocr_workers, ocr_kwargs=ocr_kwargs, timeout=self.ocr_timeout_seconds)
+        else:
+            from paddleocr import PaddleOCR
+            self.ocr = PaddleOCR(**ocr_kwargs)
 
     def load_model(self, model_path):
-        return torch.load(model_path, map_location=self.device)
+        if self.model_artifact != "pth":
+            return load_artifact(self.model_file(model_path), self.device)
+        return load_classifier(model_path, self.device)
+
+    def artifact_paths(self):
+        if self.use_multihead():
+            model_paths = [self.model_file(self.multihead_model_path)]
+        else:
+            model_paths = [self.model_file(self.color_model_path), self.model_file(self.shape_model_path)]
+        bundle_manifest = os.path.join(self.drug_bundle_dir, "manifest.json")
+        return model_paths + [self.database_csv, self.label_encoder_path, bundle_manifest]
+
+    # Fingerprint of the checkpoints, database and label encoder; changes when any file is replaced
+    def artifact_version(self):
+        fingerprint = hashlib.sha256()
+        for path in self.artifact_paths():
+            try:
+                stat = os.stat(path)
+                fingerprint.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+            except OSError:
+                fingerprint.update(f"{path}:missing;".encode())
+        return fingerprint.hexdigest()
 
 config = InferConfig()
 
+metrics = Metrics(enabled=config.metrics_enabled)
+profiler = None
+if config.profile_slow_request_ms > 0:
+    profiler = SlowRequestProfiler(
+        config.profile_slow_request_ms, interval_ms=config.profile_interval_ms, output_dir=config.profile_dir
+    )
+    profiler.start()
+
 # Image preprocessing function
 def preprocess_image(image_file):
     transform = transforms.Compose([
         transforms.Resize((512, 512)),
         transforms.ToTensor(),
     ])
-    image = Image.open(image_file).convert("RGB")
-    return transform(image).unsqueeze(0)  # Add batch dimension
+    with metrics.stage("preprocess"):
+        image = Image.open(image_file).convert("RGB")
+        return transform(image).unsqueeze(0)  # Add batch dimension
 
 # Prediction function
 def predict(model, image_tensor):
-    with torch.no_grad():
-        image_tensor = image_tensor.to(config.device)
+    with torch.no_grad(), autocast(config.device, config.use_bf16):
+        image_tensor = config.prepare_batch(image_tensor)
         outputs = model(image_tensor)
         _, predicted = torch.max(outputs, 1)
     return predicted.item()
 
+# Batched prediction function: one forward pass for a (N, C, H, W) tensor
+def predict_batch(model, image_tensor):
+    with torch.no_grad(), autocast(config.device, config.use_bf16):
+        image_tensor = config.prepare_batch(image_tensor)
+        outputs = model(image_tensor)
+        _, predicted = torch.max(outputs, 1)
+    return predicted.tolist()
+
+# (color, shape) predictions for every image in the batch
+def predict_color_shape(image_tensor):
+    with metrics.stage("predict_batch"):
+        if config.multihead_model is not None:
+            with torch.no_grad(), autocast(config.device, config.use_bf16):
+                color_outputs, shape_outputs = config.multihead_model(config.prepare_batch(image_tensor))
+                _, color_predicted = torch.max(color_outputs, 1)
+                _, shape_predicted = torch.max(shape_outputs, 1)
+            return list(zip(color_predicted.tolist(), shape_predicted.tolist()))
+        return list(zip(predict_batch(config.color_model, image_tensor), predict_batch(config.shape_model, image_tensor)))
+
+executor = BoundedExecutor(max_workers=config.infer_workers, max_queue=config.infer_max_queue)
+batcher = DynamicBatcher(
+    predict_color_shape, max_batch_size=config.batch_max_size, max_wait_ms=config.batch_max_wait_ms, executor=executor
+)
+
+result_cache = ResultCache(
+    max_entries=config.result_cache_size,
+    max_bytes=int(config.result_cache_max_mb * 1024 * 1024),
+    ttl_seconds=config.result_cache_ttl_seconds,
+    mode=config.result_cache_mode,
+    max_distance=config.result_cache_phash_distance,
+    version_fn=config.artifact_version,
+)
+
+# Extract imprint using OCR on the in-memory image bytes
+def extract_imprint(image_bytes):
+    with metrics.stage("ocr"):
+        if config.ocr_pool is not None:
+            ocr_result = config.ocr_pool.ocr(image_bytes)
+        else:
+            with config.ocr_lock:
+                ocr_result = config.ocr.ocr(image_bytes, cls=True)
+    ocr_res = ""
+    if ocr_result[0]:
+        res = sorted(ocr_result, key=lambda line: (line[0][0][0], line[0][0][1]))
+        ocr_res = ";".join(line[1][0] for line in res[0])  # Join all labels with ';'
+    return ocr_res
+
+# Match predictions with the database and decode all ranked names at once
+def identify_drug(color_prediction, shape_prediction, ocr_res, top_k):
+    with metrics.stage("match"):
+        rows, breakdown = config.drug_index.top_k(ocr_res, color_prediction, shape_prediction, top_k)
+    with metrics.stage("decode"):
+        medicine_names = config.label_encoder.inverse_transform(config.medicine_name_list[rows])
+    top_matches = [
+        {"drug_name": str(name), **{key: float(values[i]) for key, values in breakdown.items()}}
+        for i, name in enumerate(medicine_names)
+    ]
+
+    return {
+        "predicted_color": color_prediction,
+        "predicted_shape": shape_prediction,
+        "predicted_imprint": ocr_res,
+        "identified_drug_name": medicine_names[0],
+        "top_matches": top_matches
+    }
+
 # Root endpoint
 @app.get("/")
 async def root():
     return {"message": "Welcome to the drug identification service!"}
 
+# Liveness: the process is up and startup has not failed
+@app.get("/healthz")
+async def healthz():
+    if config.load_error is not None:
+        raise HTTPException(status_code=503, detail=f"Startup failed: {config.load_error}")
+    return {"status": "alive"}
+
+# Readiness: models, database and OCR are loaded and warmed
+@app.get("/ready")
+async def ready():
+    if not config.ready.is_set():
+        raise HTTPException(status_code=503, detail={"ready": False, "loaded": config.startup_seconds})
+    return {"ready": True, "startup_seconds": config.startup_seconds}
+
+@app.on_event("startup")
+def start_loading():
+    threading.Thread(target=config.load, name="infer-startup", daemon=True).start()
+
+# OCR worker pool queue depth and per-worker latency
+@app.get("/ocr/stats")
+async def ocr_stats():
+    if config.ocr_pool is None:
+        return {"size": 0, "in_process": config.ocr is not None}
+    return config.ocr_pool.stats()
+
+# Result cache hit/miss counters and size
+@app.get("/cache/stats")
+async def cache_stats():
+    return result_cache.stats()
+
+# Prometheus metrics: stage/request latency histograms plus executor, batcher, cache and OCR pool state
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    cache = result_cache.stats()
+    gauges = [
+        ("infer_ready", "gauge", "1 once models, database and OCR are loaded.", [((), int(config.ready.is_set()))]),
+        ("infer_startup_seconds", "gauge", "Time spent loading each startup step.",
+         [((("step", step),), seconds) for step, seconds in config.startup_seconds.items()]),
+        ("infer_in_flight", "gauge", "Requests admitted to the executor.", [((), executor.in_flight)]),
+        ("infer_rejected_total", "counter", "Requests rejected with 503.", [((), executor.rejected)]),
+        ("infer_batches_total", "counter", "Dynamic batches run, by batch size.",
+         [((("size", size),), count) for size, count in sorted(batcher.batch_sizes.items())]),
+        ("result_cache_entries", "gauge", "Cached results.", [((), cache["entries"])]),
+        ("result_cache_bytes", "gauge", "Estimated size of cached results.", [((), cache["bytes"])]),
+        ("result_cache_lookups_total", "counter", "Result cache lookups by outcome.",
+         [((("result", "hit"),), cache["hits"]), ((("result", "near_hit"),), cache["near_hits"]),
+          ((("result", "miss"),), cache["misses"])]),
+    ]
+    if config.ocr_pool is not None:
+        ocr = config.ocr_pool.stats()
+        gauges += [
+            ("ocr_queue_depth", "gauge", "Requests waiting for an OCR worker.", [((), ocr["queue_depth"])]),
+            ("ocr_worker_restarts_total", "counter", "OCR workers restarted after a crash or timeout.",
+             [((), ocr["restarts"])]),
+        ]
+    if profiler is not None:
+        gauges.append(("slow_request_profiles_total", "counter", "Flamegraphs dumped for slow requests.",
+                       [((), profiler.dumps)]))
+    return metrics.render(gauges)
+
+# Request latency histogram, opt-in Server-Timing header ("X-Server-Timing: 1") and slow-request profiles
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    timings = metrics.start_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    end = time.perf_counter()
+
+    path = request.url.path if request.url.path in ("/infer/", "/infer/batch") else "other"
+    metrics.observe_request(path, end - start)
+    if request.headers.get("x-server-timing") == "1":
+        response.headers["Server-Timing"] = metrics.server_timing(timings, end - start)
+    if profiler is not None and path != "other" and profiler.is_slow(start, end):
+        # Collecting the samples and writing the file happen off the event loop
+        await asyncio.to_thread(profiler.maybe_dump, start, end, path)
+    return response
+
+@app.on_event("shutdown")
+def shutdown():
+    if profiler is not None:
+        profiler.stop()
+    if config.ocr_pool is not None:
+        config.ocr_pool.close()
+    executor.shutdown()
+
+# 503 with Retry-After while the background startup is still loading
+def not_ready():
+    return HTTPException(
+        status_code=503,
+        detail="Service is starting, retry later.",
+        headers={"Retry-After": str(config.retry_after_seconds)}
+    )
+
+# 503 with Retry-After when the executor already holds max_in_flight requests
+def server_busy():
+    return HTTPException(
+        status_code=503,
+        detail="Inference queue is full, retry later.",
+        headers={"Retry-After": str(config.retry_after_seconds)}
+    )
+
+# OCR and drug matching for one image, run on the executor
+def ocr_and_identify(image_bytes, color_prediction, shape_prediction, top_k):
+    return identify_drug(color_prediction, shape_prediction, extract_imprint(image_bytes), top_k)
+
+# Preprocessing, predictions, OCR and matching for many images, run on the executor.
+# Cached images are answered directly; only the misses go through the models.
+def infer_many(images, top_k):
+    with metrics.stage("cache"):
+        cache_keys = [result_cache.make_key(image_bytes) for image_bytes in images]
+        results = [result_cache.get(cache_key, top_k) for cache_key in cache_keys]
+    misses = [i for i, result in enumerate(results) if result is None]
+    if not misses:
+        return results
+
+    image_tensor = torch.cat([preprocess_image(io.BytesIO(images[i])) for i in misses])
+
+    predictions = []
+    for start in range(0, len(misses), config.batch_max_size):
+        predictions.extend(predict_color_shape(image_tensor[start:start + config.batch_max_size]))
+
+    for i, (color_prediction, shape_prediction) in zip(misses, predictions):
+        results[i] = ocr_and_identify(images[i], color_prediction, shape_prediction, top_k)
+        result_cache.put(cache_keys[i], top_k, results[i])
+    return results
+
 # Inference endpoint
 @app.post("/infer/")
-async def infer(file: UploadFile):
+async def infer(file: UploadFile, top_k: int = Query(1, ge=1, le=MAX_TOP_K)):
+    if not config.ready.is_set():
+        raise not_ready()
     try:
-        # Preprocess image
-        image_tensor = preprocess_image(file.file)
-
-        # Run predictions
-        color_prediction = predict(config.color_model, image_tensor)
-        shape_prediction = predict(config.shape_model, image_tensor)
-
-        # Extract imprint using OCR
-        ocr_result = config.ocr.ocr(file.file.name, cls=True)
-        ocr_res = ""
-        if ocr_result[0]:
-            res = sorted(ocr_result, key=lambda line: (line[0][0][0], line[0][0][1]))
-            ocr_res = ";".join(line[1][0] for line in res[0])  # Join all labels with ';'
-
-        # Match predictions with the database
-        color_matches = (config.splcolor_text_encoded == color_prediction).astype(np.float64) * 0.5
-        shape_matches = (config.splshape_text_encoded == shape_prediction).astype(np.float64) * 0.5
-        ocr_res_len = len(ocr_res)
-        total_length = np.array([len(imprint) + ocr_res_len for imprint in config.splimprint_database])
-        edit_distances = np.array([levenshtein_distance(ocr_res, imprint) for imprint in config.splimprint_database])
-        normalize_similarity = np.where(
-            (total_length == 0) & (edit_distances == 0),
-            1,
-            np.where(total_length != 0, 1 - edit_distances / total_length, 0)
-        )
-        overlapped_scores = np.array([
-            2 * len(set(imprint) & set(ocr_res)) for imprint in config.splimprint_database
-        ])
-        overlapped_similarity = np.where(
-            (total_length == 0) & (overlapped_scores == 0),
-            1,
-            np.where(total_length != 0, overlapped_scores / total_length, 0)
+        with executor.admit():
+            # Preprocess image
+            with metrics.stage("read"):
+                image_bytes = await file.read()
+
+            # Resubmitted (or, in phash mode, near-identical) images skip the whole pipeline
+            with metrics.stage("cache"):
+                cache_key = await executor.run(result_cache.make_key, image_bytes)
+                cached = result_cache.get(cache_key, top_k)
+            if cached is not None:
+                return cached
+
+            image_tensor = await executor.run(preprocess_image, io.BytesIO(image_bytes))
+
+            # Run predictions, batched with other concurrent requests (includes the batching wait)
+            with metrics.stage("predict"):
+                color_prediction, shape_prediction = await batcher.submit(image_tensor)
+
+            result = await executor.run(ocr_and_identify, image_bytes, color_prediction, shape_prediction, top_k)
+            result_cache.put(cache_key, top_k, result)
+            return result
+    except ServerBusy:
+        raise server_busy()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Batched inference endpoint: many images, one forward pass per model per chunk
+@app.post("/infer/batch")
+async def infer_batch(files: List[UploadFile], top_k: int = Query(1, ge=1, le=MAX_TOP_K)):
+    if not config.ready.is_set():
+        raise not_ready()
+    if len(files) > config.max_batch_files:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{len(files)} files sent, at most {config.max_batch_files} images per batch request."
         )
-        score = color_matches + shape_matches + normalize_similarity + overlapped_similarity
-        idx = np.argmax(score)
-        medicine_name = config.label_encoder.inverse_transform([config.medicine_name_list[idx]])[0]
-
-        return {
-            "predicted_color": color_prediction,
-            "predicted_shape": shape_prediction,
-            "predicted_imprint": ocr_res,
-            "identified_drug_name": medicine_name
-        }
+    try:
+        with executor.admit():
+            with metrics.stage("read"):
+                images = [await file.read() for file in files]
+            return {"results": await executor.run(infer_many, images, top_k)}
+    except ServerBusy:
+        raise server_busy()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,125 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import nullcontext
+
+# Seconds; covers sub-millisecond cache lookups up to multi-second OCR on large images
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Per-request list of (stage, seconds); None outside a request. BoundedExecutor.run copies
+# the context into its threads, so stages timed there land in the calling request.
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _StageTimer:
+    # Plain context manager rather than @contextmanager: a few hundred ns cheaper per stage
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.metrics.observe("infer_stage_seconds", (("stage", self.name),), elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((self.name, elapsed))
+
+_DISABLED = nullcontext()
+
+
+def _format_labels(labels):
+    return ",".join(f'{name}="{value}"' for name, value in labels)
+
+
+class Metrics:
+    """Latency histograms for the inference stages, rendered in Prometheus text format.
+
+    stage(name) times a block and records it in the infer_stage_seconds histogram and, inside
+    a request started with start_request(), in that request's timings for Server-Timing.
+    Histograms are keyed by (metric, labels) and updated under one lock, so stages can be
+    timed from any thread. With enabled=False stage() is a no-op.
+    """
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.histograms = {}  # metric -> {labels: Histogram}
+        self.help = {
+            "infer_stage_seconds": "Time spent in each inference stage.",
+            "http_request_duration_seconds": "End-to-end request latency by path.",
+        }
+
+    def observe(self, metric, labels, seconds):
+        with self.lock:
+            series = self.histograms.setdefault(metric, {})
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def stage(self, name):
+        return _StageTimer(self, name) if self.enabled else _DISABLED
+
+    def start_request(self):
+        timings = []
+        _request_timings.set(timings)
+        return timings
+
+    def observe_request(self, path, seconds):
+        if self.enabled:
+            self.observe("http_request_duration_seconds", (("path", path),), seconds)
+
+    @staticmethod
+    def server_timing(timings, total_seconds):
+        # Repeated stages (e.g. OCR per image in /infer/batch) are summed, in first-seen order
+        durations = {}
+        for name, seconds in timings:
+            durations[name] = durations.get(name, 0.0) + seconds
+        durations["total"] = total_seconds
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in durations.items())
+
+    def render(self, gauges=()):
+        """Prometheus text exposition of the histograms plus extra samples.
+
+        gauges is an iterable of (name, type, help, [(labels, value), ...]) where labels is a
+        tuple of (label, value) pairs and type is "gauge" or "counter".
+        """
+        lines = []
+        with self.lock:
+            for metric, series in self.histograms.items():
+                lines.append(f"# HELP {metric} {self.help.get(metric, metric)}")
+                lines.append(f"# TYPE {metric} histogram")
+                for labels, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(list(self.buckets) + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        bucket_labels = _format_labels(labels + (("le", bound),))
+                        lines.append(f"{metric}_bucket{{{bucket_labels}}} {cumulative}")
+                    lines.append(f"{metric}_sum{{{_format_labels(labels)}}} {histogram.sum}")
+                    lines.append(f"{metric}_count{{{_format_labels(labels)}}} {histogram.count}")
+        for name, metric_type, help_text, samples in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{{{_format_labels(labels)}}} {value}" if labels else f"{name} {value}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,69 @@
+import os
+import pickle
+import torch
+import torch.nn as nn
+from torchvision import models
+
+
+class MultiHeadResNet(nn.Module):
+    """ResNet-18 backbone shared by a color head and a shape head.
+
+    Same definition as MultiHeadResNet in src/models/models.py, which trains it.
+    forward() returns (color_logits, shape_logits) from a single backbone pass.
+    """
+
+    def __init__(self, num_colors, num_shapes, pretrained=True):
+        super().__init__()
+        backbone = models.resnet18(pretrained=pretrained)
+        num_ftrs = backbone.fc.in_features
+        backbone.fc = nn.Identity()
+        self.backbone = backbone
+        self.color_head = nn.Linear(num_ftrs, num_colors)
+        self.shape_head = nn.Linear(num_ftrs, num_shapes)
+        self.num_colors = num_colors
+        self.num_shapes = num_shapes
+
+    def forward(self, x):
+        features = self.backbone(x)
+        return self.color_head(features), self.shape_head(features)
+
+
+def load_classifier(model_path, device):
+    """Eval model from a .pth checkpoint: a state_dict (main.py in src/models), a multi-head
+    checkpoint (save_multihead_model) or a whole pickled module (downloaded pretrained models).
+
+    Same loader as load_classifier in src/models/models.py.
+    """
+    try:
+        checkpoint = torch.load(model_path, map_location=device, weights_only=True)
+    except pickle.UnpicklingError:
+        # Only a pickled nn.Module needs full unpickling; checkpoints we write are plain tensors
+        checkpoint = torch.load(model_path, map_location=device, weights_only=False)
+    if isinstance(checkpoint, nn.Module):
+        model = checkpoint
+    elif "num_colors" in checkpoint:
+        model = MultiHeadResNet(checkpoint["num_colors"], checkpoint["num_shapes"], pretrained=False)
+        model.load_state_dict(checkpoint["state_dict"])
+    else:
+        model = models.resnet18(weights=None)
+        model.fc = nn.Linear(model.fc.in_features, checkpoint["fc.weight"].shape[0])
+        model.load_state_dict(checkpoint)
+    return model.to(device).eval()
+
+
+# Serving artifacts written by export_model.py in src/models next to each checkpoint
+ARTIFACT_SUFFIXES = {"torchscript": ".torchscript.pt", "int8": ".int8.pt"}
+
+
+def artifact_path(model_path, artifact):
+    """color_model.pth -> color_model.int8.pt; "pth" is the checkpoint itself."""
+    if artifact == "pth":
+        return model_path
+    if artifact not in ARTIFACT_SUFFIXES:
+        raise ValueError(f"Unknown model artifact {artifact!r}, expected pth or one of {sorted(ARTIFACT_SUFFIXES)}")
+    return os.path.splitext(model_path)[0] + ARTIFACT_SUFFIXES[artifact]
+
+
+def load_artifact(path, device):
+    """Loads an exported TorchScript (fp32 or int8) model."""
+    return torch.jit.load(path, map_location=device).eval()
@@ -0,0 +1,156 @@
+import multiprocessing
+import queue
+import threading
+import time
+import numpy as np
+
+
+class OCRWorkerError(Exception):
+    """Raised when an OCR worker crashed or timed out on a job."""
+
+
+def paddle_ocr_factory(**ocr_kwargs):
+    from paddleocr import PaddleOCR
+    return PaddleOCR(**ocr_kwargs)
+
+
+def _worker_main(conn, factory, ocr_kwargs):
+    # Runs in the worker process: own a warmed OCR instance and serve jobs until told to stop
+    ocr = factory(**ocr_kwargs)
+    ocr.ocr(np.full((32, 32, 3), 255, dtype=np.uint8), cls=True)
+    conn.send(("ready", None))
+    while True:
+        image_bytes = conn.recv()
+        if image_bytes is None:
+            break
+        try:
+            conn.send(("ok", ocr.ocr(image_bytes, cls=True)))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+
+class _Worker:
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.process = None
+        self.conn = None
+        self.jobs = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.last_seconds = 0.0
+
+
+class OCRPool:
+    """Pool of OCR worker processes, each owning a warmed OCR instance.
+
+    ocr() sends the in-memory image bytes to an idle worker over a pipe and blocks until
+    the result comes back, so up to `size` OCR calls run in parallel on separate cores.
+    A worker that dies or exceeds `timeout` seconds is killed and replaced with a fresh,
+    warmed process. ocr() is thread-safe and meant to be called from executor threads.
+    """
+
+    def __init__(self, size, ocr_kwargs=None, factory=paddle_ocr_factory, timeout=60.0, start_timeout=300.0):
+        self.size = size
+        self.ocr_kwargs = ocr_kwargs or {}
+        self.factory = factory
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.context = multiprocessing.get_context("spawn")
+
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.restarts = 0
+        self.idle = queue.Queue()
+        self.workers = [_Worker(worker_id) for worker_id in range(size)]
+        for worker in self.workers:
+            self._start(worker)
+        for worker in self.workers:
+            self._wait_ready(worker)
+            self.idle.put(worker)
+
+    def _start(self, worker):
+        parent_conn, child_conn = self.context.Pipe()
+        worker.conn = parent_conn
+        worker.process = self.context.Process(
+            target=_worker_main, args=(child_conn, self.factory, self.ocr_kwargs), daemon=True
+        )
+        worker.process.start()
+        child_conn.close()
+
+    def _wait_ready(self, worker):
+        try:
+            ready = worker.conn.poll(self.start_timeout) and worker.conn.recv()[0] == "ready"
+        except (EOFError, OSError):
+            ready = False
+        if not ready:
+            raise OCRWorkerError(f"OCR worker {worker.worker_id} failed to start")
+
+    def _restart(self, worker):
+        worker.process.kill()
+        worker.process.join()
+        worker.conn.close()
+        with self.lock:
+            self.restarts += 1
+        self._start(worker)
+        self._wait_ready(worker)
+
+    def ocr(self, image_bytes):
+        with self.lock:
+            self.waiting += 1
+        worker = self.idle.get()
+        with self.lock:
+            self.waiting -= 1
+
+        start = time.perf_counter()
+        try:
+            if not worker.process.is_alive():
+                self._restart(worker)
+            worker.conn.send(image_bytes)
+            if not worker.conn.poll(self.timeout):
+                raise OCRWorkerError(f"OCR worker {worker.worker_id} timed out after {self.timeout}s")
+            status, result = worker.conn.recv()
+        except (OCRWorkerError, EOFError, OSError) as e:
+            worker.errors += 1
+            self._restart(worker)
+            raise OCRWorkerError(str(e)) from e
+        finally:
+            self.idle.put(worker)
+
+        elapsed = time.perf_counter() - start
+        worker.jobs += 1
+        worker.last_seconds = elapsed
+        worker.total_seconds += elapsed
+        if status != "ok":
+            worker.errors += 1
+            raise OCRWorkerError(result)
+        return result
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "queue_depth": self.waiting,
+            "idle_workers": self.idle.qsize(),
+            "restarts": self.restarts,
+            "workers": [
+                {
+                    "worker_id": worker.worker_id,
+                    "alive": worker.process.is_alive(),
+                    "jobs": worker.jobs,
+                    "errors": worker.errors,
+                    "last_latency_ms": worker.last_seconds * 1000,
+                    "mean_latency_ms": worker.total_seconds / worker.jobs * 1000 if worker.jobs else 0.0,
+                }
+                for worker in self.workers
+            ],
+        }
+
+    def close(self):
+        for worker in self.workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.kill()
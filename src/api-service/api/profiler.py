@@ -0,0 +1,94 @@
+import collections
+import os
+import sys
+import threading
+import time
+
+# Leaf frames of threads that are idle (event loop select, parked pool threads); not worth sampling
+IDLE_FRAMES = {("selectors.py", "select"), ("threading.py", "wait"), ("thread.py", "_worker")}
+
+
+class SlowRequestProfiler:
+    """Sampling profiler that dumps a flamegraph for requests slower than threshold_ms.
+
+    A background thread samples the Python stacks of every thread each interval_ms and keeps
+    the last window_seconds of samples. After a request, maybe_dump() writes the samples taken
+    during it to output_dir in collapsed-stack format ("thread;frame;frame count"), readable by
+    flamegraph.pl or speedscope. Samples cover all threads, so concurrent requests show up in
+    each other's dumps; OCR worker processes are not sampled (their time appears as pipe waits).
+    """
+
+    def __init__(self, threshold_ms, interval_ms=5.0, output_dir="/tmp/infer-profiles", window_seconds=30.0):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.output_dir = output_dir
+        self.window = window_seconds
+        self.samples = collections.deque()  # (timestamp, collapsed stack)
+        self.labels = {}  # code object -> "function (file:line)"
+        self.dumps = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = self.labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            now = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                stacks.append(";".join(reversed(frames)))
+            with self.lock:
+                for stack in stacks:
+                    self.samples.append((now, stack))
+                while self.samples and self.samples[0][0] < now - self.window:
+                    self.samples.popleft()
+
+    def is_slow(self, start, end):
+        return end - start >= self.threshold
+
+    def maybe_dump(self, start, end, name):
+        """Write the samples taken between perf_counter() start and end if the request was slow.
+
+        Blocking (it filters the sample window and writes a file): call it from a worker thread,
+        not the event loop.
+        """
+        if not self.is_slow(start, end):
+            return None
+        with self.lock:
+            counts = collections.Counter(stack for timestamp, stack in self.samples if start <= timestamp <= end)
+            if not counts:
+                return None
+            self.dumps += 1
+        safe_name = name.strip("/").replace("/", "_") or "root"
+        path = os.path.join(self.output_dir, f"{safe_name}-{int(time.time() * 1000)}-{(end - start) * 1000:.0f}ms.folded")
+        with open(path, "w") as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
@@ -0,0 +1,188 @@
+import hashlib
+import io
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+import numpy as np
+from PIL import Image
+
+# digest: sha256 of the uploaded bytes; phash: 64-bit perceptual hash (None in exact mode)
+CacheKey = namedtuple("CacheKey", ["digest", "phash"])
+
+PHASH_SIZE = 32
+PHASH_BITS = 8
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+
+def perceptual_hash(image_bytes):
+    """64-bit DCT hash: low-frequency 8x8 DCT coefficients of a 32x32 grayscale thumbnail
+    compared against their median. Re-encoded or slightly rescaled photos of the same pill
+    land within a few bits of each other."""
+    image = Image.open(io.BytesIO(image_bytes))
+    image.draft("L", (PHASH_SIZE * 2, PHASH_SIZE * 2))  # JPEG: decode at reduced scale
+    pixels = np.asarray(image.convert("L").resize((PHASH_SIZE, PHASH_SIZE), Image.BILINEAR), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:PHASH_BITS, :PHASH_BITS].ravel()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class _Entry:
+    __slots__ = ("result", "phash", "size", "expires_at")
+
+    def __init__(self, result, phash, size, expires_at):
+        self.result = result
+        self.phash = phash
+        self.size = size
+        self.expires_at = expires_at
+
+
+class ResultCache:
+    """LRU cache of /infer/ results keyed by the uploaded image content and top_k.
+
+    Keys are the sha256 of the image bytes. In "phash" mode a miss on the exact digest falls
+    back to the closest cached perceptual hash within max_distance bits, so near-identical
+    resubmissions are served from the cache too. Entries expire after ttl_seconds, and the
+    least recently used entries are evicted beyond max_entries or max_bytes (estimated from
+    the JSON size of the result).
+
+    version_fn returns a fingerprint of the artifacts the results were computed with; it is
+    checked at most every version_check_seconds and the cache is cleared when it changes.
+    All methods are thread-safe.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl_seconds=3600.0, mode="exact",
+                 max_distance=4, version_fn=None, version_check_seconds=1.0, clock=time.monotonic):
+        if mode not in ("exact", "phash"):
+            raise ValueError(f"Unknown cache mode {mode!r}, expected 'exact' or 'phash'")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.mode = mode
+        self.max_distance = max_distance
+        self.version_fn = version_fn
+        self.version_check_seconds = version_check_seconds
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (digest, top_k) -> _Entry, least recently used first
+        self.bytes = 0
+        self.version = version_fn() if version_fn is not None else None
+        self.version_checked_at = clock()
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def make_key(self, image_bytes):
+        phash = perceptual_hash(image_bytes) if self.mode == "phash" else None
+        return CacheKey(hashlib.sha256(image_bytes).hexdigest(), phash)
+
+    def get(self, key, top_k):
+        if not self.enabled:
+            return None
+        self._check_version()
+        now = self.clock()
+        with self.lock:
+            entry_key = (key.digest, top_k)
+            entry = self.entries.get(entry_key)
+            if entry is None and key.phash is not None:
+                entry_key = self._nearest(key.phash, top_k)
+                entry = self.entries.get(entry_key)
+            if entry is not None and entry.expires_at <= now:
+                self._remove(entry_key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(entry_key)
+            if entry_key[0] == key.digest:
+                self.hits += 1
+            else:
+                self.near_hits += 1
+            return entry.result
+
+    def put(self, key, top_k, result):
+        if not self.enabled:
+            return
+        size = len(json.dumps(result, default=str)) + len(key.digest)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            entry_key = (key.digest, top_k)
+            if entry_key in self.entries:
+                self._remove(entry_key)
+            self.entries[entry_key] = _Entry(result, key.phash, size, self.clock() + self.ttl_seconds)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def _check_version(self):
+        if self.version_fn is None or self.clock() - self.version_checked_at < self.version_check_seconds:
+            return
+        version = self.version_fn()
+        with self.lock:
+            self.version_checked_at = self.clock()
+            if version != self.version:
+                self.version = version
+                self.entries.clear()
+                self.bytes = 0
+                self.invalidations += 1
+
+    def _nearest(self, phash, top_k):
+        best_key, best_distance = None, self.max_distance + 1
+        for entry_key, entry in self.entries.items():
+            if entry_key[1] != top_k or entry.phash is None:
+                continue
+            distance = hamming_distance(phash, entry.phash)
+            if distance < best_distance:
+                best_key, best_distance = entry_key, distance
+        return best_key
+
+    def _remove(self, entry_key):
+        self.bytes -= self.entries.pop(entry_key).size
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "mode": self.mode,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,96 @@
+"""
+Throughput/latency benchmark for batched color + shape inference.
+
+Part 1 runs both ResNet-18 classifiers directly on batches of size 1-64.
+Part 2 drives DynamicBatcher with concurrent single-image requests and compares it
+against one forward pass per request (max_batch_size=1).
+
+usage (from src/api-service):
+    python -m benchmarks.bench_batching --batch_sizes 1 2 4 8 16 32 64 --image_size 512
+"""
+
+import argparse
+import asyncio
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+from torchvision import models
+from api.batcher import DynamicBatcher
+
+
+def build_model(num_classes):
+    model = models.resnet18(weights=None)
+    model.fc = nn.Linear(model.fc.in_features, num_classes)
+    return model.eval()
+
+
+def make_predictor(color_model, shape_model):
+    def predict_color_shape(image_tensor):
+        with torch.no_grad():
+            colors = color_model(image_tensor).argmax(1).tolist()
+            shapes = shape_model(image_tensor).argmax(1).tolist()
+        return list(zip(colors, shapes))
+    return predict_color_shape
+
+
+def bench_batch_sizes(predict_color_shape, args):
+    print(f"{'batch':>6} {'latency ms':>11} {'images/sec':>11}")
+    for batch_size in args.batch_sizes:
+        batch = torch.rand(batch_size, 3, args.image_size, args.image_size)
+        predict_color_shape(batch)  # warm-up
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            predict_color_shape(batch)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        print(f"{batch_size:>6} {elapsed * 1000:>11.1f} {batch_size / elapsed:>11.1f}")
+
+
+async def drive_batcher(batcher, args):
+    latencies = []
+
+    async def client():
+        for _ in range(args.requests_per_client):
+            image = torch.rand(1, 3, args.image_size, args.image_size)
+            start = time.perf_counter()
+            await batcher.submit(image)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+def bench_dynamic_batcher(predict_color_shape, args):
+    print(f"\n{args.concurrency} concurrent clients x {args.requests_per_client} requests")
+    print(f"{'max batch':>10} {'images/sec':>11} {'p50 ms':>9} {'p99 ms':>9}  batch sizes")
+    for max_batch_size in [1, args.max_batch_size]:
+        batcher = DynamicBatcher(predict_color_shape, max_batch_size=max_batch_size, max_wait_ms=args.max_wait_ms)
+        elapsed, latencies = asyncio.run(drive_batcher(batcher, args))
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        print(f"{max_batch_size:>10} {len(latencies) / elapsed:>11.1f} {p50:>9.1f} {p99:>9.1f}  {dict(sorted(batcher.batch_sizes.items()))}")
+
+
+def main(args):
+    torch.set_num_threads(args.num_threads or torch.get_num_threads())
+    predict_color_shape = make_predictor(build_model(args.num_colors), build_model(args.num_shapes))
+    bench_batch_sizes(predict_color_shape, args)
+    bench_dynamic_batcher(predict_color_shape, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark batched color/shape inference.')
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64], help='Batch sizes to benchmark.')
+    parser.add_argument('--image_size', type=int, default=512, help='Input resolution (preprocess_image uses 512).')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed iterations per batch size.')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent clients for the dynamic batcher.')
+    parser.add_argument('--requests_per_client', type=int, default=4, help='Requests sent by each client.')
+    parser.add_argument('--max_batch_size', type=int, default=32, help='DynamicBatcher max_batch_size.')
+    parser.add_argument('--max_wait_ms', type=float, default=5, help='DynamicBatcher max_wait_ms.')
+    parser.add_argument('--num_colors', type=int, default=12, help='Color classes.')
+    parser.add_argument('--num_shapes', type=int, default=8, help='Shape classes.')
+    parser.add_argument('--num_threads', type=int, default=0, help='torch intra-op threads (0 keeps the default).')
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,65 @@
+"""
+Benchmark for DrugIndex.best_match (pruned) against the full scan as the drug table grows.
+
+Reports p50/p99 per-request matching latency and checks both paths pick the same row.
+
+usage (from src/api-service):
+    python -m benchmarks.bench_index --sizes 1000 10000 100000 300000
+"""
+
+import argparse
+import random
+import time
+import warnings
+import numpy as np
+from api.drug_index import DrugIndex
+from benchmarks.bench_matching import synthetic_imprints
+
+
+def percentiles(latencies):
+    return np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000
+
+
+def main(args):
+    warnings.simplefilter("ignore", RuntimeWarning)
+    rng = random.Random(0)
+
+    print(f"{'rows':>8} {'full p50':>9} {'full p99':>9} {'index p50':>10} {'index p99':>10}  (ms)")
+    for size in args.sizes:
+        imprints = synthetic_imprints(size)
+        colors = [rng.randint(0, args.num_colors - 1) for _ in range(size)]
+        shapes = [rng.randint(0, args.num_shapes - 1) for _ in range(size)]
+        index = DrugIndex(imprints, colors, shapes)
+
+        # Half the queries are real imprints (typical clean OCR), half are noisy strings
+        queries = [rng.choice(imprints) for _ in range(args.num_queries // 2)]
+        queries += synthetic_imprints(args.num_queries - len(queries), seed=size)
+
+        full_latencies = []
+        index_latencies = []
+        for query in queries:
+            color, shape = rng.randint(0, args.num_colors - 1), rng.randint(0, args.num_shapes - 1)
+
+            start = time.perf_counter()
+            expected = int(np.argmax(index.scores(query, color, shape)))
+            full_latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            actual = index.best_match(query, color, shape)
+            index_latencies.append(time.perf_counter() - start)
+            assert actual == expected
+
+        full_p50, full_p99 = percentiles(full_latencies)
+        index_p50, index_p99 = percentiles(index_latencies)
+        print(f"{size:>8} {full_p50:>9.3f} {full_p99:>9.3f} {index_p50:>10.3f} {index_p99:>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark pruned drug lookup latency.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 300000], help='Database sizes to benchmark.')
+    parser.add_argument('--num_queries', type=int, default=200, help='Number of queries per size.')
+    parser.add_argument('--num_colors', type=int, default=12, help='Number of color classes.')
+    parser.add_argument('--num_shapes', type=int, default=8, help='Number of shape classes.')
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,91 @@
+"""
+Micro-benchmark for per-request imprint matching latency against database size.
+
+Compares the original per-row Python loop from infer() with ImprintMatcher on a
+synthetic imprint database and checks that both produce identical scores.
+
+usage (from src/api-service):
+    python -m benchmarks.bench_matching --sizes 1000 10000 100000
+"""
+
+import argparse
+import random
+import string
+import time
+import warnings
+import numpy as np
+from Levenshtein import distance as levenshtein_distance
+from api.matcher import ImprintMatcher
+
+
+def synthetic_imprints(n, seed=0):
+    rng = random.Random(seed)
+    imprints = []
+    for _ in range(n):
+        if rng.random() < 0.1:
+            imprints.append("")
+            continue
+        parts = ["".join(rng.choice(string.ascii_uppercase + string.digits) for _ in range(rng.randint(1, 6)))
+                 for _ in range(rng.randint(1, 3))]
+        imprints.append(";".join(parts))
+    return imprints
+
+
+def loop_similarity(ocr_res, splimprint_database):
+    ocr_res_len = len(ocr_res)
+    total_length = np.array([len(imprint) + ocr_res_len for imprint in splimprint_database])
+    edit_distances = np.array([levenshtein_distance(ocr_res, imprint) for imprint in splimprint_database])
+    normalize_similarity = np.where(
+        (total_length == 0) & (edit_distances == 0),
+        1,
+        np.where(total_length != 0, 1 - edit_distances / total_length, 0)
+    )
+    overlapped_scores = np.array([
+        2 * len(set(imprint) & set(ocr_res)) for imprint in splimprint_database
+    ])
+    overlapped_similarity = np.where(
+        (total_length == 0) & (overlapped_scores == 0),
+        1,
+        np.where(total_length != 0, overlapped_scores / total_length, 0)
+    )
+    return normalize_similarity, overlapped_similarity
+
+
+def time_per_call(fn, queries, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            fn(query)
+    return (time.perf_counter() - start) / (repeat * len(queries))
+
+
+def main(args):
+    warnings.simplefilter("ignore", RuntimeWarning)
+    queries = synthetic_imprints(args.num_queries, seed=1)
+
+    print(f"{'rows':>8} {'build ms':>10} {'loop ms':>10} {'matcher ms':>11} {'speedup':>8}")
+    for size in args.sizes:
+        database = synthetic_imprints(size)
+
+        start = time.perf_counter()
+        matcher = ImprintMatcher(database)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        for query in queries:
+            expected = loop_similarity(query, database)
+            actual = matcher.similarity(query)
+            assert np.array_equal(expected[0], actual[0]) and np.array_equal(expected[1], actual[1])
+
+        loop_ms = time_per_call(lambda q: loop_similarity(q, database), queries, args.repeat) * 1000
+        matcher_ms = time_per_call(matcher.similarity, queries, args.repeat) * 1000
+        print(f"{size:>8} {build_ms:>10.1f} {loop_ms:>10.3f} {matcher_ms:>11.3f} {loop_ms / matcher_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark imprint matching latency.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Database sizes to benchmark.')
+    parser.add_argument('--num_queries', type=int, default=20, help='Number of distinct OCR queries.')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions per query.')
+
+    args = parser.parse_args()
+    main(args)
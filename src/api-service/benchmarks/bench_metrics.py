@@ -0,0 +1,76 @@
+"""
+Overhead of the inference instrumentation in api/metrics.py and api/profiler.py.
+
+Part 1 times an empty metrics.stage() block: disabled, enabled, and enabled inside a request
+(also appending to the Server-Timing list). Part 2 runs a CPU-bound workload (imprint
+scoring over a synthetic database) with and without the slow-request sampling profiler.
+
+usage (from src/api-service):
+    python -m benchmarks.bench_metrics --iterations 200000 --interval_ms 5
+"""
+
+import argparse
+import time
+from api.matcher import ImprintMatcher
+from api.metrics import Metrics
+from api.profiler import SlowRequestProfiler
+from benchmarks.bench_matching import synthetic_imprints
+
+
+def time_stages(metrics, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with metrics.stage("ocr"):
+            pass
+    return (time.perf_counter() - start) / iterations
+
+
+def bench_stage_overhead(args):
+    print(f"{'stage() mode':>20} {'ns per call':>12}")
+    for label, enabled, in_request in [("disabled", False, False), ("enabled", True, False), ("enabled + request", True, True)]:
+        metrics = Metrics(enabled=enabled)
+        if in_request:
+            metrics.start_request()
+        per_call = time_stages(metrics, args.iterations)
+        print(f"{label:>20} {per_call * 1e9:>12.0f}")
+
+
+def run_workload(matcher, queries):
+    start = time.perf_counter()
+    for query in queries:
+        matcher.unique_similarity(query)
+    return time.perf_counter() - start
+
+
+def bench_profiler_overhead(args):
+    imprints = synthetic_imprints(args.num_drugs)
+    matcher = ImprintMatcher(imprints)
+    queries = imprints[:args.queries]
+    run_workload(matcher, queries)  # warm-up
+
+    baseline = min(run_workload(matcher, queries) for _ in range(args.repeat))
+    profiler = SlowRequestProfiler(threshold_ms=1e9, interval_ms=args.interval_ms, output_dir="/tmp/infer-profiles")
+    profiler.start()
+    profiled = min(run_workload(matcher, queries) for _ in range(args.repeat))
+    profiler.stop()
+
+    print(f"\nprofiler sampling every {args.interval_ms} ms, {args.queries} queries over {args.num_drugs} imprints")
+    print(f"  without profiler {baseline * 1000:.1f} ms, with profiler {profiled * 1000:.1f} ms "
+          f"({(profiled / baseline - 1) * 100:+.1f}%), {len(profiler.samples)} samples kept")
+
+
+def main(args):
+    bench_stage_overhead(args)
+    bench_profiler_overhead(args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark instrumentation overhead.')
+    parser.add_argument('--iterations', type=int, default=200000, help='stage() calls per mode.')
+    parser.add_argument('--num_drugs', type=int, default=20000, help='Synthetic imprints for the profiled workload.')
+    parser.add_argument('--queries', type=int, default=200, help='Imprint queries per workload run.')
+    parser.add_argument('--repeat', type=int, default=5, help='Workload runs per variant (best is reported).')
+    parser.add_argument('--interval_ms', type=float, default=5, help='Profiler sampling interval.')
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,95 @@
+"""
+Compares the two-model color/shape path with the shared-backbone MultiHeadResNet.
+
+Each variant runs in its own process so resident memory (VmRSS after loading and a
+warm-up forward) is not polluted by the other variant.
+
+usage (from src/api-service):
+    python -m benchmarks.bench_multihead --batch_sizes 1 8 32 --image_size 512
+"""
+
+import argparse
+import multiprocessing
+import time
+import torch
+import torch.nn as nn
+from torchvision import models
+from api.model import MultiHeadResNet
+
+
+def resident_memory_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def build_two_models(num_colors, num_shapes):
+    color_model = models.resnet18(weights=None)
+    color_model.fc = nn.Linear(color_model.fc.in_features, num_colors)
+    shape_model = models.resnet18(weights=None)
+    shape_model.fc = nn.Linear(shape_model.fc.in_features, num_shapes)
+    color_model.eval()
+    shape_model.eval()
+
+    def forward(image_tensor):
+        return color_model(image_tensor).argmax(1), shape_model(image_tensor).argmax(1)
+    return forward, [color_model, shape_model]
+
+
+def build_multihead(num_colors, num_shapes):
+    model = MultiHeadResNet(num_colors, num_shapes, pretrained=False).eval()
+
+    def forward(image_tensor):
+        color_outputs, shape_outputs = model(image_tensor)
+        return color_outputs.argmax(1), shape_outputs.argmax(1)
+    return forward, [model]
+
+
+def run_variant(variant, args, results):
+    torch.set_num_threads(args.num_threads or torch.get_num_threads())
+    baseline_mb = resident_memory_mb()
+    build = build_multihead if variant == "multi-head" else build_two_models
+    forward, modules = build(args.num_colors, args.num_shapes)
+    num_params = sum(p.numel() for module in modules for p in module.parameters())
+
+    latencies = {}
+    with torch.no_grad():
+        for batch_size in args.batch_sizes:
+            batch = torch.rand(batch_size, 3, args.image_size, args.image_size)
+            forward(batch)  # warm-up
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                forward(batch)
+            latencies[batch_size] = (time.perf_counter() - start) / args.repeat
+    results[variant] = (num_params, resident_memory_mb() - baseline_mb, latencies)
+
+
+def main(args):
+    context = multiprocessing.get_context("spawn")
+    manager = context.Manager()
+    results = manager.dict()
+    for variant in ["two-model", "multi-head"]:
+        process = context.Process(target=run_variant, args=(variant, args, results))
+        process.start()
+        process.join()
+
+    print(f"{'variant':>11} {'params (M)':>11} {'RSS delta MB':>13}  latency ms per batch size")
+    for variant in ["two-model", "multi-head"]:
+        num_params, rss_mb, latencies = results[variant]
+        timings = "  ".join(f"bs{batch_size}={latency * 1000:.1f}" for batch_size, latency in latencies.items())
+        print(f"{variant:>11} {num_params / 1e6:>11.2f} {rss_mb:>13.1f}  {timings}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark two-model vs multi-head inference.')
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 8, 32], help='Batch sizes to benchmark.')
+    parser.add_argument('--image_size', type=int, default=512, help='Input resolution (preprocess_image uses 512).')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed iterations per batch size.')
+    parser.add_argument('--num_colors', type=int, default=12, help='Color classes.')
+    parser.add_argument('--num_shapes', type=int, default=8, help='Shape classes.')
+    parser.add_argument('--num_threads', type=int, default=0, help='torch intra-op threads (0 keeps the default).')
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,96 @@
+"""
+Inference throughput and accuracy parity of the performance mode (INFER_PERF_MODE=1) against
+the default fp32 eager path, for one ResNet-18 classifier.
+
+Parity is measured on the same inputs: top-1 agreement with fp32 and the max absolute logit
+difference. With --checkpoint (a color/shape checkpoint from src/models) and --image_dir the
+real weights and pill photos are used; otherwise random weights and synthetic inputs, where
+agreement is a lower bound (untrained logits are close together).
+
+usage (from src/api-service):
+    python -m benchmarks.bench_perf_mode --batch_sizes 1 8 32
+    python -m benchmarks.bench_perf_mode --checkpoint model/color_model.pth --image_dir ../../data/images
+"""
+
+import argparse
+import copy
+import os
+import time
+import torch
+import torch.nn as nn
+from torchvision import models, transforms
+from PIL import Image
+from api.perf import autocast, bf16_supported, channels_last, compile_model
+
+
+def build_model(args, device):
+    if args.checkpoint:
+        model = torch.load(args.checkpoint, map_location=device)
+    else:
+        torch.manual_seed(0)
+        model = models.resnet18(weights=None)
+        model.fc = nn.Linear(model.fc.in_features, 12)
+    return model.to(device).eval()
+
+
+def parity_inputs(args):
+    if args.image_dir:
+        transform = transforms.Compose([transforms.Resize((args.image_size, args.image_size)), transforms.ToTensor()])
+        names = sorted(os.listdir(args.image_dir))[:args.parity_images]
+        return torch.stack([transform(Image.open(os.path.join(args.image_dir, name)).convert("RGB")) for name in names])
+    torch.manual_seed(1)
+    return torch.rand(args.parity_images, 3, args.image_size, args.image_size)
+
+
+def images_per_second(forward, inputs, repeats):
+    forward(inputs)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        forward(inputs)
+    return repeats * inputs.shape[0] / (time.perf_counter() - start)
+
+
+def main(args):
+    device = torch.device("cpu")
+    model = build_model(args, device)
+    use_bf16 = bf16_supported(device)
+    example = torch.zeros(1, 3, args.image_size, args.image_size)
+
+    variants = {"fp32": lambda x: model(x)}
+    perf_model = copy.deepcopy(model).to(memory_format=torch.channels_last)
+    compiled = compile_model(perf_model, channels_last(example)) if args.compile else perf_model
+
+    def perf_forward(x):
+        with autocast(device, use_bf16):
+            return compiled(channels_last(x)).float()
+    variants["perf"] = perf_forward
+    print(f"bf16 autocast: {use_bf16}, compiled: {args.compile}, threads: {torch.get_num_threads()}")
+
+    with torch.no_grad():
+        inputs = parity_inputs(args)
+        reference = torch.cat([model(batch) for batch in inputs.split(args.max_batch)])
+        candidate = torch.cat([perf_forward(batch) for batch in inputs.split(args.max_batch)])
+        agreement = (reference.argmax(1) == candidate.argmax(1)).float().mean().item()
+        max_diff = (reference - candidate).abs().max().item()
+        print(f"parity on {len(inputs)} images: top-1 agreement {agreement:.4f}, max |logit diff| {max_diff:.4f}")
+
+        print(f"\n{'batch':>6} {'fp32 img/s':>11} {'perf img/s':>11} {'speedup':>8}")
+        for batch_size in args.batch_sizes:
+            batch = torch.rand(batch_size, 3, args.image_size, args.image_size)
+            rates = {name: images_per_second(forward, batch, args.repeats) for name, forward in variants.items()}
+            print(f"{batch_size:>6} {rates['fp32']:>11.1f} {rates['perf']:>11.1f} {rates['perf'] / rates['fp32']:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the bf16/channels_last/compiled inference mode.")
+    parser.add_argument("--checkpoint", default=None, help="Full-model checkpoint (torch.save(model)); random weights if omitted.")
+    parser.add_argument("--image_dir", default=None, help="Pill photos for the parity check; synthetic inputs if omitted.")
+    parser.add_argument("--parity_images", type=int, default=256, help="Images compared against fp32.")
+    parser.add_argument("--image_size", type=int, default=512, help="Input resolution (the service resizes to 512).")
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 8, 32], help="Batch sizes to time.")
+    parser.add_argument("--max_batch", type=int, default=32, help="Batch size used for the parity pass.")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed forwards per batch size.")
+    parser.add_argument("--no-compile", dest="compile", action="store_false", help="Skip torch.compile/TorchScript.")
+
+    args = parser.parse_args()
+    main(args)
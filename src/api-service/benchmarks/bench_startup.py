@@ -0,0 +1,140 @@
+"""
+Startup-time benchmark: the previous import-time InferConfig vs the lazy bundle startup.
+
+Builds a synthetic drug database CSV, label encoder and two ResNet-18 checkpoints, compiles
+them into a bundle, then measures each path in a fresh process:
+
+- eager: what the old InferConfig did at import (torch.load x2, pd.read_csv + list
+  conversions, joblib unpickling, DrugIndex); uvicorn accepts connections only after all of it,
+- lazy: importing api.infer (the point where uvicorn accepts connections), then the background
+  load_database() from the mmap bundle and load_models() with the warm-up forward (ready).
+
+OCR initialization is excluded from both: it costs the same on either path (and runs in the
+background on the lazy one).
+
+usage (from src/api-service):
+    python -m benchmarks.bench_startup --num_drugs 50000
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+
+def build_artifacts(args, workdir):
+    import joblib
+    import numpy as np
+    import pandas as pd
+    import torch
+    import torch.nn as nn
+    from sklearn.preprocessing import LabelEncoder
+    from torchvision import models
+    from api.bundle import compile_bundle
+    from benchmarks.bench_matching import synthetic_imprints
+
+    rng = random.Random(0)
+    names = [f"drug{i}" for i in range(args.num_drugs // 2)]
+    encoder = LabelEncoder().fit(names)
+    imprints = synthetic_imprints(args.num_drugs)
+    data = pd.DataFrame({
+        "splimprint": [imprint or np.nan for imprint in imprints],
+        "splcolor_text_encoded": [rng.randrange(12) for _ in range(args.num_drugs)],
+        "splshape_text_encoded": [rng.randrange(8) for _ in range(args.num_drugs)],
+        "medicine_name_encoded": encoder.transform([rng.choice(names) for _ in range(args.num_drugs)]),
+        "description": ["synthetic drug description " * 8] * args.num_drugs,
+    })
+    paths = {
+        "DATABASE_CSV": os.path.join(workdir, "drug_database.csv"),
+        "LABEL_ENCODER_PATH": os.path.join(workdir, "label_encoder.pkl"),
+        "COLOR_MODEL_PATH": os.path.join(workdir, "color_model.pth"),
+        "SHAPE_MODEL_PATH": os.path.join(workdir, "shape_model.pth"),
+        "DRUG_BUNDLE_DIR": os.path.join(workdir, "drug_bundle"),
+    }
+    data.to_csv(paths["DATABASE_CSV"], index=False)
+    joblib.dump(encoder, paths["LABEL_ENCODER_PATH"])
+    for key, num_classes in [("COLOR_MODEL_PATH", 12), ("SHAPE_MODEL_PATH", 8)]:
+        model = models.resnet18(weights=None)
+        model.fc = nn.Linear(model.fc.in_features, num_classes)
+        torch.save(model, paths[key])
+    compile_bundle(paths["DATABASE_CSV"], paths["LABEL_ENCODER_PATH"], paths["DRUG_BUNDLE_DIR"])
+    return paths
+
+
+def run_eager(paths, results):
+    # Same top-level imports as the old api/infer.py (minus paddleocr, which is not timed)
+    start = time.perf_counter()
+    import fastapi  # noqa: F401
+    import joblib
+    import numpy as np
+    import pandas as pd
+    import torch
+    from torchvision import transforms  # noqa: F401
+    from api.drug_index import DrugIndex
+    timings = {"imports": time.perf_counter() - start}
+
+    step = time.perf_counter()
+    torch.load(paths["COLOR_MODEL_PATH"], map_location="cpu")
+    torch.load(paths["SHAPE_MODEL_PATH"], map_location="cpu")
+    timings["models"] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    database_data = pd.read_csv(paths["DATABASE_CSV"])
+    splimprint_database = database_data['splimprint'].fillna("").tolist()
+    splcolor_text_encoded = np.array(database_data['splcolor_text_encoded'].tolist())
+    splshape_text_encoded = np.array(database_data['splshape_text_encoded'].tolist())
+    medicine_name_list = np.array(database_data['medicine_name_encoded'].tolist())
+    with open(paths["LABEL_ENCODER_PATH"], 'rb') as file:
+        joblib.load(file)
+    DrugIndex(splimprint_database, splcolor_text_encoded, splshape_text_encoded, medicine_name_list)
+    timings["database"] = time.perf_counter() - step
+
+    total = time.perf_counter() - start
+    results["eager"] = {"accepting": total, "ready": total, **timings}
+
+
+def run_lazy(paths, results):
+    os.environ.update(paths)
+    os.environ["OCR_WORKERS"] = "0"
+    start = time.perf_counter()
+    from api.infer import config
+    accepting = time.perf_counter() - start
+
+    step = time.perf_counter()
+    config.load_database()
+    database = time.perf_counter() - step
+
+    step = time.perf_counter()
+    config.load_models()
+    models = time.perf_counter() - step
+
+    ready = time.perf_counter() - start
+    results["lazy"] = {"accepting": accepting, "ready": ready, "imports": accepting, "models": models, "database": database}
+
+
+def main(args):
+    context = multiprocessing.get_context("spawn")
+    manager = context.Manager()
+    results = manager.dict()
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = build_artifacts(args, workdir)
+        for name, target in [("eager", run_eager), ("lazy", run_lazy)]:
+            for _ in range(args.repeat):
+                process = context.Process(target=target, args=(paths, results))
+                process.start()
+                process.join()
+                print(f"{name:>6} " + "  ".join(f"{key}={value:.2f}s" for key, value in results[name].items()))
+
+    print("\n'accepting' is when uvicorn can serve /healthz; 'ready' adds database, models and warm-up "
+          "(OCR excluded); database includes building the DrugIndex")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark service startup time.')
+    parser.add_argument('--num_drugs', type=int, default=50000, help='Rows in the synthetic drug database.')
+    parser.add_argument('--repeat', type=int, default=2, help='Fresh-process runs per path.')
+
+    args = parser.parse_args()
+    main(args)
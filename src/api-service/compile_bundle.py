@@ -0,0 +1,18 @@
+import argparse
+import os
+import time
+from api.bundle import compile_bundle
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Pack the drug database and label encoder into a memory-mappable bundle.')
+    parser.add_argument('--database_csv', default=os.environ.get("DATABASE_CSV", "drug_database.csv"), help='Drug database CSV.')
+    parser.add_argument('--label_encoder', default=os.environ.get("LABEL_ENCODER_PATH", "label_encoder.pkl"), help='Fitted label encoder (joblib).')
+    parser.add_argument('--output', default=os.environ.get("DRUG_BUNDLE_DIR", "drug_bundle"), help='Bundle directory to write.')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.database_csv):
+        print(f"{args.database_csv} not found. Skipping bundle compilation.")
+    else:
+        start = time.perf_counter()
+        manifest = compile_bundle(args.database_csv, args.label_encoder, args.output)
+        print(f"Compiled {manifest['rows']} rows into {args.output} in {time.perf_counter() - start:.2f}s")
@@ -18,6 +18,10 @@ echo "Running model download script..."
 pipenv run python /app/download_models.py
 pipenv run pip install paddlepaddle
 
+# Pack the drug database and label encoder into the memory-mapped bundle the service loads at startup
+echo "Compiling drug database bundle..."
+pipenv run python /app/compile_bundle.py
+
 echo "Model files are ready."
 
 
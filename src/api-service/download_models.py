@@ -28,6 +28,10 @@ if __name__ == "__main__":
         "shape_model": "models/shape_model.pth",
     }
 
+    # The shared-backbone model is only fetched when the service is configured to use it
+    if os.environ.get("MULTIHEAD_MODEL_PATH"):
+        MODELS["multihead_model"] = "models/multihead_model.pth"
+
     # Download each model
     for model_name, blob_path in MODELS.items():
         local_path = os.path.join(MODEL_DIR, f"{model_name}.pth")
@@ -0,0 +1,24 @@
+from fastapi.testclient import TestClient
+from api import infer
+from api.executor import ServerBusy
+
+
+def test_batch_file_limit_is_checked_before_admission(monkeypatch):
+    monkeypatch.setattr(infer.config, "max_batch_files", 2)
+    monkeypatch.setattr(infer.config.ready, "is_set", lambda: True)
+    admitted = []
+
+    def admit():
+        admitted.append(True)
+        raise ServerBusy()
+    monkeypatch.setattr(infer.executor, "admit", admit)
+    client = TestClient(infer.app)
+
+    def post(num_files):
+        return client.post("/infer/batch", files=[("files", (f"{i}.jpg", b"x", "image/jpeg")) for i in range(num_files)])
+
+    response = post(3)
+    assert response.status_code == 413 and "at most 2" in response.json()["detail"]
+    assert admitted == []
+    # Within the limit the request goes on to admission control (here: a full queue)
+    assert post(2).status_code == 503 and admitted == [True]
@@ -0,0 +1,30 @@
+import asyncio
+import torch
+from api.batcher import DynamicBatcher
+
+
+def test_concurrent_requests_share_a_batch():
+    def run_batch(batch):
+        return batch.flatten(1).sum(1).tolist()
+
+    async def main():
+        batcher = DynamicBatcher(run_batch, max_batch_size=8, max_wait_ms=50)
+        images = [torch.full((1, 3, 2, 2), float(i)) for i in range(5)]
+        results = await asyncio.gather(*(batcher.submit(image) for image in images))
+        return batcher, results
+
+    batcher, results = asyncio.run(main())
+    assert results == [12.0 * i for i in range(5)]
+    assert batcher.batch_sizes == {5: 1}
+
+
+def test_batch_failure_is_raised_to_every_request():
+    def run_batch(batch):
+        raise RuntimeError("model failed")
+
+    async def main():
+        batcher = DynamicBatcher(run_batch, max_batch_size=4, max_wait_ms=10)
+        return await asyncio.gather(*(batcher.submit(torch.zeros(1, 3, 2, 2)) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
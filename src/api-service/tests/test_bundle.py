@@ -0,0 +1,75 @@
+import os
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import LabelEncoder
+from api.bundle import DrugBundle, compile_bundle
+
+
+@pytest.fixture
+def sources(tmp_path):
+    encoder = LabelEncoder().fit(["Lipitor", "Metformin", "Zoloft"])
+    data = pd.DataFrame({
+        "splimprint": ["M;10", np.nan, "G;3722"],
+        "splcolor_text_encoded": [1, 2, 3],
+        "splshape_text_encoded": [4, 5, 6],
+        "medicine_name_encoded": encoder.transform(["Zoloft", "Lipitor", "Metformin"]),
+    })
+    database_csv, label_encoder_path = str(tmp_path / "drug_database.csv"), str(tmp_path / "label_encoder.pkl")
+    data.to_csv(database_csv, index=False)
+    joblib.dump(encoder, label_encoder_path)
+    return database_csv, label_encoder_path, encoder
+
+
+def test_bundle_matches_csv_and_encoder(sources, tmp_path):
+    database_csv, label_encoder_path, encoder = sources
+    bundle_dir = str(tmp_path / "drug_bundle")
+    assert compile_bundle(database_csv, label_encoder_path, bundle_dir)["rows"] == 3
+
+    bundle = DrugBundle(bundle_dir)
+    assert isinstance(bundle.color_codes, np.memmap)
+    assert bundle.imprints.tolist() == ["M;10", "", "G;3722"]
+    assert bundle.color_codes.tolist() == [1, 2, 3] and bundle.shape_codes.tolist() == [4, 5, 6]
+    assert list(bundle.label_encoder.inverse_transform(bundle.medicine_codes[[0, 2]])) == \
+        list(encoder.inverse_transform(bundle.medicine_codes[[0, 2]])) == ["Zoloft", "Metformin"]
+    assert bundle.is_fresh(database_csv, label_encoder_path)
+
+
+def test_changed_source_makes_bundle_stale(sources, tmp_path):
+    database_csv, label_encoder_path, _ = sources
+    bundle_dir = str(tmp_path / "drug_bundle")
+    compile_bundle(database_csv, label_encoder_path, bundle_dir)
+
+    with open(database_csv, "a") as f:
+        f.write("X;1,1,1,0\n")
+    assert not DrugBundle(bundle_dir).is_fresh(database_csv, label_encoder_path)
+
+    os.remove(database_csv)  # bundle-only deployment
+    assert DrugBundle(bundle_dir).is_fresh(database_csv, label_encoder_path)
+
+
+def test_recompile_swaps_in_the_new_bundle(sources, tmp_path, monkeypatch):
+    database_csv, label_encoder_path, _ = sources
+    bundle_dir = str(tmp_path / "drug_bundle")
+    compile_bundle(database_csv, label_encoder_path, bundle_dir)
+    pd.read_csv(database_csv).iloc[:2].to_csv(database_csv, index=False)
+
+    # A crash after the old bundle is moved aside but before the new one is renamed in keeps the old one
+    replace = os.replace
+    calls = []
+
+    def crash_on_second_rename(src, dst):
+        calls.append(dst)
+        if len(calls) == 2:
+            raise OSError("crash")
+        replace(src, dst)
+    monkeypatch.setattr(os, "replace", crash_on_second_rename)
+    with pytest.raises(OSError):
+        compile_bundle(database_csv, label_encoder_path, bundle_dir)
+    assert DrugBundle(bundle_dir + ".old").manifest["rows"] == 3
+    monkeypatch.setattr(os, "replace", replace)
+
+    assert compile_bundle(database_csv, label_encoder_path, bundle_dir)["rows"] == 2
+    assert DrugBundle(bundle_dir).imprints.tolist() == ["M;10", ""]
+    assert sorted(os.listdir(tmp_path)) == ["drug_bundle", "drug_database.csv", "label_encoder.pkl"]
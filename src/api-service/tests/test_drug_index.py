@@ -0,0 +1,56 @@
+import random
+import numpy as np
+import api.drug_index
+from api.drug_index import DrugIndex
+
+
+def random_imprint(rng, alphabet, max_len):
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_len)))
+
+
+def build_index(rng, size):
+    imprints = [random_imprint(rng, "AB12;M0 ", 10) for _ in range(size)]
+    colors = [rng.randint(0, 5) for _ in range(size)]
+    shapes = [rng.randint(0, 3) for _ in range(size)]
+    return imprints, DrugIndex(imprints, colors, shapes)
+
+
+def test_best_match_equals_full_scan_argmax(monkeypatch):
+    monkeypatch.setattr(api.drug_index, "MIN_PRUNE_IMPRINTS", 0)
+    rng = random.Random(0)
+    for size in [1, 20, 400]:
+        imprints, index = build_index(rng, size)
+        queries = [""] + [rng.choice(imprints) for _ in range(10)] + [random_imprint(rng, "AB12;Q", 12) for _ in range(20)]
+        for query in queries:
+            color, shape = rng.randint(0, 6), rng.randint(0, 4)
+            expected = int(np.argmax(index.scores(query, color, shape)))
+            assert index.best_match(query, color, shape) == expected
+
+
+def test_pruning_only_scores_candidates(monkeypatch):
+    monkeypatch.setattr(api.drug_index, "MIN_PRUNE_IMPRINTS", 0)
+    imprints = ["M;10", "WATSON;3203", "G;3722", "", "ZZ"] * 100
+    index = DrugIndex(imprints, [1, 2, 3, 4, 5] * 100, [1, 1, 2, 2, 3] * 100)
+    assert index._pruned_best_match("G;3722", 3, 2) == 2
+    assert index._pruned_best_match("", 4, 2) == 3
+
+
+def test_top_k_ranks_distinct_drugs():
+    rng = random.Random(1)
+    imprints, _ = build_index(rng, 300)
+    drugs = [rng.randint(0, 80) for _ in range(300)]
+    index = DrugIndex(imprints, [rng.randint(0, 5) for _ in range(300)], [rng.randint(0, 3) for _ in range(300)], drugs)
+
+    for query in ["", "AB", "M;10", "Q"]:
+        scores = index.scores(query, 2, 1)
+        rows, breakdown = index.top_k(query, 2, 1, 10)
+
+        best_rows = {}
+        for row in range(len(scores)):
+            if drugs[row] not in best_rows or scores[row] > scores[best_rows[drugs[row]]]:
+                best_rows[drugs[row]] = row
+        expected = sorted(best_rows.values(), key=lambda row: (-scores[row], row))[:10]
+
+        assert rows.tolist() == expected
+        assert np.array_equal(breakdown["score"], scores[rows])
+        assert index.top_k(query, 2, 1, 1)[0].tolist() == [int(np.argmax(scores))]
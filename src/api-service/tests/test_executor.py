@@ -0,0 +1,35 @@
+import asyncio
+import threading
+import time
+import pytest
+from api.executor import BoundedExecutor, ServerBusy
+
+
+def test_admit_rejects_beyond_max_in_flight():
+    executor = BoundedExecutor(max_workers=1, max_queue=1)
+    with executor.admit(), executor.admit():
+        with pytest.raises(ServerBusy):
+            with executor.admit():
+                pass
+    assert executor.in_flight == 0
+    assert executor.rejected == 1
+    executor.shutdown()
+
+
+def test_blocking_work_does_not_stall_event_loop():
+    executor = BoundedExecutor(max_workers=2, max_queue=0)
+
+    async def main():
+        work = asyncio.ensure_future(executor.run(time.sleep, 0.5))
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)  # stands in for a health check handled meanwhile
+        responsive = time.perf_counter() - start
+        thread_name = await executor.run(lambda: threading.current_thread().name)
+        await work
+        return responsive, thread_name
+
+    responsive, thread_name = asyncio.run(main())
+    assert responsive < 0.2
+    assert thread_name.startswith("infer")
+    executor.shutdown()
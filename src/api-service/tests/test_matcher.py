@@ -0,0 +1,50 @@
+import random
+import numpy as np
+from Levenshtein import distance as levenshtein_distance
+from api.matcher import ImprintMatcher
+
+
+def reference_similarity(ocr_res, splimprint_database):
+    # Per-row scoring as originally written in infer()
+    ocr_res_len = len(ocr_res)
+    total_length = np.array([len(imprint) + ocr_res_len for imprint in splimprint_database])
+    edit_distances = np.array([levenshtein_distance(ocr_res, imprint) for imprint in splimprint_database])
+    normalize_similarity = np.where(
+        (total_length == 0) & (edit_distances == 0),
+        1,
+        np.where(total_length != 0, 1 - edit_distances / total_length, 0)
+    )
+    overlapped_scores = np.array([
+        2 * len(set(imprint) & set(ocr_res)) for imprint in splimprint_database
+    ])
+    overlapped_similarity = np.where(
+        (total_length == 0) & (overlapped_scores == 0),
+        1,
+        np.where(total_length != 0, overlapped_scores / total_length, 0)
+    )
+    return normalize_similarity, overlapped_similarity
+
+
+def random_imprint(rng, alphabet, max_len):
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_len)))
+
+
+def test_similarity_matches_reference():
+    rng = random.Random(0)
+    database = [random_imprint(rng, "AB12;x ", 20) for _ in range(500)] + ["", "", "M;10"]
+    matcher = ImprintMatcher(database)
+
+    queries = ["", "M;10", "Z", "Q" * 64, "A1" * 40]
+    queries += [random_imprint(rng, "AB12;xQ", 30) for _ in range(30)]
+    for query in queries:
+        expected_edit, expected_overlap = reference_similarity(query, database)
+        normalize_similarity, overlapped_similarity = matcher.similarity(query)
+        assert np.array_equal(normalize_similarity, expected_edit)
+        assert np.array_equal(overlapped_similarity, expected_overlap)
+
+
+def test_empty_imprint_database():
+    matcher = ImprintMatcher(["", ""])
+    normalize_similarity, overlapped_similarity = matcher.similarity("")
+    assert normalize_similarity.tolist() == [1, 1]
+    assert overlapped_similarity.tolist() == [1, 1]
@@ -0,0 +1,91 @@
+import asyncio
+import time
+from api.executor import BoundedExecutor
+from api.metrics import Metrics
+from api.profiler import SlowRequestProfiler
+
+
+def test_histogram_render():
+    metrics = Metrics(buckets=(0.01, 0.1))
+    metrics.observe("infer_stage_seconds", (("stage", "ocr"),), 0.05)
+    metrics.observe("infer_stage_seconds", (("stage", "ocr"),), 0.5)
+    text = metrics.render([("infer_in_flight", "gauge", "Requests admitted.", [((), 3)])])
+    assert "# TYPE infer_stage_seconds histogram" in text
+    assert 'infer_stage_seconds_bucket{stage="ocr",le="0.01"} 0' in text
+    assert 'infer_stage_seconds_bucket{stage="ocr",le="0.1"} 1' in text
+    assert 'infer_stage_seconds_bucket{stage="ocr",le="+Inf"} 2' in text
+    assert 'infer_stage_seconds_count{stage="ocr"} 2' in text
+    assert "infer_in_flight 3" in text
+
+
+def test_stages_in_executor_threads_reach_the_request():
+    metrics = Metrics()
+    executor = BoundedExecutor(max_workers=2, max_queue=0)
+
+    def ocr():
+        with metrics.stage("ocr"):
+            time.sleep(0.01)
+
+    async def request():
+        timings = metrics.start_request()
+        with metrics.stage("read"):
+            pass
+        await executor.run(ocr)
+        return timings
+
+    async def main():
+        return await asyncio.gather(request(), request())
+
+    for timings in asyncio.run(main()):
+        assert [name for name, _ in timings] == ["read", "ocr"]
+    header = Metrics.server_timing([("ocr", 0.01), ("ocr", 0.02)], 0.05)
+    assert header == "ocr;dur=30.00, total;dur=50.00"
+    executor.shutdown()
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+    timings = metrics.start_request()
+    with metrics.stage("ocr"):
+        pass
+    assert timings == [] and metrics.render() == "\n"
+
+
+def test_profiler_dumps_slow_requests(tmp_path):
+    profiler = SlowRequestProfiler(threshold_ms=50, interval_ms=1, output_dir=str(tmp_path))
+    profiler.start()
+
+    def busy_loop(seconds):
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+
+    start = time.perf_counter()
+    busy_loop(0.01)
+    assert profiler.maybe_dump(start, time.perf_counter(), "/infer/") is None
+
+    start = time.perf_counter()
+    busy_loop(0.2)
+    path = profiler.maybe_dump(start, time.perf_counter(), "/infer/")
+    profiler.stop()
+    with open(path) as f:
+        assert "busy_loop" in f.read()
+
+
+def test_slow_request_profile_is_written_off_the_event_loop(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    from api import infer
+
+    profiler = SlowRequestProfiler(threshold_ms=0, output_dir=str(tmp_path))
+    on_event_loop = []
+
+    def maybe_dump(start, end, name):
+        try:
+            asyncio.get_running_loop()
+            on_event_loop.append(True)
+        except RuntimeError:
+            on_event_loop.append(False)
+    monkeypatch.setattr(profiler, "maybe_dump", maybe_dump)
+    monkeypatch.setattr(infer, "profiler", profiler)
+    TestClient(infer.app).post("/infer/batch", files=[("files", ("0.jpg", b"x", "image/jpeg"))])
+    assert on_event_loop == [False]
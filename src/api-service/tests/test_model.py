@@ -0,0 +1,52 @@
+import torch
+import torch.nn as nn
+from torchvision import models
+from api.model import MultiHeadResNet, load_classifier
+
+
+def test_multihead_checkpoint_round_trip(tmp_path):
+    model = MultiHeadResNet(num_colors=5, num_shapes=3, pretrained=False)
+    checkpoint_path = tmp_path / "multihead_model.pth"
+    torch.save({"num_colors": 5, "num_shapes": 3, "state_dict": model.state_dict()}, checkpoint_path)
+
+    loaded = load_classifier(checkpoint_path, torch.device("cpu"))
+    assert not loaded.training
+
+    image_tensor = torch.rand((2, 3, 64, 64))
+    with torch.no_grad():
+        color_outputs, shape_outputs = loaded(image_tensor)
+        expected_color, expected_shape = model.eval()(image_tensor)
+    assert color_outputs.shape == (2, 5) and shape_outputs.shape == (2, 3)
+    assert torch.allclose(color_outputs, expected_color) and torch.allclose(shape_outputs, expected_shape)
+
+
+def resnet_classifier(num_classes):
+    torch.manual_seed(0)
+    model = models.resnet18(weights=None)
+    model.fc = nn.Linear(model.fc.in_features, num_classes)
+    return model.eval()
+
+
+def test_load_classifier_from_state_dict(tmp_path):
+    # What main.py in src/models writes for color_model.pth / shape_model.pth
+    model = resnet_classifier(7)
+    checkpoint_path = tmp_path / "color_model.pth"
+    torch.save(model.state_dict(), checkpoint_path)
+
+    loaded = load_classifier(checkpoint_path, torch.device("cpu"))
+    image_tensor = torch.rand((2, 3, 64, 64))
+    with torch.no_grad():
+        assert torch.allclose(loaded(image_tensor), model(image_tensor))
+
+
+def test_load_classifier_from_pickled_module(tmp_path):
+    # Whole pickled modules are refused by a weights-only load and need the fallback
+    model = resnet_classifier(4)
+    checkpoint_path = tmp_path / "shape_model.pth"
+    torch.save(model, checkpoint_path)
+
+    loaded = load_classifier(checkpoint_path, torch.device("cpu"))
+    assert not loaded.training
+    image_tensor = torch.rand((2, 3, 64, 64))
+    with torch.no_grad():
+        assert torch.allclose(loaded(image_tensor), model(image_tensor))
@@ -0,0 +1,24 @@
+import pytest
+import torch
+import torch.nn as nn
+from api.model import artifact_path, load_artifact
+
+
+def test_artifact_path_names():
+    assert artifact_path("model/color_model.pth", "pth") == "model/color_model.pth"
+    assert artifact_path("model/color_model.pth", "torchscript") == "model/color_model.torchscript.pt"
+    assert artifact_path("model/color_model.pth", "int8") == "model/color_model.int8.pt"
+    with pytest.raises(ValueError):
+        artifact_path("model/color_model.pth", "tflite")
+
+
+def test_load_artifact_matches_eager(tmp_path):
+    torch.manual_seed(0)
+    model = nn.Sequential(nn.Conv2d(3, 4, 3), nn.Flatten(), nn.LazyLinear(5)).eval()
+    image = torch.rand(2, 3, 8, 8)
+    expected = model(image)
+    path = str(tmp_path / "color_model.torchscript.pt")
+    torch.jit.save(torch.jit.freeze(torch.jit.trace(model, image)), path)
+
+    loaded = load_artifact(path, torch.device("cpu"))
+    assert torch.allclose(loaded(image), expected, atol=1e-6)
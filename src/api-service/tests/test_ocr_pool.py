@@ -0,0 +1,49 @@
+import os
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from api.ocr_pool import OCRPool, OCRWorkerError
+
+
+class FakeOCR:
+    # Stands in for PaddleOCR: "reads" the image bytes as the imprint text
+    def __init__(self, **kwargs):
+        self.pid = os.getpid()
+
+    def ocr(self, img, cls=True):
+        if not isinstance(img, bytes):
+            return [None]
+        if img == b"crash":
+            os._exit(1)
+        if img == b"slow":
+            time.sleep(5)
+        time.sleep(0.1)  # long enough for concurrent jobs to overlap
+        return [[[[[0, 0], [1, 0], [1, 1], [0, 1]], (img.decode(), 0.99)]], self.pid]
+
+
+@pytest.fixture
+def pool():
+    pool = OCRPool(2, factory=FakeOCR, timeout=1.0, start_timeout=60.0)
+    yield pool
+    pool.close()
+
+
+def test_jobs_run_on_separate_workers(pool):
+    with ThreadPoolExecutor(4) as threads:
+        results = list(threads.map(pool.ocr, [b"M;10", b"G;3722", b"AB", b"WATSON"]))
+    assert [result[0][0][1][0] for result in results] == ["M;10", "G;3722", "AB", "WATSON"]
+    # Each result carries the pid of the worker process that produced it
+    pids = {result[1] for result in results}
+    assert len(pids) == 2 and os.getpid() not in pids
+    assert sum(worker["jobs"] for worker in pool.stats()["workers"]) == 4
+    assert all(worker["jobs"] > 0 for worker in pool.stats()["workers"])
+
+
+def test_crashed_and_hung_workers_are_restarted(pool):
+    with pytest.raises(OCRWorkerError):
+        pool.ocr(b"crash")
+    with pytest.raises(OCRWorkerError):
+        pool.ocr(b"slow")
+    assert pool.stats()["restarts"] == 2
+    assert all(worker["alive"] for worker in pool.stats()["workers"])
+    assert pool.ocr(b"M;10")[0][0][1][0] == "M;10"
@@ -0,0 +1,33 @@
+import torch
+import torch.nn as nn
+from api.perf import autocast, bf16_supported, channels_last
+
+
+def small_net():
+    torch.manual_seed(0)
+    return nn.Sequential(nn.Conv2d(3, 8, 3), nn.ReLU(), nn.AdaptiveAvgPool2d(1), nn.Flatten(), nn.Linear(8, 4)).eval()
+
+
+def test_channels_last_only_touches_4d_tensors():
+    image = torch.rand(2, 3, 8, 8)
+    assert channels_last(image).is_contiguous(memory_format=torch.channels_last)
+    vector = torch.rand(2, 3)
+    assert channels_last(vector) is vector
+
+
+def test_disabled_autocast_is_fp32():
+    with autocast(torch.device("cpu"), enabled=False):
+        assert small_net()(torch.rand(1, 3, 8, 8)).dtype == torch.float32
+
+
+def test_perf_mode_agrees_with_fp32():
+    device = torch.device("cpu")
+    model = small_net()
+    inputs = torch.rand(16, 3, 16, 16)
+    with torch.no_grad():
+        reference = model(inputs)
+        fast_model = model.to(memory_format=torch.channels_last)
+        with autocast(device, bf16_supported(device)):
+            outputs = fast_model(channels_last(inputs)).float()
+    assert torch.allclose(reference, outputs, atol=0.05)
+    assert torch.equal(reference.argmax(1), outputs.argmax(1))
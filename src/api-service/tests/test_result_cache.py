@@ -0,0 +1,84 @@
+import io
+import numpy as np
+import pytest
+from PIL import Image
+from api.result_cache import ResultCache, hamming_distance, perceptual_hash
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def jpeg_bytes(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def pill_image():
+    y, x = np.mgrid[0:256, 0:256]
+    pixels = np.where((x - 128) ** 2 + (y - 110) ** 2 < 70 ** 2, 220, 40).astype(np.uint8)
+    pixels[100:120, 90:170] = 90
+    return Image.fromarray(np.stack([pixels] * 3, axis=-1))
+
+
+def test_exact_hits_and_top_k_are_separate():
+    cache = ResultCache(max_entries=4)
+    key = cache.make_key(b"image")
+    assert cache.get(key, 1) is None
+    cache.put(key, 1, {"identified_drug_name": "drug1"})
+    assert cache.get(cache.make_key(b"image"), 1) == {"identified_drug_name": "drug1"}
+    assert cache.get(key, 5) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_lru_eviction_ttl_and_memory_cap():
+    clock = FakeClock()
+    cache = ResultCache(max_entries=2, ttl_seconds=10, clock=clock)
+    keys = [cache.make_key(bytes([i])) for i in range(3)]
+    cache.put(keys[0], 1, {"i": 0})
+    cache.put(keys[1], 1, {"i": 1})
+    cache.get(keys[0], 1)
+    cache.put(keys[2], 1, {"i": 2})
+    assert cache.get(keys[1], 1) is None  # least recently used was evicted
+    assert cache.get(keys[0], 1) == {"i": 0}
+
+    clock.now = 11
+    assert cache.get(keys[0], 1) is None
+    assert cache.stats()["expirations"] == 1
+
+    small = ResultCache(max_entries=100, max_bytes=200)
+    for i in range(10):
+        small.put(small.make_key(bytes([i])), 1, {"name": "x" * 40})
+    assert small.stats()["bytes"] <= 200 and small.stats()["entries"] < 10
+
+
+def test_artifact_change_invalidates():
+    clock = FakeClock()
+    version = ["v1"]
+    cache = ResultCache(version_fn=lambda: version[0], version_check_seconds=1, clock=clock)
+    key = cache.make_key(b"image")
+    cache.put(key, 1, {"i": 0})
+    version[0] = "v2"
+    clock.now = 2
+    assert cache.get(key, 1) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_phash_mode_serves_reencoded_image(pill_image):
+    original, reencoded = jpeg_bytes(pill_image, 95), jpeg_bytes(pill_image.resize((240, 240)), 60)
+    assert original != reencoded
+    assert hamming_distance(perceptual_hash(original), perceptual_hash(reencoded)) <= 4
+
+    cache = ResultCache(mode="phash", max_distance=4)
+    cache.put(cache.make_key(original), 1, {"identified_drug_name": "drug1"})
+    assert cache.get(cache.make_key(reencoded), 1) == {"identified_drug_name": "drug1"}
+    assert cache.stats()["near_hits"] == 1
+
+    other = Image.fromarray(255 - np.asarray(pill_image))
+    assert cache.get(cache.make_key(jpeg_bytes(other, 95)), 1) is None
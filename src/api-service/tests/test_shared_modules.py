@@ -0,0 +1,20 @@
+import os
+import pytest
+
+API_DIR = os.path.join(os.path.dirname(__file__), "..", "api")
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "models")
+
+# Modules copied into both src/models and src/api-service/api; only their own imports differ
+SHARED_MODULES = ["matcher.py", "drug_index.py"]
+
+
+@pytest.mark.parametrize("name", SHARED_MODULES)
+def test_copies_are_identical(name):
+    if not os.path.exists(os.path.join(MODELS_DIR, name)):
+        pytest.skip("src/models is not part of this checkout")
+    with open(os.path.join(API_DIR, name)) as f:
+        api_copy = f.read()
+    with open(os.path.join(MODELS_DIR, name)) as f:
+        models_copy = f.read()
+    assert api_copy.replace("from api.", "from ") == models_copy, \
+        f"src/api-service/api/{name} and src/models/{name} have drifted apart; apply the change to both"
@@ -0,0 +1,90 @@
+"""
+Resize-stage throughput against core count, and the cost of incremental reruns.
+
+Generates a synthetic corpus of pill-like JPEGs, then:
+- times the previous single-core loop (resize every image, no manifest),
+- times process_and_split_images from scratch for each worker count,
+- reruns it with nothing changed, and with a fraction of the images modified.
+
+usage (from src/datapipeline):
+    python bench_resize.py --num_images 2000 --workers 1 2 4 8
+"""
+
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from PIL import Image, ImageDraw
+from preprocess_cv import process_and_split_images
+
+
+def make_corpus(folder, num_images, source_size, seed=0):
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    for i in range(num_images):
+        image = Image.new("RGB", (source_size, source_size * 3 // 4), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        x, y, r = rng.randrange(source_size // 4, source_size // 2), rng.randrange(source_size // 4, source_size // 2), source_size // 5
+        draw.ellipse([x - r, y - r, x + r, y + r], fill=tuple(rng.randrange(256) for _ in range(3)))
+        draw.text((x - r // 2, y), f"M {i % 100}", fill=(0, 0, 0))
+        image.save(os.path.join(folder, f"{i:06d}.jpg"), quality=90)
+
+
+def sequential_resize(source_folder, processed_folder, image_size):
+    # The previous process_and_split_images loop, without the split bookkeeping
+    os.makedirs(processed_folder, exist_ok=True)
+    for image_name in os.listdir(source_folder):
+        with Image.open(os.path.join(source_folder, image_name)) as img:
+            img = img.resize(image_size)
+            img.save(os.path.join(processed_folder, image_name))
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main(args):
+    image_size = (args.image_size, args.image_size)
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, "raw")
+        make_corpus(source, args.num_images, args.source_size)
+        print(f"{args.num_images} synthetic {args.source_size}px JPEGs, {os.cpu_count()} CPUs\n")
+
+        seconds = timed(sequential_resize, source, os.path.join(root, "sequential"), image_size)
+        print(f"{'previous loop':>14} {seconds:>8.2f}s {args.num_images / seconds:>9.0f} img/s")
+
+        baseline = None
+        processed = os.path.join(root, "processed")
+        for workers in args.workers:
+            shutil.rmtree(processed, ignore_errors=True)
+            seconds = timed(process_and_split_images, source, processed, image_size, draft=args.draft, num_workers=workers)
+            baseline = baseline or seconds
+            print(f"{workers:>6} workers {seconds:>8.2f}s {args.num_images / seconds:>9.0f} img/s {baseline / seconds:>6.2f}x")
+
+        workers = args.workers[-1]
+        seconds = timed(process_and_split_images, source, processed, image_size, draft=args.draft, num_workers=workers)
+        print(f"\nrerun, nothing changed: {seconds:.2f}s")
+
+        changed = random.Random(1).sample(sorted(os.listdir(source)), int(args.num_images * args.changed_fraction))
+        for image_name in changed:
+            with Image.open(os.path.join(source, image_name)) as img:
+                img.rotate(90).save(os.path.join(source, image_name), quality=90)
+        seconds = timed(process_and_split_images, source, processed, image_size, draft=args.draft, num_workers=workers)
+        print(f"rerun, {len(changed)} images changed: {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the parallel, incremental resize stage.")
+    parser.add_argument("--num_images", type=int, default=2000, help="Synthetic images to generate.")
+    parser.add_argument("--source_size", type=int, default=800, help="Width of the synthetic JPEGs.")
+    parser.add_argument("--image_size", type=int, default=128, help="Target size.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Process counts to compare.")
+    parser.add_argument("--draft", action="store_true", help="Decode JPEGs at a reduced scale (CV_FAST_DECODE=1).")
+    parser.add_argument("--changed_fraction", type=float, default=0.05, help="Fraction of images modified before the last rerun.")
+
+    args = parser.parse_args()
+    main(args)
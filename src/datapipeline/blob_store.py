@@ -0,0 +1,142 @@
+"""
+Storage backends for the data pipeline scripts, and a parallel uploader on top of them.
+
+A store is addressed by URL: gs://<bucket> for Google Cloud Storage, anything else is a local
+directory (used in place of GCS for tests and benchmarks). Every backend provides:
+- list_names(prefix): set of object names, from one listing,
+- exists(name),
+- upload_file(local_path, name),
+- download_file(name, local_path),
+- delete(name), a no-op if the object is already gone.
+"""
+
+import os
+import random
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class GCSStore:
+    def __init__(self, bucket_name):
+        # Imported here so local runs do not need google-cloud-storage or credentials
+        from google.cloud import storage
+        self.client = storage.Client()  # uses GOOGLE_APPLICATION_CREDENTIALS
+        self.bucket = self.client.bucket(bucket_name)
+        self.url = f"gs://{bucket_name}"
+
+    def list_names(self, prefix=""):
+        # Names only, in pages of up to 1000: one listing instead of a request per object
+        blobs = self.client.list_blobs(self.bucket, prefix=prefix or None, fields="items(name),nextPageToken")
+        return {blob.name for blob in blobs}
+
+    def exists(self, name):
+        return self.bucket.blob(name).exists(self.client)
+
+    def upload_file(self, local_path, name):
+        self.bucket.blob(name).upload_from_filename(local_path)
+
+    def download_file(self, name, local_path):
+        self.bucket.blob(name).download_to_filename(local_path)
+
+    def delete(self, name):
+        from google.api_core.exceptions import NotFound
+        try:
+            self.bucket.blob(name).delete()
+        except NotFound:
+            pass
+
+
+class LocalStore:
+    """A directory standing in for a bucket; object names are relative paths."""
+
+    def __init__(self, root):
+        self.root = root
+        self.url = root
+        os.makedirs(root, exist_ok=True)
+
+    def list_names(self, prefix=""):
+        names = set()
+        for directory, _, files in os.walk(self.root):
+            for file_name in files:
+                if file_name.endswith(".part"):
+                    continue
+                name = os.path.relpath(os.path.join(directory, file_name), self.root).replace(os.sep, "/")
+                if name.startswith(prefix):
+                    names.add(name)
+        return names
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.root, name))
+
+    def upload_file(self, local_path, name):
+        # Copy then rename, so a failed upload never leaves a partial object behind
+        target = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(local_path, target + ".part")
+        os.replace(target + ".part", target)
+
+    def download_file(self, name, local_path):
+        shutil.copyfile(os.path.join(self.root, name), local_path)
+
+    def delete(self, name):
+        path = os.path.join(self.root, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def open_store(url):
+    if url.startswith("gs://"):
+        return GCSStore(url[len("gs://"):].strip("/"))
+    return LocalStore(url)
+
+
+def with_retries(fn, retries=5, base_delay=0.5, max_delay=30.0):
+    """Calls fn(), retrying failures with exponential backoff and jitter; re-raises the last error."""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0))
+
+
+class ParallelUploader:
+    """Uploads files to a store from a bounded thread pool.
+
+    submit() blocks once max_pending uploads are queued, so a fast producer (e.g. archive
+    extraction) cannot run ahead of the network without limit. Each upload is retried with
+    exponential backoff; close() waits for all of them and returns the counts and failures.
+    """
+
+    def __init__(self, store, max_workers=16, max_pending=None, retries=5, base_delay=0.5):
+        self.store = store
+        self.retries = retries
+        self.base_delay = base_delay
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+        self.slots = threading.BoundedSemaphore(max_pending or max_workers * 4)
+        self.lock = threading.Lock()
+        self.uploaded = 0
+        self.failed = []
+
+    def submit(self, local_path, name):
+        self.slots.acquire()
+        self.executor.submit(self._upload, local_path, name)
+
+    def _upload(self, local_path, name):
+        try:
+            with_retries(lambda: self.store.upload_file(local_path, name), self.retries, self.base_delay)
+            with self.lock:
+                self.uploaded += 1
+        except Exception as e:
+            print(f"Error uploading {name}: {e}")
+            with self.lock:
+                self.failed.append(name)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        return {"uploaded": self.uploaded, "failed": list(self.failed)}
@@ -4,9 +4,9 @@ Summary of what this script should do:
 This script downloads, extracts, and uploads the raw images to a GCS bucket, and tracks the raw dataset with DVC for versioning.
 
 More details steps:
-- Download the ZIP file from the provided link: https://ftp.nlm.nih.gov/projects/pillbox/pillbox_production_images_full_202008.zip?_gl=1*m0p1ms*_ga*MTY4ODI3NzM3MC4xNzI1MDQyMTEy*_ga_7147EPK006*MTcyODU3NTk3NC41LjEuMTcyODU3NjA2OC4wLjAuMA..*_ga_P1FPTH9PL4*MTcyODU3NTk3NC41LjEuMTcyODU3NjA2OC4wLjAuMA
+- Stream the ZIP file from the provided link (entries are extracted as the archive arrives): https://ftp.nlm.nih.gov/projects/pillbox/pillbox_production_images_full_202008.zip?_gl=1*m0p1ms*_ga*MTY4ODI3NzM3MC4xNzI1MDQyMTEy*_ga_7147EPK006*MTcyODU3NTk3NC41LjEuMTcyODU3NjA2OC4wLjAuMA..*_ga_P1FPTH9PL4*MTcyODU3NTk3NC41LjEuMTcyODU3NjA2OC4wLjAuMA
 - Extract it into a local folder.
-- Upload each extracted image file to your GCS bucket. 
+- Upload each extracted image file to your GCS bucket (in parallel, skipping images the bucket already has). 
 - Use DVC to track the raw images (after downloading and extracting) to ensure data versioning.
 - Push the raw images to remote storage (GCS) via DVC to maintain version control.
 
@@ -19,56 +19,190 @@ Important notes:
 """
 
 import os
-import requests
-import zipfile
-from google.cloud import storage
+import queue
+import struct
+import threading
+import zlib
 import subprocess
+from blob_store import ParallelUploader, open_store
 
-def download_and_extract_zip(url, extract_to):
-    """Downloads and extracts a ZIP file."""
-    #defining full path and creating partial path
-    zip_path = os.path.join(extract_to, 'pillbox_images.zip') # defines (doesn't create yet) the full path (data/raw_images/pillbox_images.zip) where the ZIP file will be saved after downloading
-    os.makedirs(extract_to, exist_ok=True) # meant to create the directory (data/raw_images) if it doesn't exist, but since this script will be running in the same container as dataloader.py and that script had already made this directory with all the raw images, the effect of this line will be that it just skips making this directory
-    
-    # Download the ZIP file from the NIH URL and saves it at the full path data/raw_images/pillbox_images.zip
-    print("Downloading the ZIP file...")
-    response = requests.get(url, stream=True) # url is the link to the NIH where the zip can be downloaded
-    with open(zip_path, 'wb') as f: 
-        for chunk in response.iter_content(chunk_size=8192):
-            if chunk:
-                f.write(chunk)
-    print("Download completed.")
-
-    # Extract the ZIP file which makes the image files are available in the data/raw_images/ folder, then deleted zip folder
-    print("Extracting the ZIP file...")
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_to)
-    os.remove(zip_path)  # Remove the ZIP file after extraction
-    print(f"Extracted files to {extract_to}")
-
-def upload_to_gcs(bucket_name, source_folder):
-    """Uploads image files from the local folder to a GCS bucket (if the image does not already exist in the bucket)"""
-    print(f"Uploading images to GCS bucket: {bucket_name}")
-    # the client initialization below relies on having the GOOGLE_APPLICATION_CREDENTIALS environment variable available
-    client = storage.Client() # initializes a client object from the Google Cloud Storage library (google.cloud.storage) - this client allows us to interact with your GCS buckets
-    bucket = client.bucket(bucket_name) # bucket_name is pillrx-raw-images
-    
-    # the below for loop uploads each image from the extracted folder to the pillrx-raw-images bucket one at a time
-    for root, _, files in os.walk(source_folder):
-        for file_name in files:
-            if file_name.endswith('.jpg'):
-                file_path = os.path.join(root, file_name)
-                blob = bucket.blob(file_name)  # Create a reference to the blob (file) in GCS
-                
-                # Check if the file already exists in the GCS bucket
-                if blob.exists(client):
-                    print(f"File {file_name} already exists in GCS bucket {bucket_name}, skipping upload.")
-                else:
-                    try:
-                        blob.upload_from_filename(file_path)  # Upload the file if it doesn't exist
-                        print(f"Uploaded {file_name} to GCS bucket {bucket_name}")
-                    except Exception as e:
-                        print(f"Error uploading {file_name}: {e}")
+LOCAL_FILE_HEADER = 0x04034b50
+DATA_DESCRIPTOR = 0x08074b50
+
+def download_chunks(url, chunk_size=1 << 20):
+    """Streams the response body of url in chunks (nothing is written to disk)."""
+    # Imported here so ingest() can run on local chunks (tests, bench_ingest.py) without requests
+    import requests
+    response = requests.get(url, stream=True, timeout=60)
+    response.raise_for_status()
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if chunk:
+            yield chunk
+
+def prefetch(chunks, depth=64):
+    """Reads chunks on a background thread, up to depth ahead, so the download keeps going while entries are extracted."""
+    buffer = queue.Queue(maxsize=depth)
+    done = object()
+
+    def reader():
+        try:
+            for chunk in chunks:
+                buffer.put(chunk)
+            buffer.put(done)
+        except Exception as e:
+            buffer.put(e)
+
+    threading.Thread(target=reader, name="download", daemon=True).start()
+    while True:
+        item = buffer.get()
+        if item is done:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+class ByteStream:
+    """Sequential reads over an iterator of byte chunks, with push-back."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = bytearray()
+
+    def read(self, size):
+        while len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def read_exactly(self, size):
+        data = self.read(size)
+        if len(data) != size:
+            raise EOFError("ZIP stream ended in the middle of an entry")
+        return data
+
+    def read_some(self, limit):
+        # Whatever is buffered (or the next chunk), at most limit bytes
+        if not self.buffer:
+            self.buffer += next(self.chunks, b"")
+        data = bytes(self.buffer[:limit])
+        del self.buffer[:limit]
+        return data
+
+    def unread(self, data):
+        self.buffer[:0] = data
+
+def zip64_sizes(extra, compressed_size, size):
+    # The ZIP64 extra field (id 1) holds the real sizes of entries whose header says 0xFFFFFFFF;
+    # its presence also makes the data descriptor sizes 8 bytes
+    zip64 = False
+    offset = 0
+    while offset + 4 <= len(extra):
+        field_id, field_size = struct.unpack_from("<HH", extra, offset)
+        if field_id == 1:
+            zip64 = True
+            values = list(struct.unpack_from(f"<{field_size // 8}Q", extra, offset + 4))
+            if size == 0xFFFFFFFF and values:
+                size = values.pop(0)
+            if compressed_size == 0xFFFFFFFF and values:
+                compressed_size = values.pop(0)
+        offset += 4 + field_size
+    return compressed_size, size, zip64
+
+def inflate(stream, method, compressed_size):
+    """Decompresses one entry's data. compressed_size None (data descriptor entries) reads deflate to its end marker."""
+    if method == 0:
+        if compressed_size is None:
+            raise ValueError("Stored ZIP entries with a data descriptor cannot be streamed")
+        return stream.read_exactly(compressed_size)
+    if method != 8:
+        raise ValueError(f"Unsupported ZIP compression method {method}")
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    output = []
+    remaining = compressed_size
+    while not decompressor.eof:
+        data = stream.read_some(1 << 20 if remaining is None else min(remaining, 1 << 20))
+        if not data:
+            raise EOFError("ZIP stream ended in the middle of an entry")
+        if remaining is not None:
+            remaining -= len(data)
+        output.append(decompressor.decompress(data))
+    stream.unread(decompressor.unused_data)
+    return b"".join(output)
+
+def iter_zip_entries(chunks):
+    """Yields (name, data) for each file of a ZIP archive as its bytes arrive.
+
+    Reads the local file headers in order instead of the central directory at the end of the
+    archive, so extraction starts with the first downloaded chunk. Supports stored and deflated
+    entries, data descriptors and ZIP64 sizes; every entry is CRC-checked.
+    """
+    stream = ByteStream(chunks)
+    while True:
+        signature = stream.read(4)
+        if len(signature) < 4 or struct.unpack("<I", signature)[0] != LOCAL_FILE_HEADER:
+            return  # central directory (or end of stream): no more entries
+        (_, flags, method, _, _, crc, compressed_size, size,
+         name_length, extra_length) = struct.unpack("<HHHHHIIIHH", stream.read_exactly(26))
+        name = stream.read_exactly(name_length).decode("utf-8" if flags & 0x800 else "cp437")
+        compressed_size, size, zip64 = zip64_sizes(stream.read_exactly(extra_length), compressed_size, size)
+        if flags & 0x1:
+            raise ValueError(f"Encrypted ZIP entry {name} is not supported")
+
+        has_descriptor = bool(flags & 0x8)
+        data = inflate(stream, method, None if has_descriptor else compressed_size)
+        if has_descriptor:
+            # Optional signature, then CRC-32 and the two sizes (4 or 8 bytes each)
+            descriptor = stream.read_exactly(4)
+            if struct.unpack("<I", descriptor)[0] == DATA_DESCRIPTOR:
+                descriptor = stream.read_exactly(4)
+            crc = struct.unpack("<I", descriptor)[0]
+            stream.read_exactly(16 if zip64 else 8)
+        if zlib.crc32(data) != crc:
+            raise ValueError(f"CRC mismatch in ZIP entry {name}")
+        if not name.endswith("/"):
+            yield name, data
+
+def extract_path(extract_to, name):
+    """Local path for an archive entry; refuses names that would escape extract_to."""
+    path = os.path.normpath(os.path.join(extract_to, name))
+    if os.path.isabs(name) or not path.startswith(os.path.normpath(extract_to) + os.sep):
+        raise ValueError(f"Unsafe path in ZIP archive: {name}")
+    return path
+
+def ingest(chunks, extract_to, store, upload_workers=16, retries=5):
+    """Extracts the images of a ZIP archive from a stream of chunks and uploads them to store.
+
+    Entries are written to extract_to (for DVC) as they arrive and handed to a bounded pool of
+    upload threads right away, so download, extraction and upload overlap. Images already in the
+    store (one listing up front) are not uploaded again.
+    """
+    os.makedirs(extract_to, exist_ok=True)
+    existing = store.list_names()
+    print(f"{len(existing)} objects already in {store.url}")
+    uploader = ParallelUploader(store, max_workers=upload_workers, retries=retries)
+    extracted = skipped = 0
+    for name, data in iter_zip_entries(chunks):
+        path = extract_path(extract_to, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        extracted += 1
+        if not name.endswith(".jpg"):
+            continue
+        blob_name = os.path.basename(name)  # images are stored flat in the bucket
+        if blob_name in existing:
+            skipped += 1
+        else:
+            uploader.submit(path, blob_name)
+    stats = uploader.close()
+    stats.update(extracted=extracted, skipped=skipped)
+    print(f"Extracted {extracted} files to {extract_to}; uploaded {stats['uploaded']}, "
+          f"skipped {skipped} already in {store.url}, failed {len(stats['failed'])}")
+    return stats
 
 def track_and_push_dvc(data_path):
     """Uses DVC to track the raw images and push them to the remote storage."""
@@ -95,23 +229,25 @@ def track_and_push_dvc(data_path):
     print("Raw images tracked and pushed with DVC.")
 
 def main():
-    # Ensure GOOGLE_APPLICATION_CREDENTIALS is set
-    if not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
-        raise EnvironmentError("GOOGLE_APPLICATION_CREDENTIALS environment variable is not set.")
-
     # Set your GCS bucket name and raw data path
     gcs_bucket = os.getenv('GCS_RAW_BUCKET', 'pillrx-raw-images') # uses environment variable GCS_RAW_BUCKET if available, otherwise defaults to pillrx-raw-images
+    raw_store_url = os.getenv('RAW_STORE_URL', f'gs://{gcs_bucket}') # a local directory instead of gs://... keeps everything on disk
+    upload_workers = int(os.getenv('INGEST_UPLOAD_WORKERS', '16'))
+    upload_retries = int(os.getenv('INGEST_UPLOAD_RETRIES', '5'))
     raw_data_path = 'data/raw_images' #path where we will put the raw images in the container
 
-    # Download the ZIP file and extract images
-    url = 'https://ftp.nlm.nih.gov/projects/pillbox/pillbox_production_images_full_202008.zip'
-    download_and_extract_zip(url, raw_data_path)
+    # Ensure GOOGLE_APPLICATION_CREDENTIALS is set
+    if raw_store_url.startswith('gs://') and not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
+        raise EnvironmentError("GOOGLE_APPLICATION_CREDENTIALS environment variable is not set.")
 
-    # Upload extracted images to GCS
-    upload_to_gcs(gcs_bucket, raw_data_path)
+    # Stream the ZIP file, extracting images and uploading them while it downloads
+    url = 'https://ftp.nlm.nih.gov/projects/pillbox/pillbox_production_images_full_202008.zip'
+    stats = ingest(prefetch(download_chunks(url)), raw_data_path, open_store(raw_store_url), upload_workers, upload_retries)
+    if stats['failed']:
+        raise RuntimeError(f"{len(stats['failed'])} images failed to upload, e.g. {stats['failed'][:5]}")
 
     # Track the raw images with DVC and push to GCS for versioning
     track_and_push_dvc(raw_data_path)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
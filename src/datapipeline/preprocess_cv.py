@@ -7,8 +7,8 @@ splits them into train/validate/test sets, uploads the processed images to a new
 
 More detailed steps:
 - Load images from the GCS bucket using google-cloud-storage (the images should have been uploaded by dataloader.py before this script runs).
-- Resize each image (e.g., 128x128) - the library Pillow is useful for this.
-- Split the images into training, validation, and test sets (e.g., 70% train, 15% validate, 15% test) - this will be useful: sklearn.model_selection.train_test_split.
+- Resize each image (e.g., 128x128) - the library Pillow is useful for this. Images are resized on a process pool, and a content-hash manifest lets reruns skip images that did not change.
+- Split the images into training, validation, and test sets (e.g., 70% train, 15% validate, 15% test) - each image's split comes from a hash of its name and is recorded in the manifest, so it never changes between runs.
 - Save the resized and split images directly to respective GCS buckets or folders:
   - Train images in `train/`
   - Validation images in `val/`
@@ -24,82 +24,231 @@ Important notes:
 """
 
 import os
-import random
-from google.cloud import storage
-from PIL import Image
 import io
+import json
+import hashlib
+import multiprocessing
 import subprocess
-from sklearn.model_selection import train_test_split
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from blob_store import ParallelUploader, open_store, with_retries
 
-def download_images_from_gcs(bucket_name, local_folder):
-    """Downloads images from a GCS bucket ('pillrx-raw-images') and adds them to a local folder ('data/raw_images') in the container."""
-    print(f"Downloading images from GCS bucket: {bucket_name}")
-    client = storage.Client()
-    bucket = client.bucket(bucket_name)
-    blobs = bucket.list_blobs() #all images from pillrx-raw-images GCS bucket
+MANIFEST_NAME = 'manifest.json'
+SPLITS = ('train', 'val', 'test')
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+RESAMPLE = {'nearest': Image.NEAREST, 'bilinear': Image.BILINEAR, 'bicubic': Image.BICUBIC, 'lanczos': Image.LANCZOS}
 
+def download_images(store, local_folder, num_workers=16):
+    """Downloads the .jpg images of a store ('gs://pillrx-raw-images') missing from a local folder ('data/raw_images') in the container."""
+    print(f"Downloading images from {store.url}")
     os.makedirs(local_folder, exist_ok=True)
+    # check which images already exist in the local path (data/raw_images), which they should since we ran dataloader.py in this same container previously, but this is just to be comprehensive in case we decide to run this script independently from dataloader.py in the future
+    local = set(os.listdir(local_folder))
+    names = [name for name in store.list_names() if name.endswith('.jpg') and os.path.basename(name) not in local]
+    print(f"{len(names)} images to download, {len(local)} already local")
 
-    for blob in blobs: #iterates over each image from the GCS bucket
-        if blob.name.endswith('.jpg'):
-            file_path = os.path.join(local_folder, os.path.basename(blob.name))
-            if not os.path.exists(file_path): #check if that image already exists in the local path (data/raw_images), which it should since we ran dataloader.py in this same container previously, but this is just to be comprehensive in case we decide to run this script independently from dataloader.py in the future 
-                blob.download_to_filename(file_path)
-                print(f"Downloaded {blob.name} to {file_path}")
-            else: # doesn't save the image into the data/raw_images path if it already exists!
-                print(f"File {file_path} already exists locally, skipping download.")
-        else:
-            print("Downloaded image (from GCS bucket pillrx-raw-images) doesn't end with .jpg")
+    def download(name):
+        with_retries(lambda: store.download_file(name, os.path.join(local_folder, os.path.basename(name))))
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        list(executor.map(download, names))
+
+def split_for(image_name, val_fraction=0.15, test_fraction=0.15):
+    """Deterministic split of an image from a hash of its name, independent of which other images exist."""
+    bucket = int(hashlib.sha256(image_name.encode()).hexdigest()[:8], 16) / 0x100000000
+    if bucket < test_fraction:
+        return 'test'
+    if bucket < test_fraction + val_fraction:
+        return 'val'
+    return 'train'
+
+def load_manifest(processed_folder):
+    path = os.path.join(processed_folder, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'options': None, 'images': {}}
+    with open(path) as f:
+        return json.load(f)
+
+def fetch_processed_state(store, processed_folder):
+    """Object names of the processed store ('gs://pillrx-processed-images'); its manifest.json replaces the local one.
+
+    The splits have to agree with what the store holds, not with this container's disk: on a
+    fresh container processed_folder is empty, yet every image already uploaded must keep its split.
+    upload_processed_images() stores the manifest next to the images after each run.
+    """
+    names = store.list_names()
+    if MANIFEST_NAME in names:
+        os.makedirs(processed_folder, exist_ok=True)
+        with_retries(lambda: store.download_file(MANIFEST_NAME, os.path.join(processed_folder, MANIFEST_NAME)))
+    return names
+
+def previous_outputs(processed_folder, stored):
+    """Image stem -> outputs ('train/pill_1.jpg') of it in the split folders or among the stored object names."""
+    names = set(stored)
+    for split_name in SPLITS:
+        if os.path.isdir(os.path.join(processed_folder, split_name)):
+            names.update(f"{split_name}/{file_name}" for file_name in os.listdir(os.path.join(processed_folder, split_name)))
+    outputs = {}
+    for name in names:
+        split_name, _, file_name = name.partition('/')
+        stem, extension = os.path.splitext(file_name)
+        if split_name in SPLITS and extension in EXTENSIONS.values():
+            outputs.setdefault(stem, set()).add(name)
+    return outputs
+
+def save_manifest(processed_folder, manifest):
+    path = os.path.join(processed_folder, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(path + '.tmp', path)
+
+def resize_image(task):
+    """Pool worker: hashes the source and, unless it matches the manifest, resizes it into its split folder."""
+    image_name, source_path, output_path, known_sha256, options = task
+    try:
+        with open(source_path, 'rb') as f:
+            data = f.read()
+        sha256 = hashlib.sha256(data).hexdigest()
+        if sha256 == known_sha256 and os.path.exists(output_path):
+            return image_name, sha256, 'unchanged', None
+        # Same source and options as the stored manifest, only missing on this disk: the output is
+        # rebuilt for DVC, but it matches the stored object so it does not need uploading again
+        status = 'restored' if sha256 == known_sha256 else 'processed'
+        with Image.open(io.BytesIO(data)) as img:
+            if options['draft']:
+                # Let libjpeg decode at 1/2, 1/4 or 1/8 scale, still at least twice the target size
+                img.draft('RGB', (options['image_size'][0] * 2, options['image_size'][1] * 2))
+            img = img.resize(tuple(options['image_size']), RESAMPLE[options['resample']])
+            if options['format'] == 'JPEG' and img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            save_options = {'quality': options['quality']} if options['format'] in ('JPEG', 'WEBP') else {}
+            img.save(output_path + '.tmp', format=options['format'], **save_options)
+        os.replace(output_path + '.tmp', output_path)
+        return image_name, sha256, status, None
+    except Exception as e:
+        return image_name, None, 'error', repr(e)
 
-def process_and_split_images(source_folder, processed_folder, image_size=(128, 128)):
-    """Resizes images and splits them into train, val, and test sets."""
+def process_and_split_images(source_folder, processed_folder, image_size=(128, 128), image_format='JPEG', quality=75,
+                             resample='bicubic', draft=False, num_workers=None, stored=()):
+    """Resizes images into train/val/test folders on a process pool, skipping work a previous run already did.
+
+    processed_folder/manifest.json records, per source image, its content hash, its split and its
+    output file. A rerun only resizes images that are new or whose bytes changed (or every image
+    if the resize options changed), and removes outputs of images no longer in source_folder
+    (or written under another format).
+    Splits are sticky: an image keeps the split it was first given. New images get split_for(),
+    except images an earlier run without a manifest already wrote to a split folder, locally or
+    in the processed store (stored: its object names, from fetch_processed_state()). Any other
+    copy of an image in another split folder is removed, so no image ends up in two splits.
+    draft: decode JPEGs at a reduced scale (as Image.thumbnail does) when the target is much smaller;
+    faster, but the output differs slightly from a full decode, so it is off unless asked for.
+    Returns the output paths (relative to processed_folder) written and removed by this run, so
+    the bucket can be updated to match.
+    """
     print("Processing and splitting images...")
-    images = [f for f in os.listdir(source_folder) if f.endswith('.jpg')] # source_folder = 'data/raw_images'
-    # random.shuffle(images) # MUST BE COMMENTED OUT, OTHERWISE AN IMAGE MIGHT BE UPLOADED TO ALL THREE DATASETS (TRAIN, TEST, VALIDATE) IF THIS SCRIPT IS RUN MULTIPLE TIMES!!!!! random.shuffle randomly reorders the elements (image filenames) in the list.
-
-    # Split into train, validation, and test sets
-    train_val_images, test_images = train_test_split(images, test_size=0.15, random_state=42)
-    train_images, val_images = train_test_split(train_val_images, test_size=0.1765, random_state=42)  # 0.1765 * (1 - 0.15) ≈ 0.15
-
-    splits = {
-        'train': train_images,
-        'val': val_images,
-        'test': test_images
-    }
-
-    for split_name, split_images in splits.items():
-        split_folder = os.path.join(processed_folder, split_name) # processed_folder = 'data/processed_images'. NB!: does not create an actual directory by itself. It simply constructs a string that represents the path to a folder and stores that string in the variable split_folder. The 3 string will be:'data/processed_images/train', 'data/processed_images/val' and 'data/processed_images/test'  
-        os.makedirs(split_folder, exist_ok=True) # creates these directories per for loop cycle if they don't exist: 'data/processed_images/train', 'data/processed_images/val' and 'data/processed_images/test'  
-        for image_name in split_images:
-            try:
-                image_path = os.path.join(source_folder, image_name)
-                with Image.open(image_path) as img:
-                    img = img.resize(image_size)
-                    img.save(os.path.join(split_folder, image_name)) # this line overwrites existing preprocessed images with the same name (like if we run this script 2 times in the same container)
-                print(f"Processed and saved {image_name} to {split_folder}")
-            except Exception as e:
-                print(f"Error processing {image_name}: {e}")
-
-def upload_processed_images_to_gcs(bucket_name, processed_folder):
-    """Uploads processed images from local folders to a GCS bucket."""
-    print(f"Uploading processed images to GCS bucket: {bucket_name}...")
-    client = storage.Client() # creates an instance of the Google Cloud Storage client, which is needed to later interact with the GCS buckets we want to upload to (pillrx-processed-images)
-    bucket = client.bucket(bucket_name) # bucket_name = 'pillrx-processed-images' (client will use your service account's credentials to access this bucket)
-
-    for root, _, files in os.walk(processed_folder): # processed_folder = 'data/processed_images' (This line of code iterates over every file inside data/processed_images/ and its subdirectories (train/, val/, test/)
-        for file_name in files: # loops through all the file names in the current root directory (which would be the train, validation, or test folders)
-            if file_name.endswith('.jpg'):
-                local_file_path = os.path.join(root, file_name)
-                # Construct the blob path by using the folder structure after 'processed_folder'
-                blob_name = os.path.relpath(local_file_path, processed_folder)
-                blob = bucket.blob(blob_name)
-                if not blob.exists(client):
-                    blob.upload_from_filename(local_file_path)
-                    print(f"Uploaded {blob_name} to GCS bucket {bucket_name}")
-                else:
-                    print(f"File {blob_name} already exists in GCS bucket {bucket_name}, skipping upload.")
-            else:
-                print("Not a .jpg file!")
+    options = {'image_size': list(image_size), 'format': image_format, 'quality': quality, 'resample': resample,
+               'draft': draft}
+    extension = EXTENSIONS[image_format]
+    manifest = load_manifest(processed_folder)
+    if manifest['options'] != options:
+        if manifest['images']:
+            print(f"Resize options changed from {manifest['options']} to {options}, re-processing every image")
+        known = {name: dict(entry, sha256=None) for name, entry in manifest['images'].items()}
+    else:
+        known = manifest['images']
+
+    images = sorted(f for f in os.listdir(source_folder) if f.endswith('.jpg')) # source_folder = 'data/raw_images'
+    for split_name in SPLITS:
+        os.makedirs(os.path.join(processed_folder, split_name), exist_ok=True) # 'data/processed_images/train', 'data/processed_images/val' and 'data/processed_images/test'
+    previous = previous_outputs(processed_folder, stored)
+
+    tasks = []
+    for image_name in images:
+        entry = known.get(image_name)
+        if entry is not None:
+            split_name = entry['split']
+        else:
+            earlier = {name.partition('/')[0] for name in previous.get(os.path.splitext(image_name)[0], ())}
+            legacy = [s for s in SPLITS if s in earlier]
+            split_name = legacy[0] if legacy else split_for(image_name)
+        output = os.path.join(split_name, os.path.splitext(image_name)[0] + extension)
+        tasks.append((image_name, os.path.join(source_folder, image_name), os.path.join(processed_folder, output),
+                      entry and entry['sha256'], options))
+
+    images_manifest = {}
+    written, removed, counts = [], [], {'processed': 0, 'restored': 0, 'unchanged': 0, 'error': 0}
+    num_workers = num_workers or os.cpu_count() or 1
+    try:
+        with multiprocessing.Pool(num_workers) as pool:
+            outputs = {task[0]: os.path.relpath(task[2], processed_folder) for task in tasks}
+            splits = {task[0]: os.path.dirname(outputs[task[0]]) for task in tasks}
+            for image_name, sha256, status, error in pool.imap_unordered(resize_image, tasks, chunksize=16):
+                counts[status] += 1
+                if status == 'error':
+                    print(f"Error processing {image_name}: {error}")
+                    continue
+                images_manifest[image_name] = {'sha256': sha256, 'split': splits[image_name], 'output': outputs[image_name]}
+                if status == 'processed':
+                    written.append(outputs[image_name])
+    finally:
+        # Outputs of images dropped from the source, or written under another format or split, are
+        # removed so the split folders only hold what the manifest lists
+        sources = set(images)
+        stale = []
+        for image_name, entry in manifest['images'].items():
+            current = images_manifest.get(image_name)
+            if image_name in sources and (current is None or current['output'] == entry['output']):
+                continue
+            stale.append(entry['output'].replace(os.sep, '/'))
+        for image_name, entry in images_manifest.items():
+            output = entry['output'].replace(os.sep, '/')
+            stale.extend(sorted(previous.get(os.path.splitext(image_name)[0], set()) - {output}))
+        for output in dict.fromkeys(stale):
+            if os.path.exists(os.path.join(processed_folder, output)):
+                os.remove(os.path.join(processed_folder, output))
+            removed.append(output)
+        save_manifest(processed_folder, {'options': options, 'images': images_manifest})
+
+    print(f"Processed {counts['processed']} images, {counts['restored']} restored, {counts['unchanged']} unchanged, "
+          f"{counts['error']} errors ({num_workers} processes)")
+    return written, removed
+
+def upload_processed_images(store, processed_folder, changed=(), removed=(), num_workers=16):
+    """Uploads processed images to a store ('gs://pillrx-processed-images'), keeping the train/val/test folder structure.
+
+    Images missing from the store (one listing) are uploaded, as are those in changed (re-processed
+    outputs that replace an existing object). Objects in removed (stale outputs deleted locally by
+    process_and_split_images) are deleted from the store, unless the same name was written again.
+    Once every image is uploaded, manifest.json is stored too, so the next run (on any container)
+    keeps the same splits.
+    """
+    print(f"Uploading processed images to {store.url}...")
+    existing = store.list_names()
+    changed = {name.replace(os.sep, '/') for name in changed}
+    stale = [name for name in (name.replace(os.sep, '/') for name in removed)
+             if name in existing and name not in changed and not os.path.exists(os.path.join(processed_folder, name))]
+    for name in stale:
+        with_retries(lambda: store.delete(name))
+    uploader = ParallelUploader(store, max_workers=num_workers)
+    for root, _, files in os.walk(processed_folder): # processed_folder = 'data/processed_images' (iterates over train/, val/, test/)
+        for file_name in files:
+            if os.path.splitext(file_name)[1] not in EXTENSIONS.values():
+                continue
+            local_file_path = os.path.join(root, file_name)
+            # Construct the blob path by using the folder structure after 'processed_folder'
+            blob_name = os.path.relpath(local_file_path, processed_folder).replace(os.sep, '/')
+            if blob_name not in existing or blob_name in changed:
+                uploader.submit(local_file_path, blob_name)
+    stats = uploader.close()
+    print(f"Uploaded {stats['uploaded']} processed images to {store.url}, deleted {len(stale)} stale, "
+          f"{len(stats['failed'])} failed")
+    if stats['failed']:
+        raise RuntimeError(f"{len(stats['failed'])} processed images failed to upload, e.g. {stats['failed'][:5]}")
+    with_retries(lambda: store.upload_file(os.path.join(processed_folder, MANIFEST_NAME), MANIFEST_NAME))
+
+def parse_size(value):
+    # "128" or "128x96"
+    width, _, height = value.lower().partition('x')
+    return int(width), int(height or width)
 
 def track_and_push_dvc(data_path):
     """Uses DVC to track the processed images and push them to the remote storage."""
@@ -123,29 +272,41 @@ def track_and_push_dvc(data_path):
     print("Processed images tracked and pushed with DVC.")
 
 def main():
+    # Set bucket names (a local directory instead of gs://... keeps everything on disk)
+    raw_store_url = os.getenv('RAW_STORE_URL', 'gs://pillrx-raw-images')
+    processed_store_url = os.getenv('PROCESSED_STORE_URL', 'gs://pillrx-processed-images')
+
     # Ensure GOOGLE_APPLICATION_CREDENTIALS is set
-    if not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
+    if 'gs://' in raw_store_url + processed_store_url and not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
         raise EnvironmentError("GOOGLE_APPLICATION_CREDENTIALS environment variable is not set.")
 
-    # Set GCS bucket names
-    raw_bucket = 'pillrx-raw-images'
-    processed_bucket = 'pillrx-processed-images'
+    # Resize options
+    image_size = parse_size(os.getenv('CV_IMAGE_SIZE', '128'))
+    image_format = os.getenv('CV_IMAGE_FORMAT', 'JPEG')  # JPEG, PNG or WEBP
+    quality = int(os.getenv('CV_IMAGE_QUALITY', '75'))
+    resample = os.getenv('CV_RESAMPLE', 'bicubic')  # nearest, bilinear, bicubic or lanczos
+    draft = os.getenv('CV_FAST_DECODE', '0') == '1'  # reduced-scale JPEG decoding (opt-in)
+    num_workers = int(os.getenv('CV_WORKERS', '0')) or None  # 0 uses every CPU
 
     # Local paths
     raw_local_folder = 'data/raw_images'
     processed_local_folder = 'data/processed_images'
 
     # Step 1: Download raw images from GCS
-    download_images_from_gcs(raw_bucket, raw_local_folder)
+    download_images(open_store(raw_store_url), raw_local_folder)
 
-    # Step 2: Process images and split into train/val/test
-    process_and_split_images(raw_local_folder, processed_local_folder)
+    # Step 2: Process new/changed images and split into train/val/test, keeping the splits of the images
+    # (and the manifest) already in the processed bucket
+    processed_store = open_store(processed_store_url)
+    stored = fetch_processed_state(processed_store, processed_local_folder)
+    written, removed = process_and_split_images(raw_local_folder, processed_local_folder, image_size, image_format, quality,
+                                       resample, draft, num_workers, stored=stored)
 
-    # Step 3: Upload processed images (from processed_local_folder) to GCS bucket
-    upload_processed_images_to_gcs(processed_bucket, processed_local_folder)
+    # Step 3: Upload processed images (from processed_local_folder) and the manifest to GCS bucket
+    upload_processed_images(processed_store, processed_local_folder, changed=written, removed=removed)
 
     # Step 4: Track processed images with DVC and push to remote storage
     track_and_push_dvc(processed_local_folder)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
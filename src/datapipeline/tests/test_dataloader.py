@@ -0,0 +1,152 @@
+import io
+import os
+import random
+import zipfile
+import pytest
+from blob_store import LocalStore
+from dataloader import extract_path, ingest, iter_zip_entries
+
+
+class Unseekable(io.RawIOBase):
+    """Write-only stream without seek, so zipfile writes data descriptors as a streaming writer would."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+
+def make_archive(files, compression=zipfile.ZIP_DEFLATED, streamed=False, force_zip64=False):
+    target = Unseekable() if streamed else io.BytesIO()
+    with zipfile.ZipFile(target, "w", compression) as archive:
+        for name, data in files.items():
+            info = zipfile.ZipInfo(name)
+            info.compress_type = compression
+            with archive.open(info, "w", force_zip64=force_zip64) as f:
+                f.write(data)
+    return bytes(target.buffer) if streamed else target.getvalue()
+
+
+def chunked(data, size=37):
+    # Small, odd-sized chunks so headers and entries straddle chunk boundaries
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def archive_files(seed=0):
+    rng = random.Random(seed)
+    return {
+        "pillbox/a.jpg": rng.randbytes(3000),
+        "pillbox/b.jpg": b"pill " * 2000,
+        "pillbox/readme.txt": b"",
+        "pillbox/nested/c.jpg": rng.randbytes(10),
+    }
+
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_stored_and_deflated_entries(compression):
+    files = archive_files()
+    data = make_archive(files, compression)
+    assert dict(iter_zip_entries(chunked(data))) == files
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert {info.compress_type for info in archive.infolist()} == {compression}
+
+
+def test_deflated_entries_with_data_descriptors():
+    files = archive_files()
+    data = make_archive(files, streamed=True)
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert all(info.flag_bits & 0x8 for info in archive.infolist())
+    assert dict(iter_zip_entries(chunked(data))) == files
+
+
+def test_stored_entries_with_data_descriptors_are_refused():
+    data = make_archive(archive_files(), zipfile.ZIP_STORED, streamed=True)
+    with pytest.raises(ValueError, match="cannot be streamed"):
+        list(iter_zip_entries(chunked(data)))
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+def test_zip64_entries(streamed):
+    files = archive_files()
+    data = make_archive(files, streamed=streamed, force_zip64=True)
+    assert dict(iter_zip_entries(chunked(data))) == files
+
+
+def test_directories_are_skipped_and_crc_is_checked():
+    files = {"pillbox/": b"", "pillbox/a.jpg": b"abc" * 100}
+    data = make_archive(files, zipfile.ZIP_STORED)
+    assert dict(iter_zip_entries([data])) == {"pillbox/a.jpg": b"abc" * 100}
+    corrupted = data.replace(b"abc" * 100, b"abd" + b"abc" * 99)
+    with pytest.raises(ValueError, match="CRC mismatch"):
+        list(iter_zip_entries([corrupted]))
+
+
+def test_truncated_archive_raises():
+    data = make_archive(archive_files(), zipfile.ZIP_STORED)
+    with pytest.raises(EOFError):
+        list(iter_zip_entries([data[:200]]))
+
+
+def test_extract_path_rejects_escaping_names(tmp_path):
+    root = str(tmp_path / "raw")
+    assert extract_path(root, "pillbox/a.jpg") == os.path.join(root, "pillbox", "a.jpg")
+    for name in ["../evil.jpg", "pillbox/../../evil.jpg", "/etc/evil.jpg"]:
+        with pytest.raises(ValueError, match="Unsafe path"):
+            extract_path(root, name)
+
+
+def test_ingest_refuses_traversal_entries(tmp_path):
+    data = make_archive({"../evil.jpg": b"x"})
+    with pytest.raises(ValueError, match="Unsafe path"):
+        ingest(chunked(data), str(tmp_path / "raw"), LocalStore(str(tmp_path / "bucket")), upload_workers=2)
+    assert not (tmp_path / "evil.jpg").exists()
+
+
+class FlakyStore(LocalStore):
+    """LocalStore whose first upload of each name fails."""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.attempts = {}
+
+    def upload_file(self, local_path, name):
+        self.attempts[name] = self.attempts.get(name, 0) + 1
+        if self.attempts[name] == 1:
+            raise ConnectionError("transient")
+        super().upload_file(local_path, name)
+
+
+def test_ingest_extracts_uploads_and_skips_existing(tmp_path, monkeypatch):
+    monkeypatch.setattr("blob_store.time.sleep", lambda seconds: None)
+    files = archive_files()
+    store = FlakyStore(str(tmp_path / "bucket"))
+    with open(tmp_path / "existing.jpg", "wb") as f:
+        f.write(b"old")
+    LocalStore.upload_file(store, str(tmp_path / "existing.jpg"), "a.jpg")
+
+    stats = ingest(chunked(make_archive(files)), str(tmp_path / "raw"), store, upload_workers=2, retries=2)
+
+    assert stats == {"uploaded": 2, "failed": [], "extracted": 4, "skipped": 1}
+    for name, data in files.items():
+        assert (tmp_path / "raw" / name).read_bytes() == data
+    # Images are stored flat; a.jpg was already in the bucket and is not uploaded again
+    assert store.list_names() == {"a.jpg", "b.jpg", "c.jpg"}
+    assert (tmp_path / "bucket" / "a.jpg").read_bytes() == b"old"
+    assert store.attempts == {"b.jpg": 2, "c.jpg": 2}
+
+
+def test_ingest_reports_uploads_that_keep_failing(tmp_path, monkeypatch):
+    monkeypatch.setattr("blob_store.time.sleep", lambda seconds: None)
+
+    class BrokenStore(LocalStore):
+        def upload_file(self, local_path, name):
+            raise ConnectionError("down")
+
+    stats = ingest(chunked(make_archive(archive_files())), str(tmp_path / "raw"), BrokenStore(str(tmp_path / "bucket")),
+                   upload_workers=2, retries=1)
+    assert stats["uploaded"] == 0 and sorted(stats["failed"]) == ["a.jpg", "b.jpg", "c.jpg"]
@@ -0,0 +1,153 @@
+import os
+import json
+import functools
+import hashlib
+import pytest
+from PIL import Image
+import preprocess_cv
+from blob_store import LocalStore, ParallelUploader
+from preprocess_cv import (MANIFEST_NAME, fetch_processed_state, process_and_split_images, split_for,
+                           upload_processed_images)
+
+
+def write_jpeg(path, color, size=(64, 48)):
+    Image.new("RGB", size, color).save(path, format="JPEG")
+
+
+def read_manifest(processed):
+    with open(os.path.join(processed, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def test_split_for_is_deterministic_and_roughly_proportional():
+    names = [f"pill_{i}.jpg" for i in range(4000)]
+    splits = [split_for(name) for name in names]
+    assert splits == [split_for(name) for name in names]
+    assert abs(splits.count("test") / len(names) - 0.15) < 0.03
+    assert abs(splits.count("val") / len(names) - 0.15) < 0.03
+    assert set(splits) == {"train", "val", "test"}
+
+
+def test_manifest_records_content_hash_split_and_output(tmp_path):
+    source, processed = tmp_path / "raw", tmp_path / "processed"
+    source.mkdir()
+    for i in range(6):
+        write_jpeg(source / f"pill_{i}.jpg", (40 * i, 10, 200))
+
+    written, removed = process_and_split_images(str(source), str(processed), (16, 16), num_workers=1)
+
+    images = read_manifest(processed)["images"]
+    assert sorted(images) == [f"pill_{i}.jpg" for i in range(6)]
+    for name, entry in images.items():
+        assert entry["sha256"] == hashlib.sha256((source / name).read_bytes()).hexdigest()
+        assert entry["split"] == split_for(name)
+        assert entry["output"] == os.path.join(entry["split"], name)
+        with Image.open(processed / entry["output"]) as img:
+            assert img.size == (16, 16)
+    assert sorted(written) == sorted(entry["output"] for entry in images.values())
+    assert removed == []
+
+
+def test_rerun_skips_unchanged_and_cleans_up_removed(tmp_path):
+    source, processed = tmp_path / "raw", tmp_path / "processed"
+    source.mkdir()
+    for i in range(4):
+        write_jpeg(source / f"pill_{i}.jpg", (50 * i, 100, 100))
+    process_and_split_images(str(source), str(processed), (16, 16), num_workers=1)
+    first = read_manifest(processed)["images"]
+
+    written, removed = process_and_split_images(str(source), str(processed), (16, 16), num_workers=1)
+    assert written == [] and removed == []
+
+    write_jpeg(source / "pill_1.jpg", (255, 0, 0))
+    os.remove(source / "pill_2.jpg")
+    written, removed = process_and_split_images(str(source), str(processed), (16, 16), num_workers=1)
+    images = read_manifest(processed)["images"]
+    assert written == [first["pill_1.jpg"]["output"]]
+    assert removed == [first["pill_2.jpg"]["output"]]
+    assert "pill_2.jpg" not in images and not (processed / first["pill_2.jpg"]["output"]).exists()
+    assert images["pill_1.jpg"]["split"] == first["pill_1.jpg"]["split"]
+    assert images["pill_1.jpg"]["sha256"] != first["pill_1.jpg"]["sha256"]
+
+    # Changed resize options re-process everything
+    written, _ = process_and_split_images(str(source), str(processed), (24, 24), num_workers=1)
+    assert len(written) == 3
+
+
+def test_upload_sends_new_and_changed_and_deletes_stale(tmp_path):
+    source, processed = tmp_path / "raw", tmp_path / "processed"
+    source.mkdir()
+    for i in range(4):
+        write_jpeg(source / f"pill_{i}.jpg", (50 * i, 100, 100))
+    store = LocalStore(str(tmp_path / "bucket"))
+    written, removed = process_and_split_images(str(source), str(processed), (16, 16), num_workers=1)
+    upload_processed_images(store, str(processed), written, removed, num_workers=2)
+    outputs = {entry["output"] for entry in read_manifest(processed)["images"].values()}
+    assert store.list_names() == outputs | {MANIFEST_NAME}
+
+    os.remove(source / "pill_3.jpg")
+    written, removed = process_and_split_images(str(source), str(processed), (16, 16), image_format="PNG",
+                                                num_workers=1)
+    upload_processed_images(store, str(processed), written, removed, num_workers=2)
+    outputs = {entry["output"] for entry in read_manifest(processed)["images"].values()}
+    assert all(output.endswith(".png") for output in outputs) and len(outputs) == 3
+    assert store.list_names() == outputs | {MANIFEST_NAME}
+
+
+def other_split(name):
+    return next(split_name for split_name in ("train", "val", "test") if split_name != split_for(name))
+
+
+def fresh_container_run(source, processed, store):
+    stored = fetch_processed_state(store, str(processed))
+    written, removed = process_and_split_images(str(source), str(processed), (16, 16), num_workers=1, stored=stored)
+    upload_processed_images(store, str(processed), written, removed, num_workers=2)
+    return written, removed
+
+
+def test_split_of_an_image_only_in_the_store_is_kept(tmp_path):
+    source = tmp_path / "raw"
+    source.mkdir()
+    for i in range(4):
+        write_jpeg(source / f"pill_{i}.jpg", (50 * i, 100, 100))
+    # A run without a manifest left pill_0 in the bucket under another split than split_for() gives,
+    # and pill_1 in both train and test; this container has no processed images at all
+    store = LocalStore(str(tmp_path / "bucket"))
+    legacy = {"pill_0.jpg": f"{other_split('pill_0.jpg')}/pill_0.jpg", "pill_1.jpg": "train/pill_1.jpg"}
+    for name, output in list(legacy.items()) + [("pill_1.jpg", "test/pill_1.jpg")]:
+        store.upload_file(str(source / name), output)
+
+    written, removed = fresh_container_run(source, tmp_path / "processed", store)
+    images = read_manifest(tmp_path / "processed")["images"]
+    assert images["pill_0.jpg"]["output"] == legacy["pill_0.jpg"]
+    # The train copy is kept, the evaluation copy is deleted
+    assert images["pill_1.jpg"]["output"] == legacy["pill_1.jpg"]
+    assert removed == ["test/pill_1.jpg"]
+    assert store.list_names() == {entry["output"] for entry in images.values()} | {MANIFEST_NAME}
+    with Image.open(os.path.join(store.root, legacy["pill_0.jpg"])) as img:
+        assert img.size == (16, 16)
+
+    # Another fresh container gets the splits from the stored manifest and re-uploads nothing
+    uploaded = []
+    upload_file = store.upload_file
+    store.upload_file = lambda local_path, name: uploaded.append(name) or upload_file(local_path, name)
+    written, removed = fresh_container_run(source, tmp_path / "processed2", store)
+    assert written == [] and removed == [] and uploaded == [MANIFEST_NAME]
+    assert read_manifest(tmp_path / "processed2")["images"] == images
+    assert os.path.exists(tmp_path / "processed2" / legacy["pill_0.jpg"])
+
+
+def test_manifest_is_stored_only_after_every_image_is_uploaded(tmp_path, monkeypatch):
+    source, processed = tmp_path / "raw", tmp_path / "processed"
+    source.mkdir()
+    write_jpeg(source / "pill_0.jpg", (10, 20, 30))
+    store = LocalStore(str(tmp_path / "bucket"))
+    written, removed = process_and_split_images(str(source), str(processed), (16, 16), num_workers=1)
+
+    def failing_upload(local_path, name):
+        raise OSError("unavailable")
+    store.upload_file = failing_upload
+    monkeypatch.setattr(preprocess_cv, "ParallelUploader", functools.partial(ParallelUploader, base_delay=0))
+    with pytest.raises(RuntimeError):
+        upload_processed_images(store, str(processed), written, removed, num_workers=1)
+    assert MANIFEST_NAME not in store.list_names()
@@ -0,0 +1,85 @@
+"""
+Chunking throughput and chunk counts per strategy and process count.
+
+Writes a synthetic reviews TSV with the drugsCom columns (reviews of a few to a few dozen
+sentences), then runs chunk_tsv for each --chunk_type and worker count, reporting rows/s,
+chunks per row and mean chunk length. The previous chunk() (one row-wise apply, one chunk per
+review) is timed on the same file for reference.
+
+usage (from src/models):
+    python bench_chunking.py --num_rows 100000 --workers 1 2 4
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+import pandas as pd
+from chunking import SPLITTERS, chunk_tsv
+
+TOPICS = [
+    "I started this for my {condition} and the first week was rough",
+    "The side effects were mostly nausea and a headache in the mornings",
+    "My doctor raised the dose after a month because nothing changed",
+    "Insurance would not cover it so I paid out of pocket",
+    "After three months my {condition} is finally under control",
+    "I gained some weight which I was not happy about",
+    "Sleep was the worst part, I woke up every night at 3am",
+]
+
+
+def make_tsv(path, num_rows, seed=0):
+    rng = random.Random(seed)
+    conditions = ["Depression", "Birth Control", "Pain", "Anxiety", "Acne", "Insomnia", None]
+    rows = []
+    for i in range(num_rows):
+        condition = rng.choice(conditions)
+        sentences = [rng.choice(TOPICS).format(condition=condition or "condition") + rng.choice([".", "!", "."])
+                     for _ in range(rng.choice([2, 3, 5, 8, 12, 25]))]
+        rows.append(dict(uniqueID=i, drugName=f"Drug{i % 700}", condition=condition, review=f"\"{' '.join(sentences)}\"",
+                         rating=float(rng.randint(1, 10)), date="May 20, 2012", usefulCount=rng.randint(0, 300)))
+    pd.DataFrame(rows).to_csv(path, sep="\t", index=False)
+
+
+def previous_chunk(tsv_path):
+    df = pd.read_csv(tsv_path, sep='\t')
+    df['chunk'] = df.apply(lambda x: f"condition:{x['condition']}, review:\"{x['review']}\", rating:{x['rating']}, date:{x['date']}, usefulCount:{x['usefulCount']}", axis=1)
+    return df[['drugName', 'chunk']]
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as root:
+        tsv_path = os.path.join(root, "reviews.tsv")
+        make_tsv(tsv_path, args.num_rows)
+        print(f"{args.num_rows} reviews, {os.path.getsize(tsv_path) / 2**20:.0f} MB TSV, {os.cpu_count()} CPUs\n")
+
+        start = time.perf_counter()
+        chunks = previous_chunk(tsv_path)
+        seconds = time.perf_counter() - start
+        print(f"previous chunk(): {len(chunks)} chunks, {args.num_rows / seconds:.0f} rows/s\n")
+
+        rows = []
+        for method in args.chunk_types:
+            for workers in args.workers:
+                stats = chunk_tsv(tsv_path, os.path.join(root, "outputs"), method, args.chunk_size, args.chunk_overlap,
+                                  workers, args.batch_rows)
+                rows.append((method, workers, stats))
+
+        print(f"\n{'strategy':>16} {'procs':>5} {'rows/s':>8} {'chunks':>8} {'chunks/row':>10} {'chars/chunk':>11}")
+        for method, workers, stats in rows:
+            print(f"{method:>16} {workers:>5} {stats['rows'] / stats['seconds']:>8.0f} {stats['chunks']:>8} "
+                  f"{stats['chunks'] / stats['rows']:>10.2f} {stats['chars'] / stats['chunks']:>11.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the chunking strategies.")
+    parser.add_argument("--num_rows", type=int, default=100000, help="Synthetic reviews to chunk.")
+    parser.add_argument("--chunk_types", nargs="+", default=list(SPLITTERS), help="Strategies to compare.")
+    parser.add_argument("--chunk_size", type=int, default=350, help="Maximum review characters per chunk.")
+    parser.add_argument("--chunk_overlap", type=int, default=20, help="Characters shared by consecutive chunks.")
+    parser.add_argument("--batch_rows", type=int, default=10000, help="Rows per shard.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Process counts to compare.")
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,95 @@
+"""
+Data-parallel training throughput (samples/sec) against the number of CPU processes.
+
+Starts each world size as local processes the way torchrun would (RANK/WORLD_SIZE/LOCAL_RANK
+environment, gloo backend), trains a ModelPair through train_model on a synthetic shard-cached
+dataset read with DistributedSampler, and checks that every process ends with the same weights.
+Scaling needs free cores: each process gets available CPUs / processes intra-op threads.
+
+usage (from src/models):
+    python bench_ddp.py --processes 1 2 4 --num_images 1024 --batch_size 32
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import torch
+import torch.nn as nn
+import torch.multiprocessing as mp
+import torch.distributed as dist
+from torchvision import models
+from bench_shard_cache import make_synthetic_dataset
+from shard_cache import build_shards
+from distributed import setup_distributed, cleanup_distributed, local_device, world_size
+from models import ModelPair
+from train import train_model
+from utils import available_cpus, load_data
+
+
+def small_model(num_classes):
+    model = models.resnet18(weights=None)
+    model.fc = nn.Linear(model.fc.in_features, num_classes)
+    return model
+
+
+def worker(local_rank, processes, args, csv_file, data_dir, shard_dir, results):
+    os.environ.update(RANK=str(local_rank), WORLD_SIZE=str(processes), LOCAL_RANK=str(local_rank),
+                      LOCAL_WORLD_SIZE=str(processes), MASTER_ADDR="127.0.0.1", MASTER_PORT=str(args.port + processes))
+    setup_distributed("gloo")
+    device = local_device("cpu")
+    torch.manual_seed(0)
+    model = ModelPair(small_model(12), small_model(8))
+    loader = load_data(csv_file, data_dir, batch_size=args.batch_size, shuffle=True, multi_label=True,
+                       shard_dir=shard_dir, num_workers=0, distributed=True)
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+
+    train_model(model, loader, loader, nn.CrossEntropyLoss(), optimizer, device, 1)  # warm-up epoch
+    dist.barrier()
+    start = time.perf_counter()
+    train_model(model, loader, loader, nn.CrossEntropyLoss(), optimizer, device, args.epochs, val_every=args.epochs + 1)
+    dist.barrier()
+    seconds = time.perf_counter() - start
+
+    # Every replica must hold identical weights after DDP's gradient averaging
+    checksum = torch.stack([p.detach().double().sum() for p in model.parameters()])
+    reference = checksum.clone()
+    dist.broadcast(reference, src=0)
+    if local_rank == 0:
+        results.put((seconds, world_size()))
+    results.put(bool(torch.equal(checksum, reference)))
+    cleanup_distributed()
+
+
+def main(args):
+    print(f"{available_cpus()} CPUs available")
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as root:
+        csv_file, data_dir = make_synthetic_dataset(root, args.num_images, 256)
+        shard_dir = os.path.join(root, "shards")
+        build_shards(csv_file, data_dir, shard_dir, image_size=args.image_size)
+
+        print(f"\n{'processes':>10} {'epoch s':>9} {'samples/s':>10} {'scaling':>8} {'replicas agree':>15}")
+        baseline = None
+        for processes in args.processes:
+            results = ctx.SimpleQueue()
+            mp.spawn(worker, args=(processes, args, csv_file, data_dir, shard_dir, results), nprocs=processes)
+            outputs = [results.get() for _ in range(processes + 1)]
+            seconds, _ = next(output for output in outputs if isinstance(output, tuple))
+            agree = all(output for output in outputs if isinstance(output, bool))
+            rate = args.epochs * args.num_images / seconds
+            baseline = baseline or rate
+            print(f"{processes:>10} {seconds / args.epochs:>9.2f} {rate:>10.1f} {rate / baseline:>7.2f}x {str(agree):>15}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark DDP training throughput on CPU processes.')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4], help='World sizes to compare.')
+    parser.add_argument('--num_images', type=int, default=1024, help='Synthetic training images.')
+    parser.add_argument('--image_size', type=int, default=224, help='Shard image size.')
+    parser.add_argument('--batch_size', type=int, default=32, help='Per-process batch size.')
+    parser.add_argument('--epochs', type=int, default=2, help='Timed epochs per world size.')
+    parser.add_argument('--port', type=int, default=29600, help='Base rendezvous port.')
+
+    args = parser.parse_args()
+    main(args)
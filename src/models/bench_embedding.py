@@ -0,0 +1,74 @@
+"""
+Embedding throughput: the previous generate_text_embeddings loop (fixed batches of 100, one
+request at a time, sleep(1) between requests) against EmbeddingScheduler.
+
+Both run against FakeEmbeddingProvider, which simulates request latency, a per-minute quota
+and transient failures, so no Vertex AI project is needed. The scheduler's output is checked
+against the sequential output, item by item.
+
+usage (from src/models):
+    python bench_embedding.py --num_chunks 5000 --latency_ms 300 --quota_rpm 300 --concurrency 8
+"""
+
+import time
+import random
+import argparse
+import numpy as np
+from embedding_scheduler import EmbeddingScheduler, FakeEmbeddingProvider
+
+
+def make_chunks(num_chunks, seed=0):
+    # Mostly short char-split chunks with some long semantic-split ones
+    rng = random.Random(seed)
+    words = ["tablet", "capsule", "mg", "dose", "daily", "patients", "hepatic", "renal", "adverse", "reactions"]
+    lengths = [rng.choice([20, 30, 40, 60]) if rng.random() < 0.9 else rng.randint(200, 600) for _ in range(num_chunks)]
+    return [f"{i} " + " ".join(rng.choice(words) for _ in range(length)) for i, length in enumerate(lengths)]
+
+
+def sequential_embed(provider, chunks, batch_size=100, sleep=1.0):
+    # What generate_text_embeddings did: one request at a time, no retries, fixed pause
+    embeddings = []
+    for i in range(0, len(chunks), batch_size):
+        embeddings.extend(provider.embed(chunks[i:i + batch_size]))
+        time.sleep(sleep)
+    return embeddings
+
+
+def main(args):
+    chunks = make_chunks(args.num_chunks)
+    print(f"{len(chunks)} chunks, {args.latency_ms} ms per request, quota {args.quota_rpm} requests/min, "
+          f"{args.failure_rate:.0%} transient failures")
+
+    # The previous loop had no retries, so it only finishes against a provider that never fails
+    provider = FakeEmbeddingProvider(args.dimensionality, args.latency_ms, args.quota_rpm)
+    start = time.perf_counter()
+    expected = sequential_embed(provider, chunks)
+    sequential_seconds = time.perf_counter() - start
+    print(f"sequential: {sequential_seconds:.1f}s, {provider.requests} requests, {len(chunks) / sequential_seconds:.0f} chunks/s")
+
+    provider = FakeEmbeddingProvider(args.dimensionality, args.latency_ms, args.quota_rpm, args.failure_rate, seed=1)
+    scheduler = EmbeddingScheduler(provider, requests_per_minute=args.rpm, max_concurrency=args.concurrency,
+                                   base_delay=args.base_delay, progress_every=0)
+    start = time.perf_counter()
+    embeddings = scheduler.embed(chunks)
+    scheduled_seconds = time.perf_counter() - start
+    print(f"scheduler:  {scheduled_seconds:.1f}s, {provider.requests} requests, {len(chunks) / scheduled_seconds:.0f} chunks/s")
+
+    if not np.array_equal(np.asarray(embeddings), np.asarray(expected)):
+        raise SystemExit("scheduler embeddings differ from the sequential ones")
+    print(f"\nsame embeddings, in order; speedup {sequential_seconds / scheduled_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the embedding scheduler against the sequential loop.")
+    parser.add_argument("--num_chunks", type=int, default=5000, help="Synthetic chunks to embed.")
+    parser.add_argument("--dimensionality", type=int, default=256, help="Embedding size.")
+    parser.add_argument("--latency_ms", type=float, default=300, help="Simulated time per embedding request.")
+    parser.add_argument("--quota_rpm", type=int, default=300, help="Requests per minute the fake provider accepts.")
+    parser.add_argument("--failure_rate", type=float, default=0.02, help="Fraction of scheduler requests failing transiently.")
+    parser.add_argument("--rpm", type=int, default=None, help="Scheduler client-side pacing (default: none, rely on backoff).")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent requests.")
+    parser.add_argument("--base_delay", type=float, default=1.0, help="First backoff delay in seconds.")
+
+    args = parser.parse_args()
+    main(args)
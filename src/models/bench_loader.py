@@ -0,0 +1,57 @@
+"""
+DataLoader throughput (samples/sec) against worker count on a synthetic image directory.
+
+For each worker count, the first epoch includes worker start-up; later epochs reuse the
+persistent workers. Use --shard to benchmark the shard cache path instead of JPEG decoding.
+
+usage (from src/models):
+    python bench_loader.py --num_images 2000 --workers 0 1 2 4 8 --batch_size 128
+"""
+
+import os
+import time
+import argparse
+import tempfile
+from bench_shard_cache import make_synthetic_dataset
+from shard_cache import build_shards
+from utils import available_cpus, load_data
+
+
+def sweep(dataloader):
+    start = time.perf_counter()
+    for inputs, labels in dataloader:
+        pass
+    return time.perf_counter() - start
+
+
+def main(args):
+    print(f"{available_cpus()} CPUs available")
+    with tempfile.TemporaryDirectory() as root:
+        csv_file, data_dir = make_synthetic_dataset(root, args.num_images, args.source_size)
+        shard_dir = None
+        if args.shard:
+            shard_dir = os.path.join(root, "shards")
+            build_shards(csv_file, data_dir, shard_dir)
+
+        print(f"\n{'workers':>8} {'first epoch/s':>14} {'steady samples/s':>17}")
+        for num_workers in args.workers:
+            dataloader = load_data(csv_file, data_dir, batch_size=args.batch_size, shuffle=True, multi_label=True,
+                                   shard_dir=shard_dir, num_workers=num_workers, pin_memory=args.pin_memory)
+            first = sweep(dataloader)
+            steady = min(sweep(dataloader) for _ in range(args.epochs))
+            print(f"{num_workers:>8} {args.num_images / first:>14.0f} {args.num_images / steady:>17.0f}")
+            del dataloader  # shut the persistent workers down before the next configuration
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark DataLoader throughput against worker count.')
+    parser.add_argument('--num_images', type=int, default=2000, help='Synthetic images to generate.')
+    parser.add_argument('--source_size', type=int, default=800, help='Width of the synthetic JPEGs.')
+    parser.add_argument('--batch_size', type=int, default=128, help='DataLoader batch size.')
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4, 8], help='Worker counts to compare.')
+    parser.add_argument('--epochs', type=int, default=2, help='Steady-state epochs per configuration (best is reported).')
+    parser.add_argument('--pin_memory', action='store_true', help='Pin batches (only meaningful with CUDA).')
+    parser.add_argument('--shard', action='store_true', help='Read from the shard cache instead of decoding JPEGs.')
+
+    args = parser.parse_args()
+    main(args)
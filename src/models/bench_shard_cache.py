@@ -0,0 +1,96 @@
+"""
+Epoch time of PillDataset reading JPEGs vs reading the shard cache from shard_cache.py.
+
+Generates a synthetic image directory and annotations CSV (same columns layout as
+encoded_*_annotations.csv), builds the shards once, then times full DataLoader sweeps
+for both paths and checks they return the same pixels.
+
+usage (from src/models):
+    python bench_shard_cache.py --num_images 2000 --source_size 800 --epochs 3
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+import pandas as pd
+import torch
+from PIL import Image, ImageDraw
+from shard_cache import build_shards
+from utils import load_data
+
+
+def make_synthetic_dataset(root, num_images, source_size, seed=0):
+    """Writes num_images JPEG pill-like photos to root/images and returns (csv_file, data_dir)."""
+    rng = random.Random(seed)
+    data_dir = os.path.join(root, "images")
+    os.makedirs(data_dir, exist_ok=True)
+    rows = []
+    for i in range(num_images):
+        name = f"pill_{i:06d}"
+        image = Image.new("RGB", (source_size, int(source_size * 0.75)), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        x, y, r = rng.randrange(source_size // 4, source_size // 2), rng.randrange(source_size // 4, source_size // 2), source_size // 5
+        draw.ellipse([x - r, y - r, x + r, y + r], fill=tuple(rng.randrange(256) for _ in range(3)))
+        draw.text((x - r // 2, y), f"M {i % 100}", fill=(0, 0, 0))
+        image.save(os.path.join(data_dir, name + ".jpg"), quality=90)
+        rows.append({"splimage": name, "splshape_text_encoded": rng.randrange(8),
+                     "splcolor_text_encoded": rng.randrange(12), "medicine_name_encoded": rng.randrange(100)})
+    csv_file = os.path.join(root, "annotations.csv")
+    pd.DataFrame(rows).to_csv(csv_file, index=False)
+    return csv_file, data_dir
+
+
+def time_epochs(dataloader, epochs):
+    times = []
+    for _ in range(epochs):
+        start = time.perf_counter()
+        for inputs, labels in dataloader:
+            if inputs.dtype == torch.uint8:
+                inputs = inputs.float().div_(255)  # what train.py does on the device
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as root:
+        print(f"Generating {args.num_images} synthetic {args.source_size}px images...")
+        csv_file, data_dir = make_synthetic_dataset(root, args.num_images, args.source_size)
+        shard_dir = os.path.join(root, "shards")
+
+        start = time.perf_counter()
+        build_shards(csv_file, data_dir, shard_dir, shard_size=args.shard_size, num_workers=args.build_workers or None)
+        build_seconds = time.perf_counter() - start
+
+        jpeg_loader = load_data(csv_file, data_dir, batch_size=args.batch_size, shuffle=True)
+        shard_loader = load_data(csv_file, data_dir, batch_size=args.batch_size, shuffle=True, shard_dir=shard_dir)
+
+        # Same pixels either way
+        jpeg_image, _ = jpeg_loader.dataset[0]
+        shard_image, _ = shard_loader.dataset[0]
+        assert torch.equal(jpeg_image, shard_image.float() / 255), "shard pixels differ from the JPEG path"
+
+        jpeg_epoch = time_epochs(jpeg_loader, args.epochs)
+        shard_epoch = time_epochs(shard_loader, args.epochs)
+
+    print(f"\n{'path':>6} {'epoch s':>9} {'images/sec':>11}")
+    print(f"{'jpeg':>6} {jpeg_epoch:>9.2f} {args.num_images / jpeg_epoch:>11.0f}")
+    print(f"{'shard':>6} {shard_epoch:>9.2f} {args.num_images / shard_epoch:>11.0f}")
+    print(f"\none-time shard build: {build_seconds:.2f}s; "
+          f"{args.sweeps} sweeps (color + shape x 100 epochs): jpeg {jpeg_epoch * args.sweeps / 60:.1f} min, "
+          f"shard {(build_seconds + shard_epoch * args.sweeps) / 60:.1f} min")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the decoded-image shard cache.')
+    parser.add_argument('--num_images', type=int, default=2000, help='Synthetic images to generate.')
+    parser.add_argument('--source_size', type=int, default=800, help='Width of the synthetic JPEGs.')
+    parser.add_argument('--batch_size', type=int, default=64, help='DataLoader batch size.')
+    parser.add_argument('--epochs', type=int, default=3, help='Timed sweeps per path (best is reported).')
+    parser.add_argument('--shard_size', type=int, default=4096, help='Images per shard.')
+    parser.add_argument('--build_workers', type=int, default=0, help='Shard build processes (0 uses all CPUs).')
+    parser.add_argument('--sweeps', type=int, default=200, help='Dataset sweeps of a full training run, for the projection.')
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,118 @@
+"""
+Recall and latency of LocalVectorStore against brute-force cosine similarity.
+
+Builds an index from synthetic unit vectors, clustered on a low-dimensional manifold, with drugName
+assigned with a skewed distribution like reviews per drug. For noisy queries near indexed points it
+compares the top-k of:
+- brute force: one matrix product over the whole in-memory matrix (the reference),
+- the local index, exact scan of the memory-mapped matrix,
+- the local index, IVF with each --nprobe,
+- searches filtered on one drugName, against brute force restricted to that drug.
+Recall@k is the share of the brute-force top-k found; latency is per single query.
+
+usage (from src/models):
+    python bench_vector_store.py --num_vectors 200000 --dimensionality 256 --queries 200
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+from vector_store import LocalVectorStore, normalize, top_k
+
+
+def make_vectors(num_vectors, dimensionality, num_clusters, noise, latent_dimensionality=32, seed=0):
+    # Text embeddings vary along far fewer directions than they have dimensions: clustered points
+    # in a latent space, projected to dimensionality, plus a little isotropic noise
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_clusters, latent_dimensionality))
+    projection = rng.standard_normal((latent_dimensionality, dimensionality)) / np.sqrt(latent_dimensionality)
+    vectors = np.empty((num_vectors, dimensionality), dtype=np.float32)
+    for i in range(0, num_vectors, 65536):
+        n = min(65536, num_vectors - i)
+        latent = centers[rng.integers(0, num_clusters, n)] + noise * rng.standard_normal((n, latent_dimensionality))
+        vectors[i:i + n] = normalize(latent @ projection + 0.1 * rng.standard_normal((n, dimensionality)) / np.sqrt(dimensionality))
+    return vectors
+
+
+def timed_queries(search, queries):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        latencies.append(time.perf_counter() - start)
+    return results, np.array(latencies) * 1000
+
+
+def recall(results, reference, k):
+    return np.mean([len(set(result[:k]) & set(expected[:k])) / max(min(k, len(expected)), 1)
+                    for result, expected in zip(results, reference)])
+
+
+def report(name, latencies, value):
+    print(f"{name:>24} {value:>9.4f} {np.median(latencies):>8.2f} {np.percentile(latencies, 95):>8.2f}")
+
+
+def main(args):
+    rng = np.random.default_rng(1)
+    vectors = make_vectors(args.num_vectors, args.dimensionality, args.clusters, args.noise)
+    # Zipf-like: a few drugs have many reviews, most have few
+    drugs = np.minimum(rng.zipf(1.3, args.num_vectors), args.drugs) - 1
+    drug_names = [f"drug{d}" for d in drugs]
+    picks = rng.choice(args.num_vectors, args.queries, replace=False)
+    # Queries near, but not at, indexed points
+    queries = normalize(vectors[picks] + 0.2 * rng.standard_normal(vectors[picks].shape) / np.sqrt(args.dimensionality)).astype(np.float32)
+    print(f"{args.num_vectors} x {args.dimensionality} vectors, {len(set(drugs))} drugs, {args.queries} queries, k={args.k}\n")
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "index")
+        batches = ((list(map(str, range(i, i + 10000))), drug_names[i:i + 10000], [""] * len(vectors[i:i + 10000]), vectors[i:i + 10000])
+                   for i in range(0, args.num_vectors, 10000))
+        LocalVectorStore.build(path, batches, args.dimensionality, nlist=args.nlist)
+        store = LocalVectorStore(path)
+        row_ids = np.asarray(store.row_ids)
+
+        print(f"\n{'search':>24} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        reference, latencies = timed_queries(lambda q: list(top_k(vectors @ q, args.k)), queries)
+        report("brute force (in memory)", latencies, 1.0)
+
+        results, latencies = timed_queries(lambda q: list(row_ids[store.search_positions(q, args.k, exact=True)[0]]), queries)
+        report("local exact (mmap)", latencies, recall(results, reference, args.k))
+        for nprobe in args.nprobe:
+            results, latencies = timed_queries(lambda q: list(row_ids[store.search_positions(q, args.k, nprobe=nprobe)[0]]), queries)
+            report(f"local IVF nprobe={nprobe}", latencies, recall(results, reference, args.k))
+
+        # Filtered: each query restricted to the drug of the point it was made from
+        query_drugs = [drug_names[i] for i in picks]
+        masks = {name: np.array([d == name for d in drug_names]) for name in set(query_drugs)}
+        filtered_reference, latencies = [], []
+        for query, name in zip(queries, query_drugs):
+            start = time.perf_counter()
+            rows = np.flatnonzero(masks[name])
+            filtered_reference.append(list(rows[top_k(vectors[rows] @ query, args.k)]))
+            latencies.append((time.perf_counter() - start) * 1000)
+        report("brute force, drugName", np.array(latencies), 1.0)
+        results, latencies = [], []
+        for query, name in zip(queries, query_drugs):
+            start = time.perf_counter()
+            results.append(list(row_ids[store.search_positions(query, args.k, drug_name=name)[0]]))
+            latencies.append((time.perf_counter() - start) * 1000)
+        report("local, drugName", np.array(latencies), recall(results, filtered_reference, args.k))
+        store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the local vector index against brute-force cosine.")
+    parser.add_argument("--num_vectors", type=int, default=200000, help="Indexed vectors.")
+    parser.add_argument("--dimensionality", type=int, default=256, help="Embedding size.")
+    parser.add_argument("--clusters", type=int, default=2000, help="Clusters in the synthetic data.")
+    parser.add_argument("--noise", type=float, default=0.6, help="Spread of points around their cluster centre.")
+    parser.add_argument("--drugs", type=int, default=3000, help="Distinct drugName values.")
+    parser.add_argument("--queries", type=int, default=200, help="Queries to time.")
+    parser.add_argument("--k", type=int, default=10, help="Results per query.")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default about sqrt of the vector count).")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32], help="IVF lists scanned per query.")
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,76 @@
+import os
+import queue
+import threading
+import torch
+
+
+def clone_state(state):
+    """Deep CPU copy of a (possibly nested) state_dict, detached from the live training tensors."""
+    if torch.is_tensor(state):
+        return state.detach().to("cpu", copy=True)
+    if isinstance(state, dict):
+        return type(state)((key, clone_state(value)) for key, value in state.items())
+    if isinstance(state, (list, tuple)):
+        return type(state)(clone_state(value) for value in state)
+    return state
+
+
+class AsyncCheckpointer:
+    """Writes training checkpoints to disk on a background thread.
+
+    save() snapshots the state on the caller's thread (a device->CPU copy) and returns; the
+    torch.save runs in the background. Each file is written to a temporary name and renamed, so
+    a crash mid-write leaves the previous checkpoint intact. If a write is still in flight when
+    the next one arrives, the older pending one is dropped (only the latest state matters).
+    Write errors are raised from the next save()/close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = queue.Queue(maxsize=1)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self.thread.start()
+
+    def save(self, state):
+        self._raise_error()
+        state = clone_state(state)
+        try:
+            self.pending.get_nowait()  # superseded by this one
+        except queue.Empty:
+            pass
+        self.pending.put(state)
+
+    def close(self):
+        """Waits for the last checkpoint to reach disk."""
+        self.pending.put(None)
+        self.thread.join()
+        self._raise_error()
+
+    def _run(self):
+        while True:
+            state = self.pending.get()
+            if state is None:
+                return
+            try:
+                directory = os.path.dirname(os.path.abspath(self.path))
+                os.makedirs(directory, exist_ok=True)
+                tmp_path = self.path + ".tmp"
+                torch.save(state, tmp_path)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                self.error = e
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError(f"Failed to write checkpoint {self.path}") from error
+
+
+def load_checkpoint(path, model, optimizer, device):
+    """Restores model and optimizer from a checkpoint written during train_model and returns it."""
+    checkpoint = torch.load(path, map_location=device)
+    model.load_state_dict(checkpoint["model"])
+    optimizer.load_state_dict(checkpoint["optimizer"])
+    torch.set_rng_state(checkpoint["rng_state"].cpu())
+    return checkpoint
@@ -0,0 +1,170 @@
+"""
+Chunking strategies for preprocess_rag.py, run over shards of the reviews TSV on a process pool.
+
+Each review row becomes one or more chunks in the format the RAG collection uses,
+    condition:<condition>, review:"<piece of the review>", rating:<rating>, date:<date>, usefulCount:<count>
+so every piece keeps the row's context. Reviews no longer than chunk_size stay whole. Strategies:
+- char-split: fixed windows of chunk_size characters, consecutive windows sharing chunk_overlap.
+- recursive-split: splits on paragraphs, lines, sentences, then words, and merges the pieces back
+  up to chunk_size with about chunk_overlap characters repeated between chunks.
+- semantic-split: groups consecutive sentences, starting a new chunk where the next sentence is
+  lexically far from the previous one (top breakpoint_percentile of a review's distances) or the
+  chunk would exceed chunk_size. Similarity is cosine over word counts, computed locally,
+  so workers make no embedding requests. No overlap.
+
+chunk_tsv() writes shard n of batch_rows rows to chunks-<method>-<n>.jsonl.
+"""
+
+import os
+import re
+import glob
+import time
+import multiprocessing
+from collections import Counter, deque
+import numpy as np
+import pandas as pd
+
+SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+WORD = re.compile(r"\w+")
+
+
+def char_split(text, chunk_size, chunk_overlap):
+    step = chunk_size - chunk_overlap
+    return [text[i:i + chunk_size] for i in range(0, max(len(text) - chunk_overlap, 1), step)]
+
+
+def merge_pieces(pieces, separator, chunk_size, chunk_overlap):
+    """Joins pieces into chunks of up to chunk_size, starting each chunk with the last pieces of
+    the previous one that fit in chunk_overlap."""
+    chunks, current, length = [], [], 0
+    for piece in pieces:
+        extra = len(piece) + (len(separator) if current else 0)
+        if current and length + extra > chunk_size:
+            chunks.append(separator.join(current))
+            while current and (length > chunk_overlap or length + extra > chunk_size):
+                length -= len(current[0]) + (len(separator) if len(current) > 1 else 0)
+                current.pop(0)
+            extra = len(piece) + (len(separator) if current else 0)
+        current.append(piece)
+        length += extra
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def split_keeping_separators(text, chunk_size, chunk_overlap, separators):
+    if len(text) <= chunk_size:
+        return [text]
+    separator = next(s for s in separators if s == "" or s in text)
+    finer = separators[separators.index(separator) + 1:]
+    # Each part keeps its trailing separator, so the parts concatenate back to the text
+    parts = re.split(f"(?<={re.escape(separator)})", text) if separator else list(text)
+    pieces = []
+    for part in parts:
+        if len(part) <= chunk_size:
+            pieces.append(part)
+        else:
+            pieces.extend(split_keeping_separators(part, chunk_size, chunk_overlap, finer))
+    return merge_pieces([piece for piece in pieces if piece], "", chunk_size, chunk_overlap)
+
+
+def recursive_split(text, chunk_size, chunk_overlap, separators=SEPARATORS):
+    chunks = [chunk.strip() for chunk in split_keeping_separators(text, chunk_size, chunk_overlap, separators)]
+    return [chunk for chunk in chunks if chunk] or [text.strip()]
+
+
+def cosine_similarity(a, b):
+    # a, b: word Counters; sentences are short enough that this beats a vectorizer call per review
+    dot = sum(count * b[word] for word, count in a.items())
+    norms = sum(c * c for c in a.values()) * sum(c * c for c in b.values())
+    return dot / norms ** 0.5 if norms else 0.0
+
+
+def semantic_split(text, chunk_size, chunk_overlap, breakpoint_percentile=95):
+    if len(text) <= chunk_size:
+        return [text]
+    sentences = [sentence for sentence in SENTENCE_END.split(text) if sentence]
+    if len(sentences) < 2:
+        return recursive_split(text, chunk_size, chunk_overlap)
+    counts = [Counter(WORD.findall(sentence.lower())) for sentence in sentences]
+    distances = [1 - cosine_similarity(a, b) for a, b in zip(counts, counts[1:])]
+    threshold = np.percentile(distances, breakpoint_percentile)
+
+    chunks, current = [], sentences[0]
+    for sentence, distance in zip(sentences[1:], distances):
+        if distance > threshold or len(current) + 1 + len(sentence) > chunk_size:
+            chunks.append(current)
+            current = sentence
+        else:
+            current += " " + sentence
+    chunks.append(current)
+    # A single sentence longer than chunk_size is cut like recursive-split
+    return [piece for chunk in chunks for piece in
+            (recursive_split(chunk, chunk_size, chunk_overlap) if len(chunk) > chunk_size else [chunk])]
+
+
+SPLITTERS = {"char-split": char_split, "recursive-split": recursive_split, "semantic-split": semantic_split}
+
+
+def build_chunks(df, method="char-split", chunk_size=350, chunk_overlap=20):
+    """drugName/chunk DataFrame with one row per piece of each review."""
+    split = SPLITTERS[method]
+    # str() formats values (and NaN) the way the original f-string did
+    text = {column: df[column].map(str) for column in ["condition", "review", "rating", "date", "usefulCount"]}
+    pieces = text["review"].map(lambda review: split(review, chunk_size, chunk_overlap))
+    rows = pd.DataFrame({"drugName": df["drugName"], "piece": pieces, **{c: text[c] for c in text if c != "review"}})
+    rows = rows.explode("piece", ignore_index=True)
+    # Column-wise string concatenation instead of a row-wise apply
+    rows["chunk"] = ("condition:" + rows["condition"] + ", review:\"" + rows["piece"] + "\", rating:" + rows["rating"]
+                     + ", date:" + rows["date"] + ", usefulCount:" + rows["usefulCount"])
+    return rows[["drugName", "chunk"]]
+
+
+def write_shard(task):
+    """Pool worker: chunks one shard of rows and writes it as JSONL."""
+    df, path, method, chunk_size, chunk_overlap = task
+    chunks = build_chunks(df, method, chunk_size, chunk_overlap)
+    chunks.to_json(path, orient="records", lines=True)
+    return len(df), len(chunks), int(chunks["chunk"].str.len().sum())
+
+
+def chunk_tsv(tsv_path, output_folder, method="char-split", chunk_size=350, chunk_overlap=20, num_workers=None,
+              batch_rows=10000):
+    """Chunks a reviews TSV into chunks-<method>-<n>.jsonl shards and returns throughput and chunk stats."""
+    if method not in SPLITTERS:
+        raise ValueError(f"Unknown chunk type {method!r}, expected one of {', '.join(SPLITTERS)}")
+    if not 0 <= chunk_overlap < chunk_size:
+        raise ValueError("chunk_overlap must be at least 0 and smaller than chunk_size")
+    os.makedirs(output_folder, exist_ok=True)
+    # Shards of an earlier run would otherwise be embedded again alongside the new ones
+    for path in glob.glob(os.path.join(output_folder, f"chunks-{method}-*.jsonl")):
+        os.remove(path)
+
+    num_workers = num_workers or os.cpu_count() or 1
+    stats = {"method": method, "rows": 0, "chunks": 0, "chars": 0, "shards": 0}
+
+    def collect(result):
+        rows, chunks, chars = result.get()
+        stats["rows"] += rows
+        stats["chunks"] += chunks
+        stats["chars"] += chars
+        stats["shards"] += 1
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(num_workers) as pool:
+        pending = deque()
+        for n, df in enumerate(pd.read_csv(tsv_path, sep="\t", chunksize=batch_rows), 1):
+            path = os.path.join(output_folder, f"chunks-{method}-{n}.jsonl")
+            pending.append(pool.apply_async(write_shard, ((df, path, method, chunk_size, chunk_overlap),)))
+            # The TSV is read at most two shards per process ahead of the workers, so memory stays bounded
+            while len(pending) >= 2 * num_workers:
+                collect(pending.popleft())
+        while pending:
+            collect(pending.popleft())
+    stats["seconds"] = time.perf_counter() - start
+
+    print(f"{method}: {stats['rows']} rows -> {stats['chunks']} chunks in {stats['shards']} shards, "
+          f"{stats['chunks'] / max(stats['rows'], 1):.2f} chunks/row, {stats['chars'] / max(stats['chunks'], 1):.0f} chars/chunk, "
+          f"{stats['rows'] / stats['seconds']:.0f} rows/s ({num_workers} processes)")
+    return stats
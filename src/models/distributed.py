@@ -0,0 +1,77 @@
+import builtins
+import os
+import torch
+import torch.distributed as dist
+from torch.utils.data.distributed import DistributedSampler
+from utils import available_cpus
+
+# Data-parallel training over several processes (one per device, or several per CPU host).
+# Launch with torchrun, which sets RANK/WORLD_SIZE/LOCAL_RANK/MASTER_ADDR for every process:
+#   one node:   torchrun --nproc_per_node=4 main.py --distributed
+#   two nodes:  torchrun --nnodes=2 --node_rank=<0|1> --nproc_per_node=8 \
+#                   --master_addr=<node 0 host> --master_port=29500 main.py --distributed
+
+
+def is_distributed():
+    return dist.is_available() and dist.is_initialized()
+
+
+def rank():
+    return dist.get_rank() if is_distributed() else 0
+
+
+def world_size():
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process():
+    return rank() == 0
+
+
+def setup_distributed(backend="gloo"):
+    """Joins the process group described by the torchrun environment variables.
+
+    CPU processes on one host split its cores between them, so they do not oversubscribe
+    each other's intra-op thread pools. Other ranks' prints are silenced.
+    """
+    dist.init_process_group(backend=backend)
+    local_world_size = int(os.environ.get("LOCAL_WORLD_SIZE", world_size()))
+    if not torch.cuda.is_available():
+        torch.set_num_threads(max(1, available_cpus() // local_world_size))
+    if not is_main_process():
+        builtins.print = lambda *args, **kwargs: None
+    print(f"Distributed training: {world_size()} processes ({local_world_size} on this node), backend {backend}")
+
+
+def cleanup_distributed():
+    if is_distributed():
+        dist.destroy_process_group()
+
+
+def local_device(requested=None):
+    """The device this process trains on: the requested one, else this process's local GPU, else CPU."""
+    if requested:
+        return torch.device(requested)
+    if torch.cuda.is_available():
+        return torch.device("cuda", int(os.environ.get("LOCAL_RANK", 0)))
+    return torch.device("cpu")
+
+
+def all_reduce_sum(tensor):
+    """Sums a tensor across processes in place (no-op without a process group)."""
+    if is_distributed():
+        dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor
+
+
+def unpadded_samples(dataloader):
+    """How many of this process's samples are real, or None if the loader is not split by a DistributedSampler.
+
+    DistributedSampler pads the dataset to a multiple of the world size by repeating its first
+    indices; the repeats are the last samples each process reads. Scoring them would count those
+    samples twice.
+    """
+    sampler = dataloader.sampler
+    if not isinstance(sampler, DistributedSampler) or sampler.drop_last:
+        return None
+    return len(range(sampler.rank, len(sampler.dataset), sampler.num_replicas))
@@ -0,0 +1,206 @@
+# One module, two copies: src/models/drug_index.py and src/api-service/api/drug_index.py (each image
+# only ships its own directory). tests/test_shared_modules.py in src/api-service keeps them identical.
+import numpy as np
+from matcher import ImprintMatcher
+
+# Unique imprints whose exact score seeds the pruning threshold
+SEED_CANDIDATES = 16
+# Above this share of unique imprints, scoring everything is cheaper than pruning
+FULL_SCAN_FRACTION = 0.5
+# Below this many unique imprints the full scan is already cheaper than pruning
+MIN_PRUNE_IMPRINTS = 2000
+
+
+class DrugIndex:
+    """Drug database lookup for a (color, shape, imprint) prediction.
+
+    A row's score is color_match + shape_match + normalize_similarity + overlapped_similarity,
+    exactly as the original per-row scoring in infer(). best_match() returns the same row as
+    np.argmax over all scores, but only runs the edit-distance kernel on imprints whose upper
+    bound can still beat the best exact score found so far:
+
+    - imprints sharing no character with the OCR result are never touched; their edit distance
+      is exactly max(len) so their score only depends on length and is bounded in closed form,
+    - touched imprints are bounded through the character inverted index using
+      ed >= max(|n - m|, max(n, m) - common characters),
+    - the color/shape bucket indexes give the best color/shape bonus each imprint can collect.
+
+    When the bound cannot separate the winner (ties with untouched rows, or too many survivors)
+    it falls back to the full scan.
+    """
+
+    def __init__(self, imprints, color_codes, shape_codes, drug_codes=None):
+        self.matcher = ImprintMatcher(imprints)
+        self.color_codes = np.asarray(color_codes)
+        self.shape_codes = np.asarray(shape_codes)
+
+        # Rows grouped by drug (CSR) so top_k returns distinct drugs; each row is its own drug if not given
+        drug_codes = np.arange(len(self.color_codes)) if drug_codes is None else np.asarray(drug_codes)
+        self.rows_by_drug = np.argsort(drug_codes, kind="stable")
+        _, drug_starts = np.unique(drug_codes[self.rows_by_drug], return_index=True)
+        self.drug_ptr = np.append(drug_starts, len(drug_codes)).astype(np.int64)
+
+        # Rows grouped by unique imprint (CSR)
+        self.rows_by_imprint = np.argsort(self.matcher.inverse, kind="stable")
+        counts = np.bincount(self.matcher.inverse, minlength=len(self.matcher.unique_imprints))
+        self.imprint_ptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        # Bucket indexes: rows per color code, per shape code, and the (color, shape) pairs present
+        self.color_buckets = self._buckets(self.color_codes)
+        self.shape_buckets = self._buckets(self.shape_codes)
+        self.attribute_pairs = set(zip(self.color_codes.tolist(), self.shape_codes.tolist()))
+
+        self.length_values = np.unique(self.matcher.lengths)
+
+    def __len__(self):
+        return len(self.color_codes)
+
+    def score_breakdown(self, ocr_res, color_prediction, shape_prediction):
+        """Full scan: every sub-score and the total score for every database row."""
+        color_matches = (self.color_codes == color_prediction).astype(np.float64) * 0.5
+        shape_matches = (self.shape_codes == shape_prediction).astype(np.float64) * 0.5
+        normalize_similarity, overlapped_similarity = self.matcher.similarity(ocr_res)
+        return {
+            "color_score": color_matches,
+            "shape_score": shape_matches,
+            "edit_similarity": normalize_similarity,
+            "overlap_similarity": overlapped_similarity,
+            "score": color_matches + shape_matches + normalize_similarity + overlapped_similarity,
+        }
+
+    def scores(self, ocr_res, color_prediction, shape_prediction):
+        """Full scan: score for every database row."""
+        return self.score_breakdown(ocr_res, color_prediction, shape_prediction)["score"]
+
+    def row_breakdown(self, ocr_res, color_prediction, shape_prediction, rows):
+        """Sub-scores and total score for the given database rows only."""
+        unique_ids, owner = np.unique(self.matcher.inverse[rows], return_inverse=True)
+        normalize_similarity, overlapped_similarity = self.matcher.unique_similarity(ocr_res, unique_ids)
+        color_matches = (self.color_codes[rows] == color_prediction).astype(np.float64) * 0.5
+        shape_matches = (self.shape_codes[rows] == shape_prediction).astype(np.float64) * 0.5
+        return {
+            "color_score": color_matches,
+            "shape_score": shape_matches,
+            "edit_similarity": normalize_similarity[owner],
+            "overlap_similarity": overlapped_similarity[owner],
+            "score": color_matches + shape_matches + normalize_similarity[owner] + overlapped_similarity[owner],
+        }
+
+    def top_k(self, ocr_res, color_prediction, shape_prediction, k):
+        """Best row of each of the k best drugs, best first, with their score breakdown.
+
+        Drugs are ranked by their best row's score, ties broken by row index, so the first
+        row is always np.argmax over the full scan.
+        """
+        if k == 1:
+            rows = np.array([self.best_match(ocr_res, color_prediction, shape_prediction)], dtype=np.int64)
+            return rows, self.row_breakdown(ocr_res, color_prediction, shape_prediction, rows)
+
+        breakdown = self.score_breakdown(ocr_res, color_prediction, shape_prediction)
+        grouped_scores = breakdown["score"][self.rows_by_drug]
+        drug_scores = np.maximum.reduceat(grouped_scores, self.drug_ptr[:-1])
+
+        # First row reaching its drug's best score (rows are ascending within each drug)
+        drug_sizes = np.diff(self.drug_ptr)
+        reaches_best = np.flatnonzero(grouped_scores == np.repeat(drug_scores, drug_sizes))
+        owners = np.repeat(np.arange(len(drug_scores)), drug_sizes)[reaches_best]
+        best_rows = self.rows_by_drug[reaches_best[np.r_[True, owners[1:] != owners[:-1]]]]
+
+        # Drugs strictly above the k-th best score, then the lowest-row ties to fill up to k
+        k = min(k, len(drug_scores))
+        kth_score = drug_scores[np.argpartition(drug_scores, len(drug_scores) - k)[len(drug_scores) - k]]
+        above = np.flatnonzero(drug_scores > kth_score)
+        tied = np.flatnonzero(drug_scores == kth_score)
+        tied = tied[np.argsort(best_rows[tied], kind="stable")[:k - len(above)]]
+
+        rows = best_rows[np.concatenate([above, tied])]
+        rows = rows[np.lexsort((rows, -breakdown["score"][rows]))]
+        return rows, {name: values[rows] for name, values in breakdown.items()}
+
+    def best_match(self, ocr_res, color_prediction, shape_prediction):
+        """Row index of the best scoring drug, identical to np.argmax(self.scores(...))."""
+        idx = None
+        if len(self.matcher.unique_imprints) >= MIN_PRUNE_IMPRINTS:
+            idx = self._pruned_best_match(ocr_res, color_prediction, shape_prediction)
+        if idx is None:
+            idx = int(np.argmax(self.scores(ocr_res, color_prediction, shape_prediction)))
+        return idx
+
+    @staticmethod
+    def _buckets(codes):
+        order = np.argsort(codes, kind="stable")
+        values, starts = np.unique(codes[order], return_index=True)
+        return dict(zip(values.tolist(), np.split(order, starts[1:])))
+
+    def _max_bonus(self, color_prediction, shape_prediction):
+        if (color_prediction, shape_prediction) in self.attribute_pairs:
+            return 1.0
+        if color_prediction in self.color_buckets or shape_prediction in self.shape_buckets:
+            return 0.5
+        return 0.0
+
+    def _imprint_bonus(self, color_prediction, shape_prediction):
+        """Best color/shape bonus any row of each unique imprint can collect."""
+        row_bonus = np.zeros(len(self.color_codes), dtype=np.float64)
+        row_bonus[self.color_buckets.get(color_prediction, [])] += 0.5
+        row_bonus[self.shape_buckets.get(shape_prediction, [])] += 0.5
+        return np.maximum.reduceat(row_bonus[self.rows_by_imprint], self.imprint_ptr[:-1])
+
+    def _rows_of(self, unique_ids):
+        """Database rows of the given unique imprints and the position of their imprint."""
+        starts = self.imprint_ptr[unique_ids]
+        counts = self.imprint_ptr[unique_ids + 1] - starts
+        owner = np.repeat(np.arange(len(unique_ids)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return self.rows_by_imprint[starts[owner] + offsets], owner
+
+    def _exact_scores(self, ocr_res, color_prediction, shape_prediction, unique_ids):
+        """Scores of every row belonging to the given (sorted) unique imprints."""
+        normalize_similarity, overlapped_similarity = self.matcher.unique_similarity(ocr_res, unique_ids)
+        rows, owner = self._rows_of(unique_ids)
+        color_matches = (self.color_codes[rows] == color_prediction).astype(np.float64) * 0.5
+        shape_matches = (self.shape_codes[rows] == shape_prediction).astype(np.float64) * 0.5
+        return rows, color_matches + shape_matches + normalize_similarity[owner] + overlapped_similarity[owner]
+
+    def _pruned_best_match(self, ocr_res, color_prediction, shape_prediction):
+        m = len(ocr_res)
+        max_bonus = self._max_bonus(color_prediction, shape_prediction)
+
+        if m == 0:
+            # Only empty imprints score above the color/shape bonus for an empty OCR result
+            touched = np.flatnonzero(self.matcher.lengths == 0)
+            common = distinct = np.zeros(len(touched), dtype=np.int64)
+        else:
+            touched, common, distinct = self.matcher.shared_characters(ocr_res)
+        if len(touched) == 0:
+            return None
+
+        # Untouched imprints: no shared character, so edit distance is max(n, m) and overlap is 0
+        untouched_lengths = self.length_values[self.length_values > 0] if m == 0 else self.length_values
+        untouched_total = untouched_lengths + m
+        untouched_bound = max_bonus + (1 - np.maximum(untouched_lengths, m) / untouched_total).max(initial=0.0)
+
+        # Upper bound on every touched imprint's best row score
+        lengths = self.matcher.lengths[touched]
+        total_length = lengths + m
+        lower_edit = np.maximum(np.abs(lengths - m), np.maximum(lengths, m) - common)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            normalize_bound = np.where(total_length == 0, 1, 1 - lower_edit / total_length)
+            overlapped_similarity = np.where(total_length == 0, 1, 2 * distinct / total_length)
+        upper_bound = self._imprint_bonus(color_prediction, shape_prediction)[touched] + normalize_bound + overlapped_similarity
+
+        # Exact scores for the most promising imprints give a threshold to prune against
+        num_seeds = min(SEED_CANDIDATES, len(touched))
+        seeds = np.sort(touched[np.argpartition(-upper_bound, num_seeds - 1)[:num_seeds]])
+        _, seed_scores = self._exact_scores(ocr_res, color_prediction, shape_prediction, seeds)
+        threshold = seed_scores.max()
+
+        candidates = touched[upper_bound >= threshold]
+        if len(candidates) > FULL_SCAN_FRACTION * len(self.matcher.unique_imprints):
+            return None
+
+        rows, scores = self._exact_scores(ocr_res, color_prediction, shape_prediction, candidates)
+        best = scores.max()
+        if best <= untouched_bound:
+            return None
+        return int(rows[scores == best].min())
@@ -0,0 +1,67 @@
+"""
+On-disk embedding cache for preprocess_rag.py, so re-runs only embed chunks they have not seen.
+
+Vectors are stored as float32 blobs in a SQLite file, keyed by sha256 of the embedding model,
+the output dimensionality and the chunk text: changing either setting misses the cache instead
+of mixing embeddings from different models.
+"""
+
+import os
+import hashlib
+import sqlite3
+import numpy as np
+
+
+def cache_key(text, model, dimensionality):
+    return hashlib.sha256(f"{model}\0{dimensionality}\0{text}".encode()).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path, model, dimensionality):
+        self.path = path
+        self.model = model
+        self.dimensionality = dimensionality
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def get_many(self, keys, batch_size=500):
+        """{key: vector} for the keys present in the cache."""
+        found = {}
+        keys = list(keys)
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i:i + batch_size]
+            rows = self.db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch)
+            for key, vector in rows:
+                found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items):
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                ((key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items))
+
+    def embed(self, texts, embed_fn):
+        """Embeddings for texts, in order; only texts missing from the cache go to embed_fn."""
+        texts = list(texts)
+        keys = [cache_key(text, self.model, self.dimensionality) for text in texts]
+        cached = self.get_many(set(keys))
+        # Each distinct missing text is embedded once, even if it occurs in several chunks
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        print(f"Embedding cache: {len(texts) - sum(key in missing for key in keys)} hits, {len(missing)} texts to embed")
+        if missing:
+            vectors = embed_fn(list(missing.values()))
+            new = list(zip(missing.keys(), vectors))
+            self.put_many(new)
+            cached.update((key, np.asarray(vector, dtype=np.float32).tolist()) for key, vector in new)
+        return [cached[key] for key in keys]
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,258 @@
+"""
+Concurrent, rate-limited text embedding for preprocess_rag.py.
+
+EmbeddingScheduler packs texts into batches that respect the provider's item and token limits,
+sends them from a bounded pool of threads paced by token buckets (requests and, optionally,
+tokens per minute), backs off on quota errors and splits batches the provider rejects as too
+large. Providers implement EmbeddingProvider; VertexEmbeddingProvider wraps Vertex AI and
+FakeEmbeddingProvider is a deterministic local stand-in for tests and benchmarks.
+"""
+
+import hashlib
+import random
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+import numpy as np
+
+QUOTA, TOO_LARGE, TRANSIENT, FATAL = "quota", "too_large", "transient", "fatal"
+
+
+class EmbeddingProvider:
+    """One embedding API. embed() returns one vector per text, in order."""
+
+    max_batch_size = 250        # items per request
+    max_batch_tokens = 20000    # estimated input tokens per request
+    max_text_tokens = 2048      # longer texts are truncated by the API, so they count this much
+
+    def embed(self, texts):
+        raise NotImplementedError
+
+    def classify_error(self, error):
+        """QUOTA (back off and retry), TOO_LARGE (split the batch), TRANSIENT (retry) or FATAL."""
+        return FATAL
+
+    def estimate_tokens(self, text):
+        return min(self.max_text_tokens, len(text) // 4 + 1)
+
+
+class VertexEmbeddingProvider(EmbeddingProvider):
+    def __init__(self, model, dimensionality=None, task_type="RETRIEVAL_DOCUMENT", max_batch_size=250):
+        self.model = model  # vertexai TextEmbeddingModel
+        self.dimensionality = dimensionality
+        self.task_type = task_type
+        self.max_batch_size = max_batch_size
+
+    def embed(self, texts):
+        from vertexai.language_models import TextEmbeddingInput
+        inputs = [TextEmbeddingInput(text, self.task_type) for text in texts]
+        kwargs = dict(output_dimensionality=self.dimensionality) if self.dimensionality else {}
+        return [embedding.values for embedding in self.model.get_embeddings(inputs, **kwargs)]
+
+    def classify_error(self, error):
+        from google.api_core import exceptions
+        if isinstance(error, exceptions.ResourceExhausted):
+            return QUOTA
+        if isinstance(error, exceptions.InvalidArgument) and "token" in str(error).lower():
+            return TOO_LARGE
+        if isinstance(error, (exceptions.ServiceUnavailable, exceptions.DeadlineExceeded,
+                              exceptions.InternalServerError, exceptions.Aborted, ConnectionError)):
+            return TRANSIENT
+        return FATAL
+
+
+class FakeQuotaError(Exception):
+    pass
+
+
+class FakeTooLargeError(Exception):
+    pass
+
+
+class FakeEmbeddingProvider(EmbeddingProvider):
+    """Deterministic unit vectors derived from each text's hash, with simulated API behaviour.
+
+    latency_ms: time per request; quota_rpm: requests per rolling minute the fake "server" accepts
+    before raising FakeQuotaError; failure_rate: fraction of requests failing transiently.
+    Requests over max_batch_size items or max_batch_tokens tokens raise FakeTooLargeError.
+    """
+
+    def __init__(self, dimensionality=256, latency_ms=0.0, quota_rpm=None, failure_rate=0.0, seed=0):
+        self.dimensionality = dimensionality
+        self.latency = latency_ms / 1000
+        self.quota_rpm = quota_rpm
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_times = []
+        self.requests = 0
+
+    def vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensionality)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed(self, texts):
+        with self.lock:
+            self.requests += 1
+            now = time.monotonic()
+            self.request_times = [t for t in self.request_times if now - t < 60]
+            if self.quota_rpm is not None and len(self.request_times) >= self.quota_rpm:
+                raise FakeQuotaError("429 quota exceeded")
+            self.request_times.append(now)
+            fail = self.random.random() < self.failure_rate
+        if len(texts) > self.max_batch_size or sum(map(self.estimate_tokens, texts)) > self.max_batch_tokens:
+            raise FakeTooLargeError("request exceeds the token limit")
+        time.sleep(self.latency)
+        if fail:
+            raise ConnectionError("simulated transient failure")
+        return [self.vector(text) for text in texts]
+
+    def classify_error(self, error):
+        if isinstance(error, FakeQuotaError):
+            return QUOTA
+        if isinstance(error, FakeTooLargeError):
+            return TOO_LARGE
+        if isinstance(error, ConnectionError):
+            return TRANSIENT
+        return FATAL
+
+
+class TokenBucket:
+    """Allows rate_per_minute units per minute with bursts of up to capacity; acquire() blocks."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, rate_per_minute / 60.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        amount = min(amount, self.capacity)  # a request larger than a burst waits for a full bucket
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class EmbeddingScheduler:
+    """Embeds texts through a provider with bounded concurrency, rate limits and retries.
+
+    requests_per_minute / tokens_per_minute: client-side pacing below the project's quota
+    (None disables that bucket). On a quota error every worker pauses for an exponentially
+    growing, jittered delay; transient errors are retried the same way up to max_retries;
+    batches the provider rejects as too large are split in half. Any other error (or retries
+    running out) stops the run: batches not yet sent are cancelled and the error is raised.
+    """
+
+    def __init__(self, provider, requests_per_minute=None, tokens_per_minute=None, max_concurrency=8,
+                 max_retries=8, base_delay=1.0, max_delay=60.0, progress_every=50):
+        self.provider = provider
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute, capacity=tokens_per_minute / 6) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.progress_every = progress_every
+        self.lock = threading.Lock()
+        self.pause_until = 0.0
+        self.stopped = threading.Event()
+        self.stats = {}
+
+    def make_batches(self, texts):
+        """(start, end) index ranges filling each request up to the item and estimated-token limits."""
+        batches, start, tokens = [], 0, 0
+        for i, text in enumerate(texts):
+            text_tokens = self.provider.estimate_tokens(text)
+            if i > start and (i - start >= self.provider.max_batch_size or tokens + text_tokens > self.provider.max_batch_tokens):
+                batches.append((start, i))
+                start, tokens = i, 0
+            tokens += text_tokens
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    def embed(self, texts):
+        """Embeddings for texts, in order."""
+        texts = list(texts)
+        self.stats = {"requests": 0, "retries": 0, "quota_errors": 0, "splits": 0, "done": 0}
+        results = [None] * len(texts)
+        batches = self.make_batches(texts)
+        start = time.perf_counter()
+        self.stopped.clear()
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embed")
+        try:
+            futures = [executor.submit(self._embed_batch, texts, results, lo, hi) for lo, hi in batches]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in done:
+                future.result()
+        except BaseException:
+            # The first fatal error ends the run: queued batches are dropped and running ones stop retrying
+            self.stopped.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        executor.shutdown(wait=True)
+        seconds = time.perf_counter() - start
+        print(f"Embedded {len(texts)} texts in {len(batches)} batches, {seconds:.1f}s "
+              f"({self.stats['requests']} requests, {self.stats['retries']} retries, "
+              f"{self.stats['quota_errors']} quota errors, {self.stats['splits']} splits)")
+        return results
+
+    def _wait_for_capacity(self, batch):
+        pause = self.pause_until - time.monotonic()
+        if pause > 0:
+            self.stopped.wait(pause)
+        if self.request_bucket:
+            self.request_bucket.acquire()
+        if self.token_bucket:
+            self.token_bucket.acquire(sum(map(self.provider.estimate_tokens, batch)))
+
+    def _backoff(self, attempt):
+        return min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def _embed_batch(self, texts, results, lo, hi):
+        batch = texts[lo:hi]
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_capacity(batch)
+            if self.stopped.is_set():
+                return
+            try:
+                with self.lock:
+                    self.stats["requests"] += 1
+                vectors = self.provider.embed(batch)
+                break
+            except Exception as e:
+                kind = self.provider.classify_error(e)
+                if kind == TOO_LARGE and hi - lo > 1:
+                    with self.lock:
+                        self.stats["splits"] += 1
+                    middle = (lo + hi) // 2
+                    self._embed_batch(texts, results, lo, middle)
+                    self._embed_batch(texts, results, middle, hi)
+                    return
+                if kind not in (QUOTA, TRANSIENT) or attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                with self.lock:
+                    self.stats["retries"] += 1
+                    if kind == QUOTA:
+                        # Everyone waits: more requests now would only be rejected too
+                        self.stats["quota_errors"] += 1
+                        self.pause_until = max(self.pause_until, time.monotonic() + delay)
+                self.stopped.wait(delay)
+        if len(vectors) != hi - lo:
+            raise ValueError(f"Provider returned {len(vectors)} embeddings for {hi - lo} texts")
+        results[lo:hi] = vectors
+        with self.lock:
+            self.stats["done"] += 1
+            done = self.stats["done"]
+        if self.progress_every and done % self.progress_every == 0:
+            print(f"Embedded {done} batches...")
@@ -0,0 +1,188 @@
+"""
+Exports trained classifiers as CPU-serving artifacts and reports their accuracy, latency and
+memory against the fp32 checkpoint.
+
+For each checkpoint given (color_model.pth / shape_model.pth from main.py, or a multi-head
+checkpoint from save_multihead_model) it writes next to the output stem:
+    <stem>.torchscript.pt  frozen TorchScript trace, fp32
+    <stem>.int8.pt         post-training static int8 quantization (FX graph mode, x86 backend)
+                           calibrated on images from encoded_val_annotations.csv, frozen TorchScript
+    <stem>.onnx            with --onnx (needs the onnx package)
+The inference service serves one of them with MODEL_ARTIFACT=pth|torchscript|int8.
+
+Calibration and evaluation images are disjoint random draws from the validation CSV. Latency
+(batch 1) and resident memory are measured for each variant in a fresh process.
+
+usage (from src/models):
+    python export_model.py --color_model_path color_model.pth --shape_model_path shape_model.pth \
+        --val_csv_file encoded_val_annotations.csv --data_dir local_data/val
+"""
+
+import os
+import copy
+import json
+import time
+import argparse
+import multiprocessing
+import torch
+from torch.utils.data import DataLoader, Subset
+from torchvision import transforms
+from models import load_classifier
+from utils import PillDataset
+
+ARTIFACT_SUFFIXES = {"torchscript": ".torchscript.pt", "int8": ".int8.pt", "onnx": ".onnx"}
+
+# Which label of PillDataset(multi_label=True) each kind of checkpoint predicts
+HEADS = {"color": [0], "shape": [1], "multihead": [0, 1]}
+
+
+def artifact_path(model_path, artifact):
+    """color_model.pth -> color_model.int8.pt (the service resolves MODEL_ARTIFACT the same way)."""
+    return os.path.splitext(model_path)[0] + ARTIFACT_SUFFIXES[artifact]
+
+
+def export_torchscript(model, example, path):
+    with torch.no_grad():
+        torch.jit.save(torch.jit.freeze(torch.jit.trace(model, example)), path)
+
+
+def export_int8(model, calibration_loader, example, path):
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    torch.backends.quantized.engine = "x86"
+    prepared = prepare_fx(copy.deepcopy(model), get_default_qconfig_mapping("x86"), (example,))
+    with torch.no_grad():
+        for inputs, _ in calibration_loader:
+            prepared(inputs)
+    export_torchscript(convert_fx(prepared), example, path)
+
+
+def export_onnx(model, example, path):
+    try:
+        torch.onnx.export(model, (example,), path, input_names=["image"], dynamic_axes={"image": {0: "batch"}}, dynamo=False)
+        return True
+    except Exception as e:
+        print(f"ONNX export skipped: {e!r}")
+        return False
+
+
+def predictions(model, loader, heads):
+    """(n, len(heads)) top-1 predictions and the matching labels."""
+    preds, labels = [], []
+    with torch.no_grad():
+        for inputs, targets in loader:
+            outputs = model(inputs)
+            outputs = outputs if isinstance(outputs, (list, tuple)) else [outputs]
+            preds.append(torch.stack([output.argmax(1) for output in outputs], 1))
+            labels.append(torch.stack([targets[head] for head in heads], 1))
+    return torch.cat(preds), torch.cat(labels)
+
+
+def load_variant(model_path, variant):
+    if variant == "pth":
+        return load_classifier(model_path)
+    return torch.jit.load(artifact_path(model_path, variant), map_location="cpu")
+
+
+def resident_memory_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def measure(model_path, variant, image_size, repeats, results):
+    # Runs in a fresh process so each variant's memory is measured on its own
+    before = resident_memory_mb()
+    model = load_variant(model_path, variant)
+    image = torch.rand(1, 3, image_size, image_size)
+    with torch.no_grad():
+        for _ in range(3):
+            model(image)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model(image)
+    latency_ms = (time.perf_counter() - start) / repeats * 1000
+    results.put((latency_ms, resident_memory_mb() - before))
+
+
+def export(name, model_path, args, calibration_loader, eval_loader):
+    model = load_classifier(model_path)
+    example = torch.zeros(1, 3, args.image_size, args.image_size)
+    export_torchscript(model, example, artifact_path(model_path, "torchscript"))
+    export_int8(model, calibration_loader, example, artifact_path(model_path, "int8"))
+    if args.onnx:
+        export_onnx(model, example, artifact_path(model_path, "onnx"))
+
+    heads = HEADS[name]
+    reference, labels = predictions(model, eval_loader, heads)
+    ctx = multiprocessing.get_context("spawn")
+    report = {}
+    for variant in ["pth", "torchscript", "int8"]:
+        preds, _ = predictions(load_variant(model_path, variant), eval_loader, heads)
+        results = ctx.SimpleQueue()
+        process = ctx.Process(target=measure, args=(model_path, variant, args.image_size, args.repeats, results))
+        process.start()
+        latency_ms, memory_mb = results.get()
+        process.join()
+        path = model_path if variant == "pth" else artifact_path(model_path, variant)
+        report[variant] = {
+            "path": path,
+            "file_mb": os.path.getsize(path) / 2**20,
+            "memory_mb": memory_mb,
+            "latency_ms": latency_ms,
+            "accuracy": (preds == labels).float().mean(0).tolist(),
+            "agreement_with_fp32": (preds == reference).float().mean(0).tolist(),
+        }
+
+    print(f"\n{name} ({model_path}), {len(labels)} validation images")
+    print(f"{'variant':>12} {'file MB':>8} {'RSS MB':>7} {'ms/image':>9} {'accuracy':>16} {'agrees w/ fp32':>16}")
+    for variant, row in report.items():
+        accuracy = "/".join(f"{acc:.4f}" for acc in row["accuracy"])
+        agreement = "/".join(f"{acc:.4f}" for acc in row["agreement_with_fp32"])
+        print(f"{variant:>12} {row['file_mb']:>8.1f} {row['memory_mb']:>7.1f} {row['latency_ms']:>9.1f} {accuracy:>16} {agreement:>16}")
+    return report
+
+
+def main(args):
+    transform = transforms.Compose([
+        transforms.Resize((args.image_size, args.image_size)),
+        transforms.ToTensor(),
+    ])
+    dataset = PillDataset(args.val_csv_file, args.data_dir, transform=transform, multi_label=True)
+    order = torch.randperm(len(dataset), generator=torch.Generator().manual_seed(0)).tolist()
+    calibration = Subset(dataset, order[:args.calibration_images])
+    evaluation = Subset(dataset, order[args.calibration_images:args.calibration_images + args.eval_images])
+    calibration_loader = DataLoader(calibration, batch_size=args.batch_size)
+    eval_loader = DataLoader(evaluation, batch_size=args.batch_size)
+
+    checkpoints = {"color": args.color_model_path, "shape": args.shape_model_path, "multihead": args.multihead_model_path}
+    report = {}
+    for name, model_path in checkpoints.items():
+        if model_path:
+            report[name] = export(name, model_path, args, calibration_loader, eval_loader)
+
+    with open(args.report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.report_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export trained classifiers as TorchScript, int8 and ONNX serving artifacts.')
+    parser.add_argument('--color_model_path', type=str, default='color_model.pth', help='Color model checkpoint ("" to skip).')
+    parser.add_argument('--shape_model_path', type=str, default='shape_model.pth', help='Shape model checkpoint ("" to skip).')
+    parser.add_argument('--multihead_model_path', type=str, default='', help='Multi-head checkpoint from save_multihead_model.')
+    parser.add_argument('--val_csv_file', type=str, default='encoded_val_annotations.csv', help='Validation annotations for calibration and evaluation.')
+    parser.add_argument('--data_dir', type=str, default='local_data/val', help='Validation image directory.')
+    parser.add_argument('--image_size', type=int, default=512, help='Input resolution the service uses.')
+    parser.add_argument('--calibration_images', type=int, default=256, help='Images used to calibrate int8 activation ranges.')
+    parser.add_argument('--eval_images', type=int, default=2048, help='Images (disjoint from calibration) used for the accuracy report.')
+    parser.add_argument('--batch_size', type=int, default=32, help='Batch size for calibration and evaluation.')
+    parser.add_argument('--repeats', type=int, default=20, help='Timed batch-1 forwards per variant.')
+    parser.add_argument('--onnx', action='store_true', help='Also export ONNX (needs the onnx package).')
+    parser.add_argument('--report_path', type=str, default='export_report.json', help='Where to write the JSON report.')
+
+    args = parser.parse_args()
+    main(args)
@@ -7,8 +7,8 @@ import pandas as pd
 from torchvision import transforms
 from PIL import Image
 from paddleocr import PaddleOCR
-from Levenshtein import distance as levenshtein_distance
 import joblib
+from drug_index import DrugIndex
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -42,6 +42,7 @@ if __name__ == "__main__":
     parser.add_argument('--database_csv', type=str, required=True, help='Path to the drug database CSV.')
     parser.add_argument('--label_encoder_path', type=str, required=True, help='Path to the label encoder file.')
     parser.add_argument('--image_path', type=str, required=True, help='Path to the drug image for recognition.')
+    parser.add_argument('--top_k', type=int, default=1, help='Number of ranked drug candidates to report.')
     args = parser.parse_args()
 
     # Set device
@@ -77,30 +78,16 @@ if __name__ == "__main__":
         ocr_res = ";".join(line[1][0] for line in res[0])  # Join all labels with ';'
 
     # Match predictions with the database
-    color_matches = (splcolor_text_encoded == color_prediction).astype(np.float64) * 0.5
-    shape_matches = (splshape_text_encoded == shape_prediction).astype(np.float64) * 0.5
-    ocr_res_len = len(ocr_res)
-    total_length = np.array([len(imprint) + ocr_res_len for imprint in splimprint_database])
-    edit_distances = np.array([levenshtein_distance(ocr_res, imprint) for imprint in splimprint_database])
-    normalize_similarity = np.where(
-        (total_length == 0) & (edit_distances == 0),
-        1,
-        np.where(total_length != 0, 1 - edit_distances / total_length, 0)
-    )
-    overlapped_scores = np.array([
-        2 * len(set(imprint) & set(ocr_res)) for imprint in splimprint_database
-    ])
-    overlapped_similarity = np.where(
-        (total_length == 0) & (overlapped_scores == 0),
-        1,
-        np.where(total_length != 0, overlapped_scores / total_length, 0)
-    )
-    score = color_matches + shape_matches + normalize_similarity + overlapped_similarity
-    idx = np.argmax(score)
-    medicine_name = le.inverse_transform([medicine_name_list[idx]])[0]
+    drug_index = DrugIndex(splimprint_database, splcolor_text_encoded, splshape_text_encoded, medicine_name_list)
+    rows, breakdown = drug_index.top_k(ocr_res, color_prediction, shape_prediction, args.top_k)
+    medicine_names = le.inverse_transform(medicine_name_list[rows])
+    medicine_name = medicine_names[0]
 
     # Output result
     logging.info(f"Predicted Color Class: {color_prediction}")
     logging.info(f"Predicted Shape Class: {shape_prediction}")
     logging.info(f"Predicted Imprint: {ocr_res}")
     logging.info(f"Identified Drug Name: {medicine_name}")
+    for rank, name in enumerate(medicine_names, start=1):
+        details = ", ".join(f"{key}={values[rank - 1]:.4f}" for key, values in breakdown.items())
+        logging.info(f"Top {rank}: {name} ({details})")
@@ -8,79 +8,128 @@ from torchvision import transforms
 import pandas as pd
 from PIL import Image
 import argparse
-from utils import PillDataset, load_data
-from models import initialize_model
+from utils import PillDataset, load_data, subsample_loader
+from models import ModelPair, initialize_model, initialize_multihead_model, save_multihead_model
 from train import train_model
+from distributed import cleanup_distributed, is_main_process, local_device, setup_distributed
 from google.cloud import storage
 
-def initialize_model(num_colors, device):
-    model = models.resnet18(pretrained=True)
-    num_ftrs = model.fc.in_features
-    model.fc = nn.Linear(num_ftrs, num_colors)
-    model = model.to(device)
-    return model
-
 if 'GOOGLE_APPLICATION_CREDENTIALS' not in os.environ:
     os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = 'service_account.json'
     
-def main(args):
-    device = torch.device("cuda:2" if torch.cuda.is_available() else "cpu")
-    print(f"Using device: {device}")
-
-    # Load training and validation data
+# Upload model to GCP bucket
+def upload_to_gcs(bucket_name, source_file_name, destination_blob_name):
+    storage_client = storage.Client()
+    bucket = storage_client.bucket(bucket_name)
+    blob = bucket.blob(destination_blob_name)
+    blob.upload_from_filename(source_file_name)
+    print(f"File {source_file_name} uploaded to {bucket_name}/{destination_blob_name}")
+
+# Shard cache directory for a split (built with shard_cache.py), or None to decode the JPEGs
+def split_shard_dir(args, split):
+    return os.path.join(args.shard_dir, split) if args.shard_dir else None
+
+# DataLoader options from the --loader_* flags; None lets load_data size them automatically
+def loader_options(args):
+    return dict(
+        num_workers=args.loader_workers,
+        pin_memory=args.loader_pin_memory,
+        prefetch_factor=args.loader_prefetch_factor,
+        persistent_workers=args.loader_persistent_workers,
+    )
+
+# Checkpointing/early stopping options for train_model; each training mode has its own checkpoint file
+def checkpoint_options(args, name):
+    return dict(
+        checkpoint_path=os.path.join(args.checkpoint_dir, name) if args.checkpoint_dir else None,
+        resume=args.resume,
+        patience=args.early_stopping_patience,
+    )
+
+# Validation cadence, step logging and phase timing options for train_model
+def schedule_options(args):
+    return dict(log_every=args.log_every, val_every=args.val_every, time_phases=args.time_phases)
+
+def train_multihead(args, device):
+    # One backbone with a color head and a shape head, trained on both labels at once
     print("Loading data...")
-    color_train_dataloader = load_data(args.train_csv_file, os.path.join(args.data_dir, 'train'), batch_size=args.batch_size, shuffle=True)
-    color_val_dataloader = load_data(args.val_csv_file, os.path.join(args.data_dir, 'val'), batch_size=args.batch_size, shuffle=False)
-    shape_train_dataloader = load_data(args.train_csv_file, os.path.join(args.data_dir, 'train'), batch_size=args.batch_size, shuffle=True, color=False)
-    shape_val_dataloader = load_data(args.val_csv_file, os.path.join(args.data_dir, 'val'), batch_size=args.batch_size, shuffle=False, color=False)
+    train_dataloader = load_data(args.train_csv_file, os.path.join(args.data_dir, 'train'), batch_size=args.batch_size, shuffle=True, shard_dir=split_shard_dir(args, 'train'), multi_label=True, **loader_options(args), distributed=args.distributed)
+    val_dataloader = load_data(args.val_csv_file, os.path.join(args.data_dir, 'val'), batch_size=args.batch_size, shuffle=False, shard_dir=split_shard_dir(args, 'val'), multi_label=True, **loader_options(args), distributed=args.distributed)
+    val_dataloader = subsample_loader(val_dataloader, args.val_fraction)
 
-    print(f"Number of training samples: {len(color_train_dataloader.dataset)}")
-    print(f"Number of validation samples: {len(color_val_dataloader.dataset)}")
+    print(f"Number of training samples: {len(train_dataloader.dataset)}")
+    print(f"Number of validation samples: {len(val_dataloader.dataset)}")
 
-    # Initialize color model
-    print("Initializing color model...")
+    print("Initializing multi-head model...")
+    annotations = pd.read_csv(args.annotation_csv_file)
+    num_colors = annotations['splcolor_text'].nunique()
+    num_shapes = annotations['splshape_text'].nunique()
+    model = initialize_multihead_model(num_colors, num_shapes, device, channels_last=args.perf_mode)
 
-    num_colors = pd.read_csv(args.annotation_csv_file)['splcolor_text'].nunique()
-    color_model = initialize_model(num_colors, device)
-
-    # Define loss function and optimizer
     criterion = nn.CrossEntropyLoss()
-    optimizer = optim.Adam(color_model.parameters(), lr=args.learning_rate)
+    optimizer = optim.Adam(model.parameters(), lr=args.learning_rate)
 
-    # Train model
-    print(f"Starting training color model for {args.num_epochs} epochs.")
-    color_model = train_model(color_model, color_train_dataloader, color_val_dataloader, criterion, optimizer, device, args.num_epochs)
-    # color_model.load_state_dict(torch.load('color_model.pth', map_location=device))
+    print(f"Starting training multi-head model for {args.num_epochs} epochs.")
+    model = train_model(model, train_dataloader, val_dataloader, criterion, optimizer, device, args.num_epochs, perf_mode=args.perf_mode, **checkpoint_options(args, 'multihead_checkpoint.pth'), **schedule_options(args))
 
-    # Save color model
-    torch.save(color_model.state_dict(), 'color_model.pth')
-    print("Color model saved.")
+    if not is_main_process():
+        return
+    save_multihead_model(model, 'multihead_model.pth')
+    print("Multi-head model saved.")
 
-    print("Initializing shape model...")
+    upload_to_gcs(args.bucket_name, 'multihead_model.pth', 'models/multihead_model.pth')
+    print("Multi-head model uploaded to GCP bucket.")
 
-    num_shapes = pd.read_csv(args.annotation_csv_file)['splshape_text'].nunique()
-    shape_model = initialize_model(num_shapes, device)
+def main(args):
+    if args.distributed:
+        setup_distributed(args.dist_backend)
+    device = local_device(args.device)
+    print(f"Using device: {device}")
+
+    try:
+        if args.multi_head:
+            train_multihead(args, device)
+        else:
+            train_color_shape(args, device)
+    finally:
+        cleanup_distributed()
 
-    # Define loss function and optimizer
-    shape_criterion = nn.CrossEntropyLoss()
-    shape_optimizer = optim.Adam(shape_model.parameters(), lr=args.learning_rate)
+def train_color_shape(args, device):
+    # Load training and validation data once; each batch carries both color and shape labels
+    print("Loading data...")
+    train_dataloader = load_data(args.train_csv_file, os.path.join(args.data_dir, 'train'), batch_size=args.batch_size, shuffle=True, shard_dir=split_shard_dir(args, 'train'), multi_label=True, **loader_options(args), distributed=args.distributed)
+    val_dataloader = load_data(args.val_csv_file, os.path.join(args.data_dir, 'val'), batch_size=args.batch_size, shuffle=False, shard_dir=split_shard_dir(args, 'val'), multi_label=True, **loader_options(args), distributed=args.distributed)
+    val_dataloader = subsample_loader(val_dataloader, args.val_fraction)
+
+    print(f"Number of training samples: {len(train_dataloader.dataset)}")
+    print(f"Number of validation samples: {len(val_dataloader.dataset)}")
+
+    # Initialize color and shape models
+    print("Initializing color and shape models...")
+    annotations = pd.read_csv(args.annotation_csv_file)
+    num_colors = annotations['splcolor_text'].nunique()
+    num_shapes = annotations['splshape_text'].nunique()
+    color_model = initialize_model(num_colors, device, channels_last=args.perf_mode)
+    shape_model = initialize_model(num_shapes, device, channels_last=args.perf_mode)
+    models_pair = ModelPair(color_model, shape_model)
+
+    # Define loss function and optimizer. The models share no parameters, so one Adam over both
+    # (summed loss) applies the same per-parameter updates as one optimizer per model.
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(models_pair.parameters(), lr=args.learning_rate)
 
-    # Train model
-    print(f"Starting training shape model for {args.num_epochs} epochs.")
-    shape_model = train_model(shape_model, shape_train_dataloader, shape_val_dataloader, shape_criterion, shape_optimizer, device, args.num_epochs)
+    # Train both models from the same batches; each keeps the weights of its own best epoch
+    print(f"Starting training color and shape models for {args.num_epochs} epochs.")
+    train_model(models_pair, train_dataloader, val_dataloader, criterion, optimizer, device, args.num_epochs, perf_mode=args.perf_mode, **checkpoint_options(args, 'color_shape_checkpoint.pth'), **schedule_options(args))
 
-    # Save shape model
+    # Save color and shape models (once, from the main process)
+    if not is_main_process():
+        return
+    torch.save(color_model.state_dict(), 'color_model.pth')
+    print("Color model saved.")
     torch.save(shape_model.state_dict(), 'shape_model.pth')
     print("Shape model saved.")
 
-    # Upload model to GCP bucket
-    def upload_to_gcs(bucket_name, source_file_name, destination_blob_name):
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(destination_blob_name)
-        blob.upload_from_filename(source_file_name)
-        print(f"File {source_file_name} uploaded to {bucket_name}/{destination_blob_name}")
-
     # Upload color model
     upload_to_gcs(args.bucket_name, 'color_model.pth', 'models/color_model.pth')
     print("Color model uploaded to GCP bucket.")
@@ -97,12 +146,31 @@ if __name__ == "__main__":
     parser.add_argument('--train_csv_file', type=str, default='encoded_train_annotations.csv',help='Path to the training CSV file.')
     parser.add_argument('--val_csv_file', type=str, default='encoded_val_annotations.csv', help='Path to the validation CSV file.')
     parser.add_argument('--data_dir', type=str, default="local_data", help='Path to the image data directory.')
-    parser.add_argument('--batch_size', type=int, default=512, help='Batch size for training.')
+    parser.add_argument('--batch_size', type=int, default=512, help='Batch size for training (per process with --distributed).')
     parser.add_argument('--learning_rate', type=float, default=0.001, help='Learning rate for the optimizer.')
     parser.add_argument('--num_epochs', type=int, default=100, help='Number of epochs for training.')
     parser.add_argument('--bucket_name', type=str,default="pillrx-models", help='GCP bucket name to upload the models.')
+    parser.add_argument('--multi_head', action='store_true', help='Train one shared-backbone model with color and shape heads.')
+    parser.add_argument('--shard_dir', type=str, default=None, help='Read pre-resized images from shard_cache.py output (<shard_dir>/train, <shard_dir>/val) instead of JPEGs.')
+    parser.add_argument('--loader_workers', type=int, default=None, help='DataLoader worker processes (default: available CPUs - 1, max 8).')
+    parser.add_argument('--loader_prefetch_factor', type=int, default=None, help='Batches prefetched per worker (default: 2).')
+    parser.add_argument('--loader_pin_memory', action=argparse.BooleanOptionalAction, default=None, help='Pin batches in page-locked memory (default: on with CUDA).')
+    parser.add_argument('--loader_persistent_workers', action=argparse.BooleanOptionalAction, default=None, help='Keep workers alive between epochs (default: on with workers).')
+    parser.add_argument('--perf_mode', action='store_true', help='bfloat16 autocast, channels_last and torch.compile (falls back where unsupported).')
+    parser.add_argument('--checkpoint_dir', type=str, default=None, help='Write per-epoch training checkpoints to this directory (off by default).')
+    parser.add_argument('--resume', action='store_true', help='Continue from the checkpoint in --checkpoint_dir if there is one.')
+    parser.add_argument('--early_stopping_patience', type=int, default=None, help='Stop after this many validations without a validation accuracy improvement.')
+    parser.add_argument('--val_every', type=int, default=1, help='Validate every N epochs (and after the last one).')
+    parser.add_argument('--val_fraction', type=float, default=1.0, help='Validate on a fixed random fraction of the validation set.')
+    parser.add_argument('--log_every', type=int, default=None, help='Print running train metrics every N steps (one device sync each).')
+    parser.add_argument('--device', type=str, default=None, help='Training device, e.g. cpu or cuda:1 (default: the local GPU if any, else cpu).')
+    parser.add_argument('--distributed', action='store_true', help='Data-parallel training across the processes started by torchrun.')
+    parser.add_argument('--dist_backend', type=str, default='gloo', help='torch.distributed backend (gloo for CPU, nccl for GPUs).')
+    parser.add_argument('--time_phases', action='store_true', help='Synchronize the device between phases for exact per-phase times (slower on CUDA).')
 
     args = parser.parse_args()
+    if args.resume and not args.checkpoint_dir:
+        parser.error('--resume needs --checkpoint_dir')
     main(args)
 
 
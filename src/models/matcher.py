@@ -0,0 +1,167 @@
+# One module, two copies: src/models/matcher.py and src/api-service/api/matcher.py (each image
+# only ships its own directory). tests/test_shared_modules.py in src/api-service keeps them identical.
+import numpy as np
+from Levenshtein import distance as levenshtein_distance
+
+# Bit-parallel kernel works on one 64-bit word per imprint
+MAX_WORD_BITS = 64
+
+
+class ImprintMatcher:
+    """Scores an OCR imprint against every imprint in the drug database in batch.
+
+    Everything that only depends on the database (unique imprints, their lengths,
+    character presence matrix and padded character codes) is computed once here,
+    so a query is a handful of NumPy operations instead of a Python loop per row.
+    """
+
+    def __init__(self, imprints):
+        imprints = np.array([str(imprint) for imprint in imprints], dtype=object)
+
+        # Many rows share an imprint (and most share ""), so work on unique values
+        unique_imprints, inverse = np.unique(imprints, return_inverse=True)
+        lengths = np.array([len(imprint) for imprint in unique_imprints], dtype=np.int64)
+
+        # Longest imprints first: at text position j the rows still being scanned are a prefix
+        order = np.argsort(-lengths, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        self.unique_imprints = unique_imprints[order].tolist()
+        self.inverse = rank[inverse.reshape(-1)]
+        self.lengths = lengths[order]
+        self.max_length = int(self.lengths.max()) if len(self.lengths) else 0
+        self.active_rows = np.array([(self.lengths > j).sum() for j in range(self.max_length)], dtype=np.int64)
+
+        # Character vocabulary of the database; the extra code is padding
+        self.vocab = {c: i for i, c in enumerate(sorted(set("".join(self.unique_imprints))))}
+        self.pad_code = len(self.vocab)
+
+        self.codes = np.full((len(self.unique_imprints), self.max_length), self.pad_code, dtype=np.int64)
+        self.presence = np.zeros((len(self.unique_imprints), len(self.vocab)), dtype=np.uint8)
+        char_counts = np.zeros((len(self.unique_imprints), len(self.vocab)), dtype=np.int64)
+        for row, imprint in enumerate(self.unique_imprints):
+            char_codes = [self.vocab[c] for c in imprint]
+            self.codes[row, :len(char_codes)] = char_codes
+            self.presence[row, char_codes] = 1
+            char_counts[row] = np.bincount(char_codes, minlength=len(self.vocab))
+
+        # Character inverted index (CSR): imprints containing each character and how often
+        postings = [np.flatnonzero(char_counts[:, col]) for col in range(len(self.vocab))]
+        self.posting_ptr = np.concatenate([[0], np.cumsum([len(p) for p in postings])]).astype(np.int64)
+        self.posting_rows = np.concatenate(postings + [np.zeros(0, dtype=np.int64)]).astype(np.int64)
+        self.posting_counts = np.concatenate(
+            [char_counts[p, col] for col, p in enumerate(postings)] + [np.zeros(0, dtype=np.int64)]
+        ).astype(np.int64)
+
+    def __len__(self):
+        return len(self.inverse)
+
+    def overlap_scores(self, query, rows=None):
+        """2 * |set(imprint) & set(query)| for each unique imprint (or the given unique ids)."""
+        presence = self.presence if rows is None else self.presence[rows]
+        cols = [self.vocab[c] for c in set(query) if c in self.vocab]
+        if not cols:
+            return np.zeros(len(presence), dtype=np.int64)
+        return 2 * presence[:, cols].sum(axis=1, dtype=np.int64)
+
+    def shared_characters(self, query):
+        """Sparse character overlap through the inverted index.
+
+        Returns the unique ids sharing at least one character with the query, the size
+        of the common character multiset (an upper bound on matched characters in any
+        alignment) and the number of distinct shared characters for each of them.
+        """
+        query_counts = {}
+        for c in query:
+            if c in self.vocab:
+                query_counts[self.vocab[c]] = query_counts.get(self.vocab[c], 0) + 1
+        if not query_counts:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+
+        ids = []
+        common = []
+        for col, count in query_counts.items():
+            start, end = self.posting_ptr[col], self.posting_ptr[col + 1]
+            ids.append(self.posting_rows[start:end])
+            common.append(np.minimum(self.posting_counts[start:end], count))
+        ids = np.concatenate(ids)
+
+        distinct = np.bincount(ids, minlength=len(self.unique_imprints))
+        common = np.bincount(ids, weights=np.concatenate(common), minlength=len(self.unique_imprints))
+        touched = np.flatnonzero(distinct)
+        return touched, common[touched].astype(np.int64), distinct[touched].astype(np.int64)
+
+    def edit_distances(self, query, rows=None):
+        """Levenshtein distance from query to each unique imprint (or the given unique ids).
+
+        rows must be sorted ascending so the selected imprints stay longest first.
+        """
+        if rows is None:
+            rows = np.arange(len(self.unique_imprints))
+            codes, lengths, active_rows = self.codes, self.lengths, self.active_rows
+        else:
+            codes, lengths = self.codes[rows], self.lengths[rows]
+            active_rows = np.searchsorted(-lengths, -np.arange(int(lengths.max(initial=0))), side="left")
+
+        m = len(query)
+        if m == 0:
+            return lengths.copy()
+        if m > MAX_WORD_BITS:
+            return np.array([levenshtein_distance(query, self.unique_imprints[row]) for row in rows], dtype=np.int64)
+
+        # Myers/Hyyro bit-vector edit distance, one uint64 word per imprint
+        peq = np.zeros(self.pad_code + 1, dtype=np.uint64)
+        for i, c in enumerate(query):
+            if c in self.vocab:
+                peq[self.vocab[c]] |= np.uint64(1 << i)
+
+        one = np.uint64(1)
+        high_bit = np.uint64(1 << (m - 1))
+        pv = np.full(len(lengths), (1 << m) - 1, dtype=np.uint64)
+        mv = np.zeros(len(lengths), dtype=np.uint64)
+        scores = np.full(len(lengths), m, dtype=np.int64)
+
+        for j, k in enumerate(active_rows):
+            eq = peq[codes[:k, j]]
+            pv_k = pv[:k]
+            mv_k = mv[:k]
+
+            xv = eq | mv_k
+            xh = (((eq & pv_k) + pv_k) ^ pv_k) | eq
+            ph = mv_k | ~(xh | pv_k)
+            mh = pv_k & xh
+            scores[:k] += (ph & high_bit) != 0
+            scores[:k] -= (mh & high_bit) != 0
+
+            ph = (ph << one) | one
+            mh = mh << one
+            pv[:k] = mh | ~(xv | ph)
+            mv[:k] = ph & xv
+
+        return scores
+
+    def similarity(self, query):
+        """Per database row (normalize_similarity, overlapped_similarity) for an OCR result."""
+        normalize_similarity, overlapped_similarity = self.unique_similarity(query)
+        return normalize_similarity[self.inverse], overlapped_similarity[self.inverse]
+
+    def unique_similarity(self, query, rows=None):
+        """(normalize_similarity, overlapped_similarity) per unique imprint (or the given unique ids)."""
+        lengths = self.lengths if rows is None else self.lengths[rows]
+        total_length = lengths + len(query)
+        edit_distances = self.edit_distances(query, rows)
+        overlapped_scores = self.overlap_scores(query, rows)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            normalize_similarity = np.where(
+                (total_length == 0) & (edit_distances == 0),
+                1,
+                np.where(total_length != 0, 1 - edit_distances / total_length, 0)
+            )
+            overlapped_similarity = np.where(
+                (total_length == 0) & (overlapped_scores == 0),
+                1,
+                np.where(total_length != 0, overlapped_scores / total_length, 0)
+            )
+        return normalize_similarity, overlapped_similarity
@@ -0,0 +1,95 @@
+import pickle
+import torch
+import torch.nn as nn
+from torchvision import models
+
+
+def initialize_model(num_colors, device, channels_last=False):
+    model = models.resnet18(pretrained=True)
+    num_ftrs = model.fc.in_features
+    model.fc = nn.Linear(num_ftrs, num_colors)
+    model = model.to(device)
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    return model
+
+
+class MultiHeadResNet(nn.Module):
+    """ResNet-18 backbone shared by a color head and a shape head.
+
+    forward() returns (color_logits, shape_logits) from a single backbone pass.
+    """
+
+    def __init__(self, num_colors, num_shapes, pretrained=True):
+        super().__init__()
+        backbone = models.resnet18(pretrained=pretrained)
+        num_ftrs = backbone.fc.in_features
+        backbone.fc = nn.Identity()
+        self.backbone = backbone
+        self.color_head = nn.Linear(num_ftrs, num_colors)
+        self.shape_head = nn.Linear(num_ftrs, num_shapes)
+        self.num_colors = num_colors
+        self.num_shapes = num_shapes
+
+    def forward(self, x):
+        features = self.backbone(x)
+        return self.color_head(features), self.shape_head(features)
+
+
+class ModelPair(nn.Module):
+    """Separate color and shape models trained from the same batches.
+
+    forward() returns (color_logits, shape_logits) like MultiHeadResNet, but nothing is shared:
+    each model keeps its own weights, best epoch (see train.selection_groups) and checkpoint.
+    """
+
+    def __init__(self, color_model, shape_model):
+        super().__init__()
+        self.color_model = color_model
+        self.shape_model = shape_model
+
+    def members(self):
+        return [self.color_model, self.shape_model]
+
+    def forward(self, x):
+        return self.color_model(x), self.shape_model(x)
+
+
+def initialize_multihead_model(num_colors, num_shapes, device, channels_last=False):
+    model = MultiHeadResNet(num_colors, num_shapes)
+    model = model.to(device)
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    return model
+
+
+def save_multihead_model(model, path):
+    """Saves head sizes with the weights so the service can rebuild the model."""
+    torch.save({
+        "num_colors": model.num_colors,
+        "num_shapes": model.num_shapes,
+        "state_dict": model.state_dict(),
+    }, path)
+
+
+def load_classifier(model_path, device="cpu"):
+    """Eval model from a .pth checkpoint: a state_dict (main.py), a multi-head checkpoint
+    (save_multihead_model) or a whole pickled module (downloaded pretrained models).
+
+    Same loader as load_classifier in src/api-service/api/model.py.
+    """
+    try:
+        checkpoint = torch.load(model_path, map_location=device, weights_only=True)
+    except pickle.UnpicklingError:
+        # Only a pickled nn.Module needs full unpickling; checkpoints we write are plain tensors
+        checkpoint = torch.load(model_path, map_location=device, weights_only=False)
+    if isinstance(checkpoint, nn.Module):
+        model = checkpoint
+    elif "num_colors" in checkpoint:
+        model = MultiHeadResNet(checkpoint["num_colors"], checkpoint["num_shapes"], pretrained=False)
+        model.load_state_dict(checkpoint["state_dict"])
+    else:
+        model = models.resnet18(weights=None)
+        model.fc = nn.Linear(model.fc.in_features, checkpoint["fc.weight"].shape[0])
+        model.load_state_dict(checkpoint)
+    return model.to(device).eval()
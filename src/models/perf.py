@@ -0,0 +1,52 @@
+import contextlib
+import torch
+
+# Opt-in performance mode for the ResNet classifiers: bfloat16 autocast, channels_last
+# memory format and torch.compile. Every piece falls back to the fp32/NCHW/eager path
+# when the platform does not support it.
+
+
+def bf16_supported(device):
+    """True if bfloat16 autocast runs on this device."""
+    if device.type == "cuda" and not torch.cuda.is_bf16_supported():
+        return False
+    try:
+        with torch.autocast(device_type=device.type, dtype=torch.bfloat16):
+            torch.nn.functional.conv2d(torch.ones(1, 1, 4, 4, device=device), torch.ones(1, 1, 3, 3, device=device))
+        return True
+    except Exception:
+        return False
+
+
+def autocast(device, enabled=True):
+    # Weights stay fp32; convs/matmuls run in bfloat16, which needs no loss scaling
+    if not enabled:
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
+
+
+def channels_last(tensor):
+    # NHWC lets oneDNN/cuDNN pick their fastest convolution kernels
+    if tensor.dim() != 4:
+        return tensor
+    return tensor.contiguous(memory_format=torch.channels_last)
+
+
+def compile_model(model, example_inputs=None):
+    """torch.compile when available, else a frozen TorchScript trace for eval models given
+    example_inputs, else the model itself. The returned module shares the model's parameters."""
+    if hasattr(torch, "compile"):
+        try:
+            import torch._dynamo as dynamo
+            dynamo.config.suppress_errors = True  # compiler failures fall back to eager
+            return torch.compile(model)
+        except Exception as e:
+            print(f"torch.compile unavailable ({e!r}), running eager")
+            return model
+    if example_inputs is not None and not model.training:
+        try:
+            with torch.no_grad():
+                return torch.jit.freeze(torch.jit.trace(model, example_inputs))
+        except Exception as e:
+            print(f"TorchScript trace failed ({e!r}), running eager")
+    return model
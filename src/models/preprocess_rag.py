@@ -1,16 +1,16 @@
 import os
 import argparse
+import numpy as np
 import pandas as pd
-import time
 import glob
 import hashlib
-import chromadb
+import functools
 
-# Vertex AI
-import vertexai
-from vertexai.language_models import TextEmbeddingInput, TextEmbeddingModel
+from embedding_scheduler import EmbeddingScheduler, FakeEmbeddingProvider, VertexEmbeddingProvider
+from embedding_cache import EmbeddingCache
+from chunking import chunk_tsv
+from vector_store import ChromaStore, LocalVectorStore
 
-import time
 if 'GOOGLE_APPLICATION_CREDENTIALS' not in os.environ:
     os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = 'service_account.json'
 
@@ -24,37 +24,73 @@ OUTPUT_FOLDER = "outputs"
 CHROMADB_HOST = "127.0.0.1"
 CHROMADB_PORT = 16990
 DATABASE_DIR = 'database'
-vertexai.init(project=GCP_PROJECT, location=GCP_LOCATION)
-# https://cloud.google.com/vertex-ai/generative-ai/docs/model-reference/text-embeddings-api#python
-embedding_model = TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL)
+# Client-side pacing of embedding requests; keep below the project's Vertex AI quota
+EMBEDDING_RPM = int(os.getenv("EMBEDDING_RPM", "300"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "8"))
+# "vertex", or "fake" for deterministic local embeddings (tests, benchmarks, dry runs)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "vertex")
+# Embeddings by content hash, kept across runs so only new or changed chunks are embedded
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(OUTPUT_FOLDER, "embedding_cache.sqlite"))
+# Rows per batch in every stage: memory stays bounded whatever the size of the TSV
+BATCH_ROWS = int(os.getenv("RAG_BATCH_ROWS", "10000"))
+# "chroma" (the HTTP server) or "local" (an embedded index under LOCAL_INDEX_DIR, no server)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join(OUTPUT_FOLDER, "index"))
+
+@functools.lru_cache(maxsize=None)
+def embedding_model():
+	# Vertex AI and Chroma are imported when first used, so runs with the fake provider and the local
+	# store need neither the SDKs nor credentials
+	import vertexai
+	from vertexai.language_models import TextEmbeddingModel
+	vertexai.init(project=GCP_PROJECT, location=GCP_LOCATION)
+	# https://cloud.google.com/vertex-ai/generative-ai/docs/model-reference/text-embeddings-api#python
+	return TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL)
+
+def chroma_client():
+	import chromadb
+	return chromadb.HttpClient(host=CHROMADB_HOST, port=CHROMADB_PORT)
 
 def generate_query_embedding(query):
-	query_embedding_inputs = [TextEmbeddingInput(task_type='RETRIEVAL_DOCUMENT', text=query)]
-	kwargs = dict(output_dimensionality=EMBEDDING_DIMENSION) if EMBEDDING_DIMENSION else {}
-	embeddings = embedding_model.get_embeddings(query_embedding_inputs, **kwargs)
-	return embeddings[0].values
+	return embedding_provider(EMBEDDING_DIMENSION).embed([query])[0]
+
+
+def embedding_provider(dimensionality, batch_size=250):
+	if EMBEDDING_PROVIDER == "fake":
+		return FakeEmbeddingProvider(dimensionality or EMBEDDING_DIMENSION)
+	return VertexEmbeddingProvider(embedding_model(), dimensionality, max_batch_size=batch_size)
 
 
 def generate_text_embeddings(chunks, dimensionality: int = 256, batch_size=250):
-	# Max batch size is 250 for Vertex AI
-	all_embeddings = []
-	for i in range(0, len(chunks), batch_size):
-		batch = chunks[i:i+batch_size]
-		inputs = [TextEmbeddingInput(text, "RETRIEVAL_DOCUMENT") for text in batch]
-		kwargs = dict(output_dimensionality=dimensionality) if dimensionality else {}
-		embeddings = embedding_model.get_embeddings(inputs, **kwargs) 
-		all_embeddings.extend([embedding.values for embedding in embeddings])
-		time.sleep(1) # change 1 to 20
-	return all_embeddings
+	# Max batch size is 250 for Vertex AI; batches are also capped by tokens and split if rejected.
+	# Requests run concurrently, paced to EMBEDDING_RPM, backing off on quota errors.
+	scheduler = EmbeddingScheduler(
+		embedding_provider(dimensionality, batch_size),
+		requests_per_minute=EMBEDDING_RPM,
+		max_concurrency=EMBEDDING_CONCURRENCY,
+	)
+	return scheduler.embed(chunks)
+
+
+def chunk_ids(df):
+	# Derived from the content, not the row position, so an unchanged chunk keeps its id across runs
+	hashed_books = df["drugName"].apply(lambda x: hashlib.sha256(x.encode()).hexdigest()[:16])
+	hashed_chunks = df["chunk"].apply(lambda x: hashlib.sha256(x.encode()).hexdigest()[:16])
+	return hashed_books + "-" + hashed_chunks
+
+
+def existing_ids(collection, page_size=10000):
+	ids, offset = set(), 0
+	while True:
+		page = collection.get(include=[], limit=page_size, offset=offset)["ids"]
+		ids.update(page)
+		if len(page) < page_size:
+			return ids
+		offset += page_size
 
 
 def load_text_embeddings(df, collection, batch_size=500):
 
-	# Generate ids
-	df["id"] = df.index.astype(str)
-	hashed_books = df["drugName"].apply(lambda x: hashlib.sha256(x.encode()).hexdigest()[:16])
-	df["id"] = hashed_books + "-" + df["id"]
-	
 	# Process data in batches
 	total_inserted = 0
 	for i in range(0, df.shape[0], batch_size):
@@ -66,29 +102,53 @@ def load_text_embeddings(df, collection, batch_size=500):
 		metadatas = [dict(drugName=drugName_tmp) for drugName_tmp in batch["drugName"].tolist()]
 		embeddings = batch["embedding"].tolist()
 
-		collection.add(
+		collection.upsert(
 			ids=ids,
 			documents=documents,
 			metadatas=metadatas,
 			embeddings=embeddings
 		)
 		total_inserted += len(batch)
-		print(f"Inserted {total_inserted} items...")
+		print(f"Upserted {total_inserted} items...")
+
+	print(f"Finished upserting {total_inserted} items into collection '{collection.name}'")
+
+def append_jsonl(json_file, df):
+	text = df.to_json(orient='records', lines=True)
+	json_file.write(text if text.endswith("\n") else text + "\n")
+
+
+def read_jsonl(jsonl_file, batch_rows=BATCH_ROWS):
+	# Batches of rows as DataFrames; dtype=False keeps every field as written
+	with pd.read_json(jsonl_file, lines=True, dtype=False, chunksize=batch_rows) as reader:
+		for batch in reader:
+			yield batch.reset_index(drop=True)
+
+
+def write_vectors_header(f, rows, dimensionality):
+	# .npy header for a float32 matrix whose rows are then appended batch by batch
+	np.lib.format.write_array_header_1_0(f, {"descr": "<f4", "fortran_order": False, "shape": (rows, dimensionality)})
+
+
+def read_vectors(path, batch_rows=BATCH_ROWS):
+	# Batches of rows from a .npy matrix, read sequentially rather than mapped, so resident memory stays at one batch
+	with open(path, "rb") as f:
+		np.lib.format.read_magic(f)
+		(rows, dimensionality), _, dtype = np.lib.format.read_array_header_1_0(f)
+		for start in range(0, rows, batch_rows):
+			count = min(batch_rows, rows - start)
+			yield np.fromfile(f, dtype=dtype, count=count * dimensionality).reshape(count, dimensionality)
+
 
-	print(f"Finished inserting {total_inserted} items into collection '{collection.name}'")
+def count_lines(path):
+	with open(path, "rb") as f:
+		return sum(1 for _ in f)
 
-def chunk(database_path,method="char-split"):
-	# Make dataset folders
-	os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-	
+
+def chunk(database_path,method="char-split",chunk_size=350,chunk_overlap=20,num_workers=None):
 	database_dir_path = os.path.join(".",DATABASE_DIR,database_path)
-	df = pd.read_csv(database_dir_path,sep='\t')
-	df['chunk'] = df.apply(lambda x: f"condition:{x['condition']}, review:\"{x['review']}\", rating:{x['rating']}, date:{x['date']}, usefulCount:{x['usefulCount']}", axis=1)
-	df = df[['drugName', 'chunk']]
-	df = df.head(500)
-	jsonl_filename = os.path.join(OUTPUT_FOLDER, f"chunks-{method}-1.jsonl")
-	with open(jsonl_filename, "w") as json_file:
-		json_file.write(df.to_json(orient='records', lines=True))
+	# The TSV is read BATCH_ROWS rows at a time; each batch is chunked by a pool process into chunks-{method}-{n}.jsonl
+	return chunk_tsv(database_dir_path, OUTPUT_FOLDER, method, chunk_size, chunk_overlap, num_workers, BATCH_ROWS)
 
 def embed(method="char-split"):
 	print("embed()")
@@ -97,72 +157,130 @@ def embed(method="char-split"):
 	jsonl_files = glob.glob(os.path.join(OUTPUT_FOLDER, f"chunks-{method}-*.jsonl"))
 	print("Number of files to process:", len(jsonl_files))
 
+	cache = EmbeddingCache(EMBEDDING_CACHE_PATH, f"{EMBEDDING_PROVIDER}:{EMBEDDING_MODEL}", EMBEDDING_DIMENSION)
+
 	# Process
 	for jsonl_file in jsonl_files:
 		print("Processing file:", jsonl_file)
 
-		data_df = pd.read_json(jsonl_file, lines=True)
-		print("Shape:", data_df.shape)
-		print(data_df.head())
-
-		chunks = data_df["chunk"].values
-		if method == "semantic-split":
-			embeddings = generate_text_embeddings(chunks,EMBEDDING_DIMENSION, batch_size=15)
-		else:
-			embeddings = generate_text_embeddings(chunks,EMBEDDING_DIMENSION, batch_size=100)
-		data_df["embedding"] = embeddings
-
-		# Save 
-		print("Shape:", data_df.shape)
-		print(data_df.head())
-
+		# embeddings-*.jsonl holds drugName/chunk and embeddings-*.npy the float32 vectors, row for row
 		jsonl_filename = jsonl_file.replace("chunks-","embeddings-")
-		with open(jsonl_filename, "w") as json_file:
-			json_file.write(data_df.to_json(orient='records', lines=True))
+		row = 0
+		with open(jsonl_filename, "w") as json_file, open(jsonl_filename.replace(".jsonl", ".npy"), "wb") as vector_file:
+			write_vectors_header(vector_file, count_lines(jsonl_file), EMBEDDING_DIMENSION)
+			for data_df in read_jsonl(jsonl_file):
+				# Only chunks missing from the cache are sent; batches are packed up to 250 items or the request token limit
+				embeddings = cache.embed(data_df["chunk"].values, lambda texts: generate_text_embeddings(texts, EMBEDDING_DIMENSION, batch_size=250))
+				vector_file.write(np.asarray(embeddings, dtype=np.float32).tobytes())
+				append_jsonl(json_file, data_df[["drugName", "chunk"]])
+				row += len(data_df)
+		print(f"Embedded {row} chunks")
+
+	cache.close()
+
+	# Shards left from an earlier run that produced more of them
+	current = {jsonl_file.replace("chunks-","embeddings-") for jsonl_file in jsonl_files}
+	for jsonl_file in glob.glob(os.path.join(OUTPUT_FOLDER, f"embeddings-{method}-*.jsonl")):
+		if jsonl_file not in current:
+			os.remove(jsonl_file)
+			if os.path.exists(jsonl_file.replace(".jsonl", ".npy")):
+				os.remove(jsonl_file.replace(".jsonl", ".npy"))
 		
-def load(method="char-split"):
+def read_embeddings(jsonl_file, batch_rows=BATCH_ROWS):
+	# Batches of drugName/chunk rows and their vectors; the .jsonl and .npy are read in step, one batch at a time
+	vectors = read_vectors(jsonl_file.replace(".jsonl", ".npy"), batch_rows)
+	for data_df in read_jsonl(jsonl_file, batch_rows):
+		batch = next(vectors, None)
+		if batch is None or len(batch) != len(data_df):
+			raise ValueError(f"{jsonl_file} and its embeddings have different numbers of rows")
+		yield data_df, batch
+
+def unique_chunks(jsonl_files):
+	# (data_df with ids, vectors) batches from the embedding files, each chunk id once
+	seen = set()
+	for jsonl_file in jsonl_files:
+		print("Processing file:", jsonl_file)
+		for data_df, vectors in read_embeddings(jsonl_file):
+			data_df["id"] = chunk_ids(data_df)
+			keep = (~data_df["id"].duplicated() & ~data_df["id"].isin(seen)).values
+			seen.update(data_df["id"])
+			yield data_df[keep].reset_index(drop=True), vectors[keep]
+
+def load_local(method="char-split"):
+	# Bulk build of the embedded index straight from the embedding files; rebuilding is local disk work only
+	jsonl_files = glob.glob(os.path.join(OUTPUT_FOLDER, f"embeddings-{method}-*.jsonl"))
+	print("Number of files to process:", len(jsonl_files))
+	if not jsonl_files:
+		return
+	batches = ((df["id"].tolist(), df["drugName"].tolist(), df["chunk"].tolist(), vectors) for df, vectors in unique_chunks(jsonl_files))
+	LocalVectorStore.build(os.path.join(LOCAL_INDEX_DIR, method), batches, EMBEDDING_DIMENSION)
+
+@functools.lru_cache(maxsize=None)
+def vector_store(method="char-split"):
+	# One open store per collection for the process; query() reuses it
+	if VECTOR_STORE == "local":
+		return LocalVectorStore(os.path.join(LOCAL_INDEX_DIR, method))
+	return ChromaStore(CHROMADB_HOST, CHROMADB_PORT, f"{method}-collection")
+
+def query(text, method="char-split", drug_name=None, k=5):
+	# Chunks most similar to text, optionally only those of one drug
+	return vector_store(method).search(generate_query_embedding(text), k, drug_name=drug_name)
+
+def load(method="char-split", rebuild=False):
 	print("load()")
 
+	if VECTOR_STORE == "local":
+		return load_local(method)
+
 	# Connect to chroma DB
-	client = chromadb.HttpClient(host=CHROMADB_HOST, port=CHROMADB_PORT)
+	client = chroma_client()
 
 	# Get a collection object from an existing collection, by name. If it doesn't exist, create it.
 	collection_name = f"{method}-collection"
-	print("Creating collection:", collection_name)
+	print("Loading collection:", collection_name)
 
-	try:
-		# Clear out any existing items in the collection
-		client.delete_collection(name=collection_name)
-		print(f"Deleted existing collection '{collection_name}'")
-	except Exception:
-		print(f"Collection '{collection_name}' did not exist. Creating new.")
+	if rebuild:
+		try:
+			# Clear out any existing items in the collection
+			client.delete_collection(name=collection_name)
+			print(f"Deleted existing collection '{collection_name}'")
+		except Exception:
+			print(f"Collection '{collection_name}' did not exist. Creating new.")
 
-	collection = client.create_collection(name=collection_name, metadata={"hnsw:space": "cosine"})
-	print(f"Created new empty collection '{collection_name}'")
+	collection = client.get_or_create_collection(name=collection_name, metadata={"hnsw:space": "cosine"})
 	print("Collection:", collection)
 
 	# Get the list of embedding files
 	jsonl_files = glob.glob(os.path.join(OUTPUT_FOLDER, f"embeddings-{method}-*.jsonl"))
 	print("Number of files to process:", len(jsonl_files))
-
-	# Process
-	for jsonl_file in jsonl_files:
-		print("Processing file:", jsonl_file)
-
-		data_df = pd.read_json(jsonl_file, lines=True)
-		print("Shape:", data_df.shape)
-		print(data_df.head())
-
+	if not jsonl_files:
+		return
+
+	# Only upsert chunks the collection does not have, and drop the ones no longer in the files
+	current = existing_ids(collection)
+	print(f"{len(current)} items in collection")
+	seen = set()
+	for data_df, vectors in unique_chunks(jsonl_files):
+		seen.update(data_df["id"])
+		new = (~data_df["id"].isin(current)).values
+		new_df = data_df[new].copy()
+		new_df["embedding"] = vectors[new].tolist()
 		# Load data
-		load_text_embeddings(data_df, collection)
+		load_text_embeddings(new_df, collection)
+
+	stale = sorted(current - seen)
+	print(f"Deleting {len(stale)} items no longer in the embedding files")
+	for i in range(0, len(stale), 500):
+		collection.delete(ids=stale[i:i+500])
 
 
 def main(args=None):
 	print("CLI Arguments:", args)
 
-	chunk(database_path=args.database_path,method=args.chunk_type)
+	chunk(database_path=args.database_path,method=args.chunk_type,chunk_size=args.chunk_size,
+		chunk_overlap=args.chunk_overlap,num_workers=args.chunk_workers or None)
 	embed(method=args.chunk_type)
-	load(method=args.chunk_type)
+	load(method=args.chunk_type, rebuild=args.rebuild)
 
 if __name__ == "__main__":
 	# Generate the inputs arguments parser
@@ -175,6 +293,10 @@ if __name__ == "__main__":
 		help="database path",
 	)
 	parser.add_argument("--chunk_type", default="char-split", help="char-split | recursive-split | semantic-split")
+	parser.add_argument("--chunk_size", type=int, default=350, help="Maximum characters of review text per chunk")
+	parser.add_argument("--chunk_overlap", type=int, default=20, help="Characters shared by consecutive chunks (char-split, recursive-split)")
+	parser.add_argument("--chunk_workers", type=int, default=0, help="Chunking processes (0 uses every CPU)")
+	parser.add_argument("--rebuild", action="store_true", help="Delete and rebuild the collection instead of updating it")
 
 	args = parser.parse_args()
 
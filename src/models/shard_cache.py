@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from multiprocessing import Pool
+from PIL import Image
+from torchvision import transforms
+
+# Decoded, resized images stored as uint8 (N, H, W, 3) .npy shards plus an index.json mapping
+# splimage -> (shard, row). PillDataset(shard_dir=...) reads them through np.memmap, so each
+# epoch is a page-cache read instead of a JPEG decode + resize per sample.
+
+INDEX_FILE = "index.json"
+
+
+def decode_image(args):
+    img_path, image_size = args
+    image = Image.open(img_path).convert("RGB")
+    # Same resize as load_data's transform, so shard pixels equal the JPEG path exactly
+    image = transforms.Resize((image_size, image_size))(image)
+    return np.asarray(image, dtype=np.uint8)
+
+
+def build_shards(csv_file, data_dir, cache_dir, image_size=224, shard_size=4096, num_workers=None):
+    data = pd.read_csv(csv_file)
+    names = list(dict.fromkeys(data['splimage']))  # unique, in CSV order
+    os.makedirs(cache_dir, exist_ok=True)
+
+    index = {"image_size": image_size, "shards": [], "images": {}}
+    jobs = [(os.path.join(data_dir, name + ".jpg"), image_size) for name in names]
+    with Pool(num_workers or os.cpu_count()) as pool:
+        decoded = pool.imap(decode_image, jobs, chunksize=16)
+        for shard_id, start in enumerate(range(0, len(names), shard_size)):
+            shard_names = names[start:start + shard_size]
+            shard_file = f"shard_{shard_id:05d}.npy"
+            # Written through a memmap so a shard never has to fit in memory
+            shard = np.lib.format.open_memmap(
+                os.path.join(cache_dir, shard_file), mode="w+", dtype=np.uint8,
+                shape=(len(shard_names), image_size, image_size, 3)
+            )
+            for row, name in enumerate(shard_names):
+                shard[row] = next(decoded)
+                index["images"][name] = [shard_id, row]
+            shard.flush()
+            del shard
+            index["shards"].append({"file": shard_file, "count": len(shard_names)})
+            print(f"Wrote {shard_file} ({start + len(shard_names)}/{len(names)} images)")
+
+    with open(os.path.join(cache_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f)
+    return index
+
+
+class ShardReader:
+    """Zero-copy access to the images written by build_shards().
+
+    Shards are mapped on first access in each process, so the reader pickles cheaply into
+    DataLoader workers instead of shipping the mapped arrays.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+            index = json.load(f)
+        self.image_size = index["image_size"]
+        self.images = index["images"]
+        self.shard_files = [shard["file"] for shard in index["shards"]]
+        self.shards = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["shards"] = None
+        return state
+
+    def __contains__(self, name):
+        return name in self.images
+
+    def __getitem__(self, name):
+        if self.shards is None:
+            # Copy-on-write maps: views are writable for torch.from_numpy, the files never change
+            self.shards = [np.load(os.path.join(self.cache_dir, f), mmap_mode="c") for f in self.shard_files]
+        shard_id, row = self.images[name]
+        return self.shards[shard_id][row]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Decode and resize training images once into memory-mapped shards.')
+    parser.add_argument('--csv_file', type=str, default='encoded_train_annotations.csv', help='Annotations CSV listing the images.')
+    parser.add_argument('--data_dir', type=str, default='local_data/train', help='Directory with the .jpg images.')
+    parser.add_argument('--cache_dir', type=str, default='shards/train', help='Output directory for shards and index.')
+    parser.add_argument('--image_size', type=int, default=224, help='Resize target (load_data uses 224).')
+    parser.add_argument('--shard_size', type=int, default=4096, help='Images per shard file.')
+    parser.add_argument('--num_workers', type=int, default=0, help='Decode processes (0 uses all CPUs).')
+
+    args = parser.parse_args()
+    start = time.time()
+    index = build_shards(args.csv_file, args.data_dir, args.cache_dir, args.image_size, args.shard_size, args.num_workers or None)
+    print(f"Cached {len(index['images'])} images in {len(index['shards'])} shards in {time.time() - start:.1f}s")
@@ -0,0 +1,131 @@
+import glob
+import os
+import random
+import pandas as pd
+import pytest
+from chunking import SPLITTERS, build_chunks, char_split, chunk_tsv, recursive_split, semantic_split
+
+SENTENCES = [
+    "I started this for my anxiety and the first week was rough.",
+    "The side effects were mostly nausea and a headache in the mornings!",
+    "My doctor raised the dose after a month because nothing changed.",
+    "Insurance would not cover it so I paid out of pocket.",
+    "After three months my anxiety is finally under control.",
+    "Sleep was the worst part, I woke up every night at 3am?",
+]
+
+
+def review(num_sentences, seed=0):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(SENTENCES) for _ in range(num_sentences))
+
+
+def reviews_frame(num_rows, seed=0):
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        "uniqueID": range(num_rows),
+        "drugName": [f"Drug{i % 13}" for i in range(num_rows)],
+        "condition": [rng.choice(["Anxiety", "Pain", None]) for _ in range(num_rows)],
+        "review": [f"\"{review(rng.choice([1, 3, 8, 20]), seed + i)}\"" for i in range(num_rows)],
+        "rating": [float(rng.randint(1, 10)) for _ in range(num_rows)],
+        "date": ["May 20, 2012"] * num_rows,
+        "usefulCount": [rng.randint(0, 300) for _ in range(num_rows)],
+    })
+
+
+@pytest.mark.parametrize("method", list(SPLITTERS))
+def test_short_reviews_stay_whole(method):
+    text = SENTENCES[0]
+    assert SPLITTERS[method](text, 350, 20) == [text]
+
+
+@pytest.mark.parametrize("method", list(SPLITTERS))
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(100, 10), (350, 20), (60, 0)])
+def test_chunks_respect_chunk_size(method, chunk_size, chunk_overlap):
+    for seed in range(20):
+        text = review(15, seed)
+        chunks = SPLITTERS[method](text, chunk_size, chunk_overlap)
+        assert len(chunks) > 1
+        assert all(0 < len(chunk) <= chunk_size for chunk in chunks)
+
+
+def test_char_split_windows_overlap():
+    text = "".join(chr(ord("a") + i % 26) for i in range(1000))
+    chunks = char_split(text, 100, 20)
+    assert all(len(chunk) == 100 for chunk in chunks[:-1])
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk[:20] == previous[-20:]
+    # Nothing is lost: dropping each chunk's overlap rebuilds the text
+    assert chunks[0] + "".join(chunk[20:] for chunk in chunks[1:]) == text
+
+
+def test_recursive_split_overlaps_on_word_boundaries():
+    # No sentence ends, so the text is split on spaces and whole words are repeated as overlap
+    words = [f"word{i}" for i in range(200)]
+    chunks = recursive_split(" ".join(words), 120, 30)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        # The next chunk starts with the last words of the previous one, at most chunk_overlap long
+        shared = next(n for n in range(min(len(previous), len(chunk)), -1, -1) if previous.endswith(chunk[:n]))
+        assert 0 < shared <= 30
+        assert chunk[:shared].split() == previous.split()[-len(chunk[:shared].split()):]
+    assert [word for chunk in chunks for word in chunk.split()][:len(chunks[0].split())] == words[:len(chunks[0].split())]
+    assert set(" ".join(chunks).split()) == set(words)
+
+
+def test_recursive_split_prefers_sentence_boundaries():
+    # ". " comes before " " in the separators, so chunks end at a full stop when sentences fit
+    text = " ".join(sentence[:-1] + "." for sentence in random.Random(1).choices(SENTENCES, k=10))
+    chunks = recursive_split(text, 200, 0)
+    assert len(chunks) > 1
+    assert all(chunk.endswith(".") for chunk in chunks)
+    assert " ".join(chunks) == text
+
+
+def test_semantic_split_breaks_between_sentences_without_overlap():
+    text = review(12, seed=2)
+    chunks = semantic_split(text, 200, 20)
+    assert " ".join(chunks) == text
+
+
+def test_build_chunks_formats_every_piece_with_its_row():
+    df = pd.DataFrame({"drugName": ["A", "B"], "condition": ["Pain", None], "review": ["short", "x" * 50],
+                       "rating": [9.0, 1.0], "date": ["May 20, 2012", "June 1, 2015"], "usefulCount": [3, 0]})
+    chunks = build_chunks(df, "char-split", chunk_size=20, chunk_overlap=0)
+    assert list(chunks["drugName"]) == ["A", "B", "B", "B"]
+    assert chunks["chunk"].iloc[0] == "condition:Pain, review:\"short\", rating:9.0, date:May 20, 2012, usefulCount:3"
+    assert chunks["chunk"].iloc[1] == f"condition:nan, review:\"{'x' * 20}\", rating:1.0, date:June 1, 2015, usefulCount:0"
+
+
+@pytest.mark.parametrize("method", list(SPLITTERS))
+def test_sharded_pool_output_matches_serial(tmp_path, method):
+    df = reviews_frame(250)
+    tsv_path = tmp_path / "reviews.tsv"
+    df.to_csv(tsv_path, sep="\t", index=False)
+    expected = build_chunks(pd.read_csv(tsv_path, sep="\t"), method, 120, 20).reset_index(drop=True)
+
+    for num_workers in (1, 2):
+        output = tmp_path / f"out{num_workers}"
+        stats = chunk_tsv(str(tsv_path), str(output), method, 120, 20, num_workers=num_workers, batch_rows=40)
+        shards = sorted(glob.glob(os.path.join(output, f"chunks-{method}-*.jsonl")),
+                        key=lambda path: int(path.rsplit("-", 1)[1].split(".")[0]))
+        assert len(shards) == stats["shards"] == 7
+        chunks = pd.concat([pd.read_json(path, lines=True, dtype=False) for path in shards], ignore_index=True)
+        pd.testing.assert_frame_equal(chunks, expected)
+        assert stats["rows"] == 250 and stats["chunks"] == len(expected)
+        assert stats["chars"] == expected["chunk"].str.len().sum()
+
+
+def test_rerun_removes_old_shards(tmp_path):
+    tsv_path = tmp_path / "reviews.tsv"
+    reviews_frame(100).to_csv(tsv_path, sep="\t", index=False)
+    chunk_tsv(str(tsv_path), str(tmp_path / "out"), "char-split", num_workers=1, batch_rows=10)
+    reviews_frame(30).to_csv(tsv_path, sep="\t", index=False)
+    chunk_tsv(str(tsv_path), str(tmp_path / "out"), "char-split", num_workers=1, batch_rows=10)
+    assert len(glob.glob(str(tmp_path / "out" / "chunks-char-split-*.jsonl"))) == 3
+
+
+def test_invalid_options_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        chunk_tsv("unused.tsv", str(tmp_path), "word-split")
+    with pytest.raises(ValueError):
+        chunk_tsv("unused.tsv", str(tmp_path), "char-split", chunk_size=20, chunk_overlap=20)
@@ -0,0 +1,125 @@
+import os
+import socket
+import numpy as np
+import pytest
+import torch
+import torch.multiprocessing as mp
+from torch import nn
+from torch.utils.data import DataLoader, TensorDataset
+from torch.utils.data.distributed import DistributedSampler
+import distributed
+from distributed import (all_reduce_sum, cleanup_distributed, is_distributed, is_main_process, local_device, rank,
+                         setup_distributed, unpadded_samples, world_size)
+from train import evaluate, train_model
+
+
+def test_single_process_fallback(monkeypatch):
+    # Without init_process_group every helper behaves as the only process of a group of one
+    assert not is_distributed()
+    assert rank() == 0 and world_size() == 1 and is_main_process()
+    tensor = torch.tensor([1.0, 2.0])
+    assert all_reduce_sum(tensor) is tensor and tensor.tolist() == [1.0, 2.0]
+    cleanup_distributed()  # no-op
+    monkeypatch.setattr(distributed.torch.cuda, "is_available", lambda: False)
+    assert local_device() == torch.device("cpu")
+    assert local_device("cpu") == torch.device("cpu")
+
+
+def test_local_device_uses_the_local_rank_gpu(monkeypatch):
+    monkeypatch.setattr(distributed.torch.cuda, "is_available", lambda: True)
+    monkeypatch.setenv("LOCAL_RANK", "3")
+    assert local_device() == torch.device("cuda", 3)
+    assert local_device("cpu") == torch.device("cpu")
+
+
+def dataset(num_samples=10):
+    generator = torch.Generator().manual_seed(0)
+    return TensorDataset(torch.randn(num_samples, 4, generator=generator), torch.randint(0, 3, (num_samples,), generator=generator))
+
+
+def rank_loader(data, rank, num_replicas, batch_size=3):
+    # A DistributedSampler for one rank can be built without a process group
+    sampler = DistributedSampler(data, num_replicas=num_replicas, rank=rank, shuffle=False)
+    return DataLoader(data, batch_size=batch_size, sampler=sampler)
+
+
+def test_unpadded_samples():
+    data = dataset(10)
+    # 10 samples over 4 ranks: padded to 12, so ranks 2 and 3 each get one repeat
+    assert [unpadded_samples(rank_loader(data, r, 4)) for r in range(4)] == [3, 3, 2, 2]
+    assert [len(rank_loader(data, r, 4).sampler) for r in range(4)] == [3, 3, 3, 3]
+    assert unpadded_samples(DataLoader(data, batch_size=3)) is None
+    drop_last = DistributedSampler(data, num_replicas=4, rank=0, shuffle=False, drop_last=True)
+    assert unpadded_samples(DataLoader(data, sampler=drop_last)) is None
+
+
+@pytest.mark.parametrize("num_replicas", [3, 4, 7])
+def test_validation_counts_every_sample_once(num_replicas):
+    data = dataset(10)
+    torch.manual_seed(0)
+    model = nn.Linear(4, 3)
+    criterion = nn.CrossEntropyLoss()
+    device = torch.device("cpu")
+    full_loss, full_acc = evaluate(model, model, DataLoader(data, batch_size=3), criterion, device, False, False)
+
+    # What all_reduce_sum adds up across ranks: each rank's sums over its real samples
+    loss_sum, correct_sum, samples = 0.0, 0.0, 0
+    for r in range(num_replicas):
+        loader = rank_loader(data, r, num_replicas)
+        count = unpadded_samples(loader)
+        loss, acc = evaluate(model, model, loader, criterion, device, False, False)
+        loss_sum += loss * count
+        correct_sum += acc * count
+        samples += count
+    assert samples == len(data)
+    assert loss_sum / samples == pytest.approx(full_loss)
+    np.testing.assert_allclose(correct_sum / samples, full_acc)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def ddp_worker(local_rank, processes, port, checkpoint_dir, results):
+    os.environ.update(RANK=str(local_rank), WORLD_SIZE=str(processes), LOCAL_RANK=str(local_rank),
+                      LOCAL_WORLD_SIZE=str(processes), MASTER_ADDR="127.0.0.1", MASTER_PORT=str(port))
+    setup_distributed("gloo")
+    torch.manual_seed(local_rank)  # different initial weights: DDP must broadcast rank 0's
+    model = nn.Linear(4, 3)
+    data, val_data = dataset(40), dataset(11)  # 11 validation samples: DistributedSampler pads them to 12
+    train_loader = DataLoader(data, batch_size=4, sampler=DistributedSampler(data, shuffle=True, seed=0))
+    val_loader = DataLoader(val_data, batch_size=3, sampler=DistributedSampler(val_data, shuffle=False))
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    # Every rank is given its own path, so a checkpoint written by any rank but 0 would show up
+    train_model(model, train_loader, val_loader, nn.CrossEntropyLoss(), optimizer, torch.device("cpu"), 3,
+                checkpoint_path=os.path.join(checkpoint_dir, f"rank{local_rank}.pth"))
+    val_loss, val_acc = evaluate(model, model, val_loader, nn.CrossEntropyLoss(), torch.device("cpu"), False, False)
+    # numpy copies: tensors sent through a queue would be shared memory that dies with this process
+    results.put((local_rank, {key: value.numpy().copy() for key, value in model.state_dict().items()}, val_loss, val_acc))
+    cleanup_distributed()
+
+
+def test_ddp_with_two_gloo_processes(tmp_path):
+    processes = 2
+    results = mp.get_context("spawn").SimpleQueue()
+    mp.spawn(ddp_worker, args=(processes, free_port(), str(tmp_path), results), nprocs=processes)
+    outputs = sorted((results.get() for _ in range(processes)), key=lambda output: output[0])
+
+    assert sorted(os.listdir(tmp_path)) == ["rank0.pth"]
+    assert torch.load(tmp_path / "rank0.pth")["epoch"] == 2
+
+    # Gradients were averaged across ranks, so both replicas end with the same weights
+    (_, weights, val_loss, val_acc), (_, other_weights, other_loss, other_acc) = outputs
+    for key, value in weights.items():
+        np.testing.assert_array_equal(value, other_weights[key])
+
+    # Validation over both ranks equals one process scoring each of the 11 samples once
+    model = nn.Linear(4, 3)
+    model.load_state_dict({key: torch.from_numpy(value) for key, value in weights.items()})
+    full_loss, full_acc = evaluate(model, model, DataLoader(dataset(11), batch_size=3), nn.CrossEntropyLoss(),
+                                   torch.device("cpu"), False, False)
+    assert val_loss == other_loss == pytest.approx(full_loss)
+    np.testing.assert_allclose(val_acc, full_acc)
+    np.testing.assert_allclose(other_acc, full_acc)
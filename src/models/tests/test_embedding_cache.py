@@ -0,0 +1,66 @@
+import numpy as np
+from embedding_cache import EmbeddingCache, cache_key
+from embedding_scheduler import FakeEmbeddingProvider
+
+
+class CountingEmbedder:
+    def __init__(self, dimensionality=16):
+        self.provider = FakeEmbeddingProvider(dimensionality)
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts.extend(texts)
+        return self.provider.embed(texts)
+
+
+def as_float32(vectors):
+    return np.asarray(vectors, dtype=np.float32).tolist()
+
+
+def test_cache_key_depends_on_model_dimensionality_and_text():
+    key = cache_key("chunk", "fake:text-embedding-004", 256)
+    assert key == cache_key("chunk", "fake:text-embedding-004", 256)
+    assert len({key, cache_key("chunk", "other-model", 256), cache_key("chunk", "fake:text-embedding-004", 128),
+                cache_key("chunk ", "fake:text-embedding-004", 256)}) == 4
+
+
+def test_misses_are_embedded_once_and_hits_are_not(tmp_path):
+    embedder = CountingEmbedder()
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), "fake", 16)
+    texts = ["a", "b", "a", "c"]
+    vectors = cache.embed(texts, embedder)
+    # The duplicate "a" is sent once; results still line up with the input
+    assert embedder.texts == ["a", "b", "c"]
+    assert vectors == as_float32([embedder.provider.vector(text) for text in texts])
+
+    vectors = cache.embed(["c", "d", "a"], embedder)
+    assert embedder.texts == ["a", "b", "c", "d"]
+    assert vectors == as_float32([embedder.provider.vector(text) for text in ["c", "d", "a"]])
+    cache.close()
+
+
+def test_cache_persists_and_is_keyed_by_model(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    embedder = CountingEmbedder()
+    cache = EmbeddingCache(path, "fake", 16)
+    cache.embed(["a", "b"], embedder)
+    cache.close()
+
+    reopened = EmbeddingCache(path, "fake", 16)
+    assert reopened.embed(["b", "a"], embedder) == as_float32([embedder.provider.vector(text) for text in ["b", "a"]])
+    assert embedder.texts == ["a", "b"]
+    reopened.close()
+
+    other_model = EmbeddingCache(path, "other", 16)
+    other_model.embed(["a"], embedder)
+    assert embedder.texts == ["a", "b", "a"]
+    other_model.close()
+
+
+def test_get_many_returns_only_present_keys(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), "fake", 2)
+    cache.put_many([("k1", [0.5, 0.25]), ("k2", [1.0, 0.0])])
+    # More keys than one SQL batch
+    found = cache.get_many(["k1", "missing"] + [f"x{i}" for i in range(1200)] + ["k2"])
+    assert found == {"k1": [0.5, 0.25], "k2": [1.0, 0.0]}
+    cache.close()
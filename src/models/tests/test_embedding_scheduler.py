@@ -0,0 +1,168 @@
+import threading
+import pytest
+import embedding_scheduler
+from embedding_scheduler import (FATAL, QUOTA, TOO_LARGE, TRANSIENT, EmbeddingScheduler, FakeEmbeddingProvider,
+                                 FakeQuotaError, FakeTooLargeError, TokenBucket)
+
+
+class FakeClock:
+    """time.monotonic/time.sleep stand-in: sleeping advances the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ScriptedProvider(FakeEmbeddingProvider):
+    """Raises the given errors on the first requests, then embeds normally; too_large_over rejects bigger batches."""
+
+    def __init__(self, errors=(), too_large_over=None):
+        super().__init__(dimensionality=8)
+        self.errors = list(errors)
+        self.too_large_over = too_large_over
+        self.batch_sizes = []
+
+    def embed(self, texts):
+        with self.lock:
+            self.requests += 1
+            self.batch_sizes.append(len(texts))
+            error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+        if self.too_large_over is not None and len(texts) > self.too_large_over:
+            raise FakeTooLargeError("request exceeds the token limit")
+        return [self.vector(text) for text in texts]
+
+
+def texts(n):
+    return [f"review {i}" for i in range(n)]
+
+
+def test_token_bucket_allows_a_burst_then_paces(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(embedding_scheduler.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(embedding_scheduler.time, "sleep", clock.sleep)
+    # Rates and capacities that are exact in binary, so the fake clock adds up exactly
+    bucket = TokenBucket(rate_per_minute=480, capacity=4)
+    start = clock.now
+    for _ in range(4):
+        bucket.acquire()
+    assert clock.now == start  # the burst fits in the bucket
+    for _ in range(8):
+        bucket.acquire()
+    assert clock.now - start == 1.0  # then 8 requests per second
+    # More than a burst waits for a full bucket rather than forever
+    bucket.acquire(50)
+    assert clock.now - start == 1.5
+
+
+def test_fake_provider_errors_are_classified():
+    provider = FakeEmbeddingProvider()
+    assert provider.classify_error(FakeQuotaError()) == QUOTA
+    assert provider.classify_error(FakeTooLargeError()) == TOO_LARGE
+    assert provider.classify_error(ConnectionError()) == TRANSIENT
+    assert provider.classify_error(ValueError()) == FATAL
+
+
+def test_fake_provider_enforces_limits():
+    provider = FakeEmbeddingProvider(quota_rpm=2)
+    provider.embed(["a"])
+    provider.embed(["a"])
+    with pytest.raises(FakeQuotaError):
+        provider.embed(["a"])
+    with pytest.raises(FakeTooLargeError):
+        FakeEmbeddingProvider().embed(["x"] * (provider.max_batch_size + 1))
+    assert FakeEmbeddingProvider().embed(["a", "b"]) == [provider.vector("a"), provider.vector("b")]
+
+
+def test_batches_respect_item_and_token_limits():
+    provider = FakeEmbeddingProvider()
+    provider.max_batch_size = 3
+    provider.max_batch_tokens = 10
+    scheduler = EmbeddingScheduler(provider)
+    # "x" * 19 estimates 5 tokens; "x" * 3 estimates 1
+    batch_texts = ["x" * 19, "x" * 19, "x" * 19, "x" * 3, "x" * 3, "x" * 3, "x" * 3]
+    assert scheduler.make_batches(batch_texts) == [(0, 2), (2, 5), (5, 7)]
+    assert scheduler.make_batches([]) == []
+
+
+def test_results_are_in_order():
+    provider = FakeEmbeddingProvider(dimensionality=8)
+    provider.max_batch_size = 7
+    inputs = texts(100)
+    vectors = EmbeddingScheduler(provider, max_concurrency=4, progress_every=0).embed(inputs)
+    assert vectors == [provider.vector(text) for text in inputs]
+    assert provider.requests == 15
+
+
+def test_too_large_batches_are_split():
+    provider = ScriptedProvider(too_large_over=3)
+    provider.max_batch_size = 10
+    inputs = texts(10)
+    scheduler = EmbeddingScheduler(provider, max_concurrency=1, progress_every=0)
+    assert scheduler.embed(inputs) == [provider.vector(text) for text in inputs]
+    # 10 -> 5 + 5 -> (2 + 3) + (2 + 3)
+    assert scheduler.stats["splits"] == 3
+    assert sorted(size for size in provider.batch_sizes if size <= 3) == [2, 2, 3, 3]
+
+
+def test_quota_and_transient_errors_are_retried_with_backoff():
+    provider = ScriptedProvider(errors=[FakeQuotaError("429"), ConnectionError("reset"), FakeQuotaError("429")])
+    scheduler = EmbeddingScheduler(provider, max_concurrency=1, base_delay=0.001, max_delay=0.01, progress_every=0)
+    inputs = texts(5)
+    assert scheduler.embed(inputs) == [provider.vector(text) for text in inputs]
+    assert scheduler.stats["retries"] == 3
+    assert scheduler.stats["quota_errors"] == 2
+    assert scheduler.stats["requests"] == provider.requests == 4
+    assert scheduler.pause_until > 0  # quota errors pause every worker
+
+
+def test_backoff_grows_exponentially_with_jitter_and_a_cap():
+    scheduler = EmbeddingScheduler(FakeEmbeddingProvider(), base_delay=1.0, max_delay=10.0)
+    for attempt, limit in [(0, 1.0), (1, 2.0), (2, 4.0), (3, 8.0), (6, 10.0)]:
+        delays = [scheduler._backoff(attempt) for _ in range(50)]
+        assert all(limit / 2 <= delay <= limit for delay in delays)
+
+
+def test_retries_run_out():
+    provider = ScriptedProvider(errors=[ConnectionError("reset")] * 10)
+    scheduler = EmbeddingScheduler(provider, max_retries=2, base_delay=0.001, progress_every=0)
+    with pytest.raises(ConnectionError):
+        scheduler.embed(texts(3))
+    assert provider.requests == 3
+
+
+def test_fatal_error_cancels_queued_batches():
+    provider = ScriptedProvider(errors=[ValueError("bad request")])
+    provider.max_batch_size = 1
+    scheduler = EmbeddingScheduler(provider, max_concurrency=1, progress_every=0)
+    with pytest.raises(ValueError, match="bad request"):
+        scheduler.embed(texts(50))
+    # The worker may already have taken the next batch when the error is seen, but no more
+    assert provider.requests <= 2
+
+
+def test_fatal_error_stops_workers_waiting_to_retry():
+    release = threading.Event()
+
+    class Provider(ScriptedProvider):
+        def embed(self, texts):
+            if texts == ["fatal"]:
+                release.wait(5)
+                raise ValueError("bad request")
+            release.set()
+            raise ConnectionError("reset")
+
+    provider = Provider()
+    provider.max_batch_size = 1
+    # Without the stop, the retrying batch would sleep out its 60s backoff before embed() returned
+    scheduler = EmbeddingScheduler(provider, max_concurrency=2, base_delay=60, max_delay=60, progress_every=0)
+    with pytest.raises(ValueError):
+        scheduler.embed(["retry", "fatal"])
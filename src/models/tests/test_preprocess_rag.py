@@ -0,0 +1,129 @@
+import glob
+import os
+import pandas as pd
+import pytest
+import preprocess_rag
+
+
+class FakeCollection:
+    """In-memory stand-in for a Chroma collection, recording what each call changed."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = {}
+        self.upserted = []
+        self.deleted = []
+
+    def get(self, include=(), limit=None, offset=0):
+        ids = sorted(self.items)
+        return {"ids": ids[offset:offset + limit] if limit else ids[offset:]}
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        for id_, document, metadata, embedding in zip(ids, documents, metadatas, embeddings):
+            self.items[id_] = (document, metadata, embedding)
+        self.upserted.extend(ids)
+
+    def delete(self, ids):
+        for id_ in ids:
+            self.items.pop(id_, None)
+        self.deleted.extend(ids)
+
+
+class FakeClient:
+    def __init__(self):
+        self.collections = {}
+
+    def get_or_create_collection(self, name, metadata=None):
+        return self.collections.setdefault(name, FakeCollection(name))
+
+    def delete_collection(self, name):
+        del self.collections[name]
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    client = FakeClient()
+    embedded = []
+    generate_text_embeddings = preprocess_rag.generate_text_embeddings
+
+    def counting_embeddings(chunks, *args, **kwargs):
+        embedded.extend(chunks)
+        return generate_text_embeddings(chunks, *args, **kwargs)
+
+    monkeypatch.setattr(preprocess_rag, "OUTPUT_FOLDER", str(tmp_path / "outputs"))
+    monkeypatch.setattr(preprocess_rag, "DATABASE_DIR", str(tmp_path))
+    monkeypatch.setattr(preprocess_rag, "EMBEDDING_PROVIDER", "fake")
+    monkeypatch.setattr(preprocess_rag, "EMBEDDING_RPM", 1000000)
+    monkeypatch.setattr(preprocess_rag, "EMBEDDING_CACHE_PATH", str(tmp_path / "outputs" / "cache.sqlite"))
+    monkeypatch.setattr(preprocess_rag, "VECTOR_STORE", "chroma")
+    monkeypatch.setattr(preprocess_rag, "chroma_client", lambda: client)
+    monkeypatch.setattr(preprocess_rag, "generate_text_embeddings", counting_embeddings)
+
+    def run(reviews):
+        embedded.clear()
+        pd.DataFrame({
+            "uniqueID": range(len(reviews)),
+            "drugName": [f"Drug{i % 2}" for i in range(len(reviews))],
+            "condition": ["Pain"] * len(reviews),
+            "review": reviews,
+            "rating": [5.0] * len(reviews),
+            "date": ["May 20, 2012"] * len(reviews),
+            "usefulCount": [1] * len(reviews),
+        }).to_csv(tmp_path / "reviews.tsv", sep="\t", index=False)
+        preprocess_rag.chunk("reviews.tsv", "char-split", chunk_size=40, chunk_overlap=5, num_workers=1)
+        preprocess_rag.embed("char-split")
+        preprocess_rag.load("char-split")
+        collection = client.get_or_create_collection("char-split-collection")
+        embedding_files = glob.glob(os.path.join(tmp_path, "outputs", "embeddings-char-split-*.jsonl"))
+        current = pd.concat([df for df, _ in preprocess_rag.unique_chunks(embedding_files)], ignore_index=True)
+        return collection, current, list(embedded)
+
+    return run
+
+
+REVIEWS = [
+    "Worked well for my back pain after a week.",
+    "Terrible side effects, I stopped after two days of taking it.",
+    "No change at all.",
+]
+
+
+def test_load_upserts_everything_then_nothing(pipeline):
+    collection, current, embedded = pipeline(REVIEWS)
+    assert set(collection.items) == set(current["id"])
+    assert sorted(collection.upserted) == sorted(current["id"])
+    assert len(embedded) == len(set(current["chunk"]))
+    document, metadata, embedding = collection.items[current["id"][0]]
+    assert document == current["chunk"][0] and metadata == {"drugName": current["drugName"][0]}
+    assert len(embedding) == preprocess_rag.EMBEDDING_DIMENSION
+
+    collection.upserted.clear()
+    collection, current, embedded = pipeline(REVIEWS)
+    assert embedded == []  # every chunk came from the cache
+    assert collection.upserted == [] and collection.deleted == []
+
+
+def test_changed_review_replaces_only_its_chunks(pipeline):
+    collection, before, _ = pipeline(REVIEWS)
+    collection.upserted.clear()
+
+    changed = REVIEWS[:1] + ["Terrible side effects, I stopped after three days of taking it."] + REVIEWS[2:]
+    collection, after, embedded = pipeline(changed)
+
+    new_ids = set(after["id"]) - set(before["id"])
+    stale_ids = set(before["id"]) - set(after["id"])
+    assert new_ids and stale_ids
+    assert set(collection.upserted) == new_ids
+    assert set(collection.deleted) == stale_ids
+    assert set(collection.items) == set(after["id"])
+    # Only chunks of the edited review were embedded again
+    assert set(embedded) == set(after.loc[after["id"].isin(new_ids), "chunk"])
+
+
+def test_rebuild_recreates_the_collection(pipeline):
+    collection, current, _ = pipeline(REVIEWS)
+    collection.items["orphan"] = ("", {}, [])
+    preprocess_rag.load("char-split", rebuild=True)
+    rebuilt = preprocess_rag.chroma_client().get_or_create_collection("char-split-collection")
+    assert rebuilt is not collection
+    assert set(rebuilt.items) == set(current["id"])
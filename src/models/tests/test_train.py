@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+import torch
+from torch import nn
+from torch.utils.data import DataLoader, TensorDataset
+from checkpoint import AsyncCheckpointer, clone_state
+from train import MetricAccumulator, count_corrects, train_model
+
+
+def toy_data(num_samples=96, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    inputs = torch.randn(num_samples, 8, generator=generator)
+    labels = (inputs[:, 0] + 0.5 * inputs[:, 1] > 0).long() + (inputs[:, 2] > 1).long()
+    return TensorDataset(inputs, labels)
+
+
+def toy_model(seed=0):
+    torch.manual_seed(seed)
+    return nn.Sequential(nn.Linear(8, 16), nn.ReLU(), nn.Linear(16, 3))
+
+
+def loaders(batch_size=16):
+    # 100 and 40 samples: the last batch of each is smaller than batch_size
+    return (DataLoader(toy_data(100), batch_size=batch_size),
+            DataLoader(toy_data(40, seed=1), batch_size=batch_size))
+
+
+def run(model, num_epochs, **kwargs):
+    train_loader, val_loader = loaders()
+    optimizer = torch.optim.Adam(model.parameters(), lr=0.01)
+    model = train_model(model, train_loader, val_loader, nn.CrossEntropyLoss(), optimizer, torch.device("cpu"),
+                        num_epochs, **kwargs)
+    return model, optimizer
+
+
+def test_clone_state_is_unaffected_by_later_optimizer_steps():
+    model = toy_model()
+    optimizer = torch.optim.Adam(model.parameters(), lr=0.1)
+    train_loader, _ = loaders()
+    inputs, labels = next(iter(train_loader))
+    nn.CrossEntropyLoss()(model(inputs), labels).backward()
+    optimizer.step()
+
+    before = {key: value.clone() for key, value in model.state_dict().items()}
+    snapshot = clone_state(model.state_dict())
+    optimizer_snapshot = clone_state(optimizer.state_dict())
+    exp_avg = optimizer.state_dict()["state"][0]["exp_avg"].clone()
+    # What the old code did: dict.copy() keeps references to the live tensors
+    shallow = model.state_dict().copy()
+
+    for _ in range(3):
+        optimizer.zero_grad()
+        nn.CrossEntropyLoss()(model(inputs), labels).backward()
+        optimizer.step()
+
+    for key, value in snapshot.items():
+        assert torch.equal(value, before[key])
+        assert not torch.equal(value, model.state_dict()[key])
+        assert torch.equal(shallow[key], model.state_dict()[key])
+    assert torch.equal(optimizer_snapshot["state"][0]["exp_avg"], exp_avg)
+    assert optimizer_snapshot["param_groups"] == optimizer.state_dict()["param_groups"]
+
+
+def test_async_checkpointer_writes_the_state_at_save_time(tmp_path):
+    path = str(tmp_path / "checkpoint.pth")
+    weights = torch.zeros(4)
+    checkpointer = AsyncCheckpointer(path)
+    checkpointer.save({"epoch": 0, "weights": weights})
+    weights += 1  # changing the live tensor after save() must not change what is written
+    checkpointer.save({"epoch": 1, "weights": weights})
+    checkpointer.close()
+    checkpoint = torch.load(path)
+    assert checkpoint["epoch"] == 1 and torch.equal(checkpoint["weights"], torch.ones(4))
+
+
+def test_resume_continues_exactly_where_training_stopped(tmp_path):
+    path = str(tmp_path / "checkpoint.pth")
+    uninterrupted, uninterrupted_optimizer = run(toy_model(), 4)
+
+    run(toy_model(), 2, checkpoint_path=path)
+    checkpoint = torch.load(path)
+    assert checkpoint["epoch"] == 1
+    assert set(checkpoint) == {"epoch", "model", "optimizer", "best_model_wts", "best_val_acc",
+                               "epochs_without_improvement", "rng_state"}
+
+    # A fresh model and optimizer pick up the weights, Adam moments, best weights and epoch count
+    resumed, resumed_optimizer = run(toy_model(seed=1), 4, checkpoint_path=path, resume=True)
+    for key, value in uninterrupted.state_dict().items():
+        torch.testing.assert_close(resumed.state_dict()[key], value)
+    assert resumed_optimizer.state_dict()["state"][0]["step"] == uninterrupted_optimizer.state_dict()["state"][0]["step"]
+    assert torch.load(path)["epoch"] == 3
+
+
+def test_resume_restores_early_stopping_state(tmp_path, capsys):
+    path = str(tmp_path / "checkpoint.pth")
+    run(toy_model(), 2, checkpoint_path=path)
+    checkpoint = torch.load(path)
+    checkpoint["epochs_without_improvement"] = 2
+    torch.save(checkpoint, path)
+    capsys.readouterr()
+
+    model, optimizer = run(toy_model(seed=1), 10, checkpoint_path=path, resume=True, patience=2)
+    output = capsys.readouterr().out
+    assert "Resumed from" in output and "Early stopping" in output and "Epoch 3/10 start" not in output
+    # No further steps were taken; the best weights of the first run are loaded
+    assert optimizer.state_dict()["state"][0]["step"] == checkpoint["optimizer"]["state"][0]["step"]
+    for key, value in checkpoint["best_model_wts"][0].items():
+        assert torch.equal(model.state_dict()[key], value)
+
+
+def test_metric_accumulator_matches_per_batch_item_sums():
+    model = toy_model()
+    criterion = nn.CrossEntropyLoss()
+    _, val_loader = loaders(batch_size=16)
+    metrics = MetricAccumulator(torch.device("cpu"))
+    running_loss, running_corrects = 0.0, 0
+    with torch.no_grad():
+        for inputs, labels in val_loader:
+            outputs = model(inputs)
+            loss = criterion(outputs, labels)
+            metrics.update(loss, outputs, labels, inputs.size(0))
+            # The previous loop: one .item() sync per batch
+            running_loss += loss.item() * inputs.size(0)
+            running_corrects += np.array([(outputs.argmax(1) == labels).sum().item()])
+    loss, acc = metrics.compute()
+    assert loss == pytest.approx(running_loss / len(val_loader.dataset), rel=1e-6)
+    np.testing.assert_allclose(acc, running_corrects / len(val_loader.dataset))
+
+
+def test_metric_accumulator_counts_each_head():
+    labels = [torch.tensor([0, 1, 2, 1]), torch.tensor([1, 1, 0, 0])]
+    outputs = [nn.functional.one_hot(torch.tensor([0, 1, 0, 0]), 3).float(),
+               nn.functional.one_hot(torch.tensor([1, 0, 0, 0]), 2).float()]
+    assert count_corrects(outputs, labels).tolist() == [2, 3]
+    metrics = MetricAccumulator(torch.device("cpu"))
+    metrics.update(torch.tensor(1.5), outputs, labels, 4)
+    metrics.update(torch.tensor(0.5), outputs, labels, 4)
+    loss, acc = metrics.compute()
+    assert loss == pytest.approx(1.0)
+    np.testing.assert_allclose(acc, [0.5, 0.75])
@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+from vector_store import LocalVectorStore, normalize, top_k, train_ivf
+
+
+def clustered_vectors(num_vectors, dimensionality, num_clusters, noise=1.5, seed=0):
+    # Overlapping clusters, so a query's neighbours spread over several IVF lists
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_clusters, dimensionality))
+    points = centers[rng.integers(0, num_clusters, num_vectors)] + noise * rng.standard_normal((num_vectors, dimensionality))
+    return normalize(points).astype(np.float32)
+
+
+@pytest.fixture
+def index(tmp_path):
+    vectors = clustered_vectors(3000, 32, 40)
+    drug_names = [f"drug{i % 7}" for i in range(len(vectors))]
+    ids = [f"id{i}" for i in range(len(vectors))]
+    batches = ((ids[i:i + 1000], drug_names[i:i + 1000], [f"doc {j}" for j in range(i, i + 1000)], vectors[i:i + 1000])
+               for i in range(0, len(vectors), 1000))
+    path = str(tmp_path / "index")
+    LocalVectorStore.build(path, batches, 32, nlist=50)
+    store = LocalVectorStore(path)
+    yield store, vectors, drug_names
+    store.close()
+
+
+def brute_force(vectors, query, k):
+    return list(top_k(vectors @ query, k))
+
+
+def queries(vectors, n, seed=1):
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), n, replace=False)
+    return normalize(vectors[picks] + 0.05 * rng.standard_normal(vectors[picks].shape)).astype(np.float32)
+
+
+def test_top_k_is_sorted_best_first():
+    scores = np.array([0.1, 0.9, 0.5, 0.7, 0.3])
+    assert list(top_k(scores, 3)) == [1, 3, 2]
+    assert list(top_k(scores, 10)) == [1, 3, 2, 4, 0]
+
+
+def test_exact_search_matches_brute_force(index):
+    store, vectors, _ = index
+    row_ids = np.asarray(store.row_ids)
+    for query in queries(vectors, 20):
+        positions, scores = store.search_positions(query, 10, exact=True)
+        assert list(row_ids[positions]) == brute_force(vectors, query, 10)
+        np.testing.assert_allclose(scores, np.sort(vectors @ query)[::-1][:10], rtol=1e-5)
+
+
+def test_ivf_recall_improves_with_nprobe(index):
+    store, vectors, _ = index
+    row_ids = np.asarray(store.row_ids)
+    k = 10
+
+    def recall(nprobe):
+        found = [len(set(row_ids[store.search_positions(query, k, nprobe=nprobe)[0]]) & set(brute_force(vectors, query, k)))
+                 for query in queries(vectors, 50)]
+        return np.mean(found) / k
+
+    recalls = [recall(nprobe) for nprobe in (1, 4, 16, 50)]
+    assert recalls == sorted(recalls)
+    assert recalls[0] < 0.9 <= recalls[2]
+    assert recalls[3] == 1.0  # every list scanned is an exact search
+
+
+def test_filtered_search_only_returns_that_drug(index):
+    store, vectors, drug_names = index
+    mask = np.array([name == "drug3" for name in drug_names])
+    rows = np.flatnonzero(mask)
+    for query in queries(vectors, 10):
+        results = store.search(query, 5, drug_name="drug3")
+        assert [result["drugName"] for result in results] == ["drug3"] * 5
+        assert [result["id"] for result in results] == [f"id{rows[i]}" for i in brute_force(vectors[rows], query, 5)]
+    assert store.search(vectors[0], 5, drug_name="unknown") == []
+
+
+def test_rows_keep_their_id_and_document(index):
+    store, vectors, drug_names = index
+    assert len(store) == len(vectors)
+    result = store.search(vectors[1234], 1, exact=True)[0]
+    assert result == {"id": "id1234", "drugName": drug_names[1234], "document": "doc 1234",
+                      "score": pytest.approx(1.0, abs=1e-5)}
+
+
+def test_ivf_lists_partition_the_rows(index):
+    store, vectors, _ = index
+    assert store.list_offsets[0] == 0 and store.list_offsets[-1] == len(vectors)
+    assert np.all(np.diff(store.list_offsets) >= 0)
+    assert sorted(np.asarray(store.row_ids)) == list(range(len(vectors)))
+    # Each row sits in the list of its nearest centroid
+    lists = np.repeat(np.arange(len(store.centroids)), np.diff(store.list_offsets))
+    np.testing.assert_array_equal(np.argmax(np.asarray(store.vectors) @ store.centroids.T, axis=1), lists)
+
+
+def test_train_ivf_reseeds_empty_lists():
+    # Two distinct points but four lists: duplicate centroids leave lists empty on every iteration
+    sample = np.concatenate([np.tile([1.0, 0, 0], (50, 1)), np.tile([0, 1.0, 0], (50, 1))]).astype(np.float32)
+    centroids = train_ivf(sample, 4, iterations=5, seed=0)
+    assert len(set(np.argmax(sample @ centroids.T, axis=1))) == 2
+    # An empty list restarts from a sample point instead of normalizing a zero sum
+    np.testing.assert_allclose(np.linalg.norm(centroids, axis=1), 1.0, rtol=1e-5)
+    assert {tuple(c) for c in centroids} <= {(1.0, 0.0, 0.0), (0.0, 1.0, 0.0)}
+
+
+def test_build_rejects_empty_input(tmp_path):
+    with pytest.raises(ValueError):
+        LocalVectorStore.build(str(tmp_path / "index"), iter([]), 8)
+
+
+def test_rebuild_replaces_the_index(tmp_path):
+    path = str(tmp_path / "index")
+    first = clustered_vectors(100, 8, 4)
+    LocalVectorStore.build(path, [(list(map(str, range(100))), ["a"] * 100, [""] * 100, first)], 8)
+    second = clustered_vectors(60, 8, 4, seed=1)
+    LocalVectorStore.build(path, [(list(map(str, range(60))), ["b"] * 60, [""] * 60, second)], 8)
+    store = LocalVectorStore(path)
+    assert len(store) == 60 and store.search(second[0], 1, drug_name="a") == []
+    store.close()
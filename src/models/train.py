@@ -1,58 +1,251 @@
+import os
+import time
 import torch
+from torch.nn.parallel import DistributedDataParallel
+from checkpoint import AsyncCheckpointer, clone_state, load_checkpoint
+from distributed import all_reduce_sum, is_distributed, is_main_process, unpadded_samples
+from perf import autocast, bf16_supported, channels_last, compile_model
+
+def prepare_inputs(inputs, device, channels_last_format=False):
+    # Shard-cached batches arrive as uint8; scaling on the device matches ToTensor() and moves 4x fewer bytes
+    inputs = inputs.to(device, non_blocking=True)  # overlaps the copy when batches are pinned
+    if inputs.dtype == torch.uint8:
+        inputs = inputs.float().div_(255)
+    if channels_last_format:
+        inputs = channels_last(inputs)
+    return inputs
+
+def to_device(labels, device):
+    if isinstance(labels, (list, tuple)):
+        return [label.to(device, non_blocking=True) for label in labels]
+    return labels.to(device, non_blocking=True)
+
+def compute_loss(criterion, outputs, labels):
+    # Multi-head models return one output per head; their losses are summed
+    if isinstance(outputs, (list, tuple)):
+        return sum(criterion(output, label) for output, label in zip(outputs, labels))
+    return criterion(outputs, labels)
+
+def take(values, n):
+    # First n samples of a batch, or of each head's outputs/labels
+    if isinstance(values, (list, tuple)):
+        return [value[:n] for value in values]
+    return values[:n]
+
+def count_corrects(outputs, labels):
+    # One count per head (a single-output model has one head), kept on the device
+    if isinstance(outputs, (list, tuple)):
+        return torch.stack([(output.argmax(1) == label).sum() for output, label in zip(outputs, labels)])
+    return (outputs.argmax(1) == labels).sum().view(1)
+
+class MetricAccumulator:
+    """Running loss and per-head correct counts summed on the device.
+
+    update() only queues device ops; the host reads the sums (one sync) in compute(), which
+    also sums them over all processes when training is distributed.
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self.loss_sum = torch.zeros((), device=device)
+        self.corrects = None
+        self.samples = 0
+
+    def update(self, loss, outputs, labels, batch_size):
+        self.loss_sum += loss.detach().float() * batch_size
+        corrects = count_corrects(outputs, labels)
+        self.corrects = corrects if self.corrects is None else self.corrects + corrects
+        self.samples += batch_size
+
+    def compute(self):
+        """(mean loss, per-head accuracy array) over everything seen so far."""
+        corrects = self.corrects if self.corrects is not None else torch.zeros(1, device=self.device)
+        totals = torch.cat([
+            self.loss_sum.view(1).double(),
+            corrects.double(),
+            torch.tensor([self.samples], dtype=torch.float64, device=self.device),
+        ])
+        totals = all_reduce_sum(totals).cpu().numpy()
+        samples = max(totals[-1], 1)
+        return totals[0] / samples, totals[1:-1] / samples
+
+class PhaseTimer:
+    """Wall-clock seconds per training phase.
+
+    Device work is asynchronous on CUDA, so with sync=True each phase ends with a
+    synchronize() to charge the time to the phase that queued it. That costs throughput,
+    so it is only for profiling runs.
+    """
+
+    def __init__(self, device, sync=False):
+        self.sync = sync and device.type == "cuda"
+        self.totals = {}
+        self.last = time.perf_counter()
+
+    def reset(self):
+        self.totals = {}
+        self.last = time.perf_counter()
+
+    def mark(self, phase):
+        if self.sync:
+            torch.cuda.synchronize()
+        now = time.perf_counter()
+        self.totals[phase] = self.totals.get(phase, 0.0) + now - self.last
+        self.last = now
+
+    def summary(self):
+        total = sum(self.totals.values()) or 1.0
+        phases = ", ".join(f"{phase} {seconds:.2f}s ({100 * seconds / total:.0f}%)" for phase, seconds in self.totals.items())
+        return f"{total:.2f}s = {phases}"
+
+def selection_groups(model):
+    # Independent models trained from the same batches (models.ModelPair) each keep their own best
+    # epoch; a single or shared-backbone model is selected as a whole on its mean head accuracy
+    if hasattr(model, "members"):
+        return [(member, [head]) for head, member in enumerate(model.members())]
+    return [(model, None)]
+
+def format_acc(head_accs):
+    if len(head_accs) == 1:
+        return f"{head_accs[0]:.4f}"
+    return f"{head_accs.mean():.4f} (" + ", ".join(f"{acc:.4f}" for acc in head_accs) + ")"
+
+def evaluate(model, forward, dataloader, criterion, device, perf_mode, use_bf16):
+    model.eval()
+    metrics = MetricAccumulator(device)
+    # Distributed: every process runs all of its batches (the same number on each), but the
+    # padding DistributedSampler adds is left out of the metrics so each sample counts once
+    remaining = unpadded_samples(dataloader)
+    with torch.no_grad():
+        for inputs, labels in dataloader:
+            inputs = prepare_inputs(inputs, device, perf_mode)
+            labels = to_device(labels, device)
+
+            with autocast(device, use_bf16):
+                outputs = forward(inputs)
+                batch_size = inputs.size(0)
+                if remaining is not None:
+                    batch_size = min(batch_size, remaining)
+                    remaining -= batch_size
+                    outputs, labels = take(outputs, batch_size), take(labels, batch_size)
+                if batch_size == 0:
+                    continue
+                loss = compute_loss(criterion, outputs, labels)
+
+            metrics.update(loss, outputs, labels, batch_size)
+    return metrics.compute()
+
+def train_model(model, train_dataloader, val_dataloader, criterion, optimizer, device, num_epochs, perf_mode=False,
+                checkpoint_path=None, resume=False, patience=None, log_every=None, val_every=1, time_phases=False):
+    # perf_mode: bfloat16 autocast (if the device supports it), channels_last inputs and a compiled
+    # forward. The compiled module shares the model's parameters, so snapshots still use model.
+    # checkpoint_path: model, optimizer, best weights and epoch are written there (in the background)
+    # after every epoch; resume=True continues from it if it exists.
+    # patience: stop after this many validations without a validation accuracy improvement.
+    # log_every: also print running train metrics every N steps (each print is one device sync);
+    # otherwise metrics are read back once per epoch.
+    # val_every: validate every N epochs (and always after the last one).
+    # time_phases: synchronize the device between phases so the per-phase times are exact (CUDA).
+    # Distributed: gradients are averaged across processes by DDP; metrics are summed over all
+    # of them, so every process takes the same best-weight and early-stopping decisions
+    # (validation leaves out DistributedSampler's padding). Only the main process writes checkpoints.
+    use_bf16 = perf_mode and bf16_supported(device)
+    forward = model
+    if is_distributed():
+        forward = DistributedDataParallel(model, device_ids=[device] if device.type == "cuda" else None)
+    if perf_mode:
+        forward = compile_model(forward)
+    if perf_mode:
+        print(f"Performance mode: bf16 autocast {'on' if use_bf16 else 'unsupported, fp32'}, channels_last, compiled forward")
+
+    groups = selection_groups(model)
+    best_model_wts = [None] * len(groups)
+    best_val_acc = [0.0] * len(groups)
+    start_epoch = 0
+    epochs_without_improvement = 0
+    if resume and checkpoint_path and os.path.exists(checkpoint_path):
+        checkpoint = load_checkpoint(checkpoint_path, model, optimizer, device)
+        best_model_wts = checkpoint["best_model_wts"]
+        best_val_acc = checkpoint["best_val_acc"]
+        start_epoch = checkpoint["epoch"] + 1
+        epochs_without_improvement = checkpoint["epochs_without_improvement"]
+        print(f"Resumed from {checkpoint_path} after epoch {start_epoch}")
+    elif resume:
+        print(f"No checkpoint at {checkpoint_path}, starting from scratch")
+    checkpointer = AsyncCheckpointer(checkpoint_path) if checkpoint_path and is_main_process() else None
+    timer = PhaseTimer(device, sync=time_phases)
+
+    for epoch in range(start_epoch, num_epochs):
+        if patience and epochs_without_improvement >= patience:
+            print(f"Early stopping: no validation improvement in {patience} validations")
+            break
 
-def train_model(model, train_dataloader, val_dataloader, criterion, optimizer, device, num_epochs):
-    best_model_wts = None 
-    best_val_acc = 0.0     
-    for epoch in range(num_epochs):
         model.train()
-        running_loss = 0.0
-        running_corrects = 0
+        metrics = MetricAccumulator(device)
 
         print(f"\nEpoch {epoch+1}/{num_epochs} start...")
-        for inputs, labels in train_dataloader:
-            inputs = inputs.to(device)
-            labels = labels.to(device)
+        if hasattr(train_dataloader.sampler, "set_epoch"):
+            train_dataloader.sampler.set_epoch(epoch)  # a different DistributedSampler shuffle each epoch
+        timer.reset()
+        for step, (inputs, labels) in enumerate(train_dataloader, 1):
+            inputs = prepare_inputs(inputs, device, perf_mode)
+            labels = to_device(labels, device)
+            timer.mark("data")
 
             optimizer.zero_grad()
-            outputs = model(inputs)
-            loss = criterion(outputs, labels)
+            with autocast(device, use_bf16):
+                outputs = forward(inputs)
+                loss = compute_loss(criterion, outputs, labels)
+            timer.mark("forward")
             loss.backward()
+            timer.mark("backward")
             optimizer.step()
+            metrics.update(loss, outputs, labels, inputs.size(0))
+            timer.mark("optimizer")
 
-            running_loss += loss.item() * inputs.size(0)
-            running_corrects += (outputs.argmax(1) == labels).sum().item()
-
-        epoch_loss = running_loss / len(train_dataloader.dataset)
-        epoch_acc = running_corrects / len(train_dataloader.dataset)
-
-        print(f'Epoch {epoch+1}/{num_epochs}, Train Loss: {epoch_loss:.4f}, Train Acc: {epoch_acc:.4f}')
-
-        model.eval()
-        val_loss = 0.0
-        val_corrects = 0
-
-        with torch.no_grad():
-            for inputs, labels in val_dataloader:
-                inputs = inputs.to(device)
-                labels = labels.to(device)
+            if log_every and step % log_every == 0:
+                step_loss, step_acc = metrics.compute()
+                print(f'Epoch {epoch+1}/{num_epochs}, Step {step}/{len(train_dataloader)}, Train Loss: {step_loss:.4f}, Train Acc: {format_acc(step_acc)}')
+                timer.mark("logging")
 
-                outputs = model(inputs)
-                loss = criterion(outputs, labels)
+        epoch_loss, epoch_acc = metrics.compute()
+        print(f'Epoch {epoch+1}/{num_epochs}, Train Loss: {epoch_loss:.4f}, Train Acc: {format_acc(epoch_acc)}')
+        timer.mark("metrics")
 
-                val_loss += loss.item() * inputs.size(0)
-                val_corrects += (outputs.argmax(1) == labels).sum().item()
+        if (epoch + 1) % val_every == 0 or epoch + 1 == num_epochs:
+            val_epoch_loss, val_epoch_acc = evaluate(model, forward, val_dataloader, criterion, device, perf_mode, use_bf16)
+            timer.mark("validation")
+            print(f'Epoch {epoch+1}/{num_epochs}, Val Loss: {val_epoch_loss:.4f}, Val Acc: {format_acc(val_epoch_acc)}')
 
-        val_epoch_loss = val_loss / len(val_dataloader.dataset)
-        val_epoch_acc = val_corrects / len(val_dataloader.dataset)
+            # state_dict() returns references to the live parameters, so the best weights are cloned
+            improved = False
+            for group, (module, heads) in enumerate(groups):
+                group_acc = float(val_epoch_acc.mean() if heads is None else val_epoch_acc[heads].mean())
+                if group_acc > best_val_acc[group]:
+                    best_val_acc[group] = group_acc
+                    best_model_wts[group] = clone_state(module.state_dict())
+                    improved = True
+            epochs_without_improvement = 0 if improved else epochs_without_improvement + 1
 
-        print(f'Epoch {epoch+1}/{num_epochs}, Val Loss: {val_epoch_loss:.4f}, Val Acc: {val_epoch_acc:.4f}')
+        if checkpointer is not None:
+            checkpointer.save({
+                "epoch": epoch,
+                "model": model.state_dict(),
+                "optimizer": optimizer.state_dict(),
+                "best_model_wts": best_model_wts,
+                "best_val_acc": best_val_acc,
+                "epochs_without_improvement": epochs_without_improvement,
+                "rng_state": torch.get_rng_state(),
+            })
+            timer.mark("checkpoint")
+        print(f"Epoch {epoch+1}/{num_epochs} time: {timer.summary()}")
 
-        if val_epoch_acc > best_val_acc:
-            best_val_acc = val_epoch_acc
-            best_model_wts = model.state_dict().copy()  
+    if checkpointer is not None:
+        checkpointer.close()
 
-    if best_model_wts is not None:
-        model.load_state_dict(best_model_wts)
-        print(f"Best model loaded with Val Acc: {best_val_acc:.4f}")
+    for (module, _), wts, acc in zip(groups, best_model_wts, best_val_acc):
+        if wts is not None:
+            module.load_state_dict(wts)
+            print(f"Best model loaded with Val Acc: {acc:.4f}")
 
     return model
@@ -1,23 +1,40 @@
 import torch
 import pandas as pd
 from PIL import Image
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, Subset
+from torch.utils.data.distributed import DistributedSampler
 from torchvision import transforms
 import os
+from shard_cache import ShardReader
 
 class PillDataset(Dataset):
-    def __init__(self, annotations_file, data_dir, transform=None, color=True):
+    def __init__(self, annotations_file, data_dir, transform=None, color=True, multi_label=False, shard_dir=None):
         self.data = pd.read_csv(annotations_file)
         self.data_dir = data_dir
         self.transform = transform
         self.col_idx = -2 if color else -3
+        # multi_label: return (color_label, shape_label) for a two-head model
+        self.multi_label = multi_label
+        # shard_dir: read pre-resized uint8 images written by shard_cache.py instead of decoding JPEGs
+        self.shards = ShardReader(shard_dir) if shard_dir else None
+        # Column arrays looked up once instead of a pandas .loc/.iloc per sample
+        self.image_names = self.data['splimage'].tolist()
+        self.color_labels = self.data.iloc[:, -2].astype(int).tolist()
+        self.shape_labels = self.data.iloc[:, -3].astype(int).tolist()
 
     def __getitem__(self, idx):
-        img_path = os.path.join(self.data_dir, self.data.loc[idx, 'splimage'] + ".jpg")
-        image = Image.open(img_path).convert("RGB")
-        label = int(self.data.iloc[idx, self.col_idx])  # 整数编码后的标签
+        if self.shards is not None:
+            # (3, H, W) uint8 view of the memory-mapped shard; train.py scales it to [0, 1] on device
+            image = torch.from_numpy(self.shards[self.image_names[idx]]).permute(2, 0, 1)
+        else:
+            img_path = os.path.join(self.data_dir, self.image_names[idx] + ".jpg")
+            image = Image.open(img_path).convert("RGB")
+        if self.multi_label:
+            label = (self.color_labels[idx], self.shape_labels[idx])
+        else:
+            label = self.color_labels[idx] if self.col_idx == -2 else self.shape_labels[idx]  # 整数编码后的标签
 
-        if self.transform:
+        if self.transform and self.shards is None:
             image = self.transform(image)
 
         return image, label
@@ -26,13 +43,61 @@ class PillDataset(Dataset):
         return len(self.data)
 
 
-def load_data(csv_file, data_dir, batch_size, shuffle=True, color=True):
+def available_cpus():
+    # Respects CPU affinity/cgroup pinning where the platform exposes it
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def default_num_workers():
+    # Leave one core for the training loop itself; a handful of workers saturates a GPU at 224px.
+    # Distributed processes on the same host (torchrun's LOCAL_WORLD_SIZE) share the cores.
+    local_processes = int(os.environ.get("LOCAL_WORLD_SIZE", 1))
+    return min(8, max(0, available_cpus() // local_processes - 1))
+
+
+def load_data(csv_file, data_dir, batch_size, shuffle=True, color=True, multi_label=False, shard_dir=None,
+              num_workers=None, pin_memory=None, prefetch_factor=None, persistent_workers=None, distributed=False):
+    """Builds the PillDataset DataLoader. Loader options left as None are sized automatically:
+    num_workers from the available CPUs, pin_memory when CUDA is available, prefetch_factor 2
+    batches per worker and persistent workers whenever there are workers.
+    distributed: each process of the process group reads its own 1/world_size of the data."""
+    if num_workers is None:
+        num_workers = default_num_workers()
+    if pin_memory is None:
+        pin_memory = torch.cuda.is_available()
+    if persistent_workers is None:
+        persistent_workers = num_workers > 0
+
     transform = transforms.Compose([
         transforms.Resize((224, 224)),
         transforms.ToTensor(),
     ])
 
-    dataset = PillDataset(annotations_file=csv_file, data_dir=data_dir, transform=transform, color=color)
-    dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=shuffle)
+    dataset = PillDataset(annotations_file=csv_file, data_dir=data_dir, transform=transform, color=color, multi_label=multi_label, shard_dir=shard_dir)
+    worker_options = {}
+    if num_workers > 0:
+        # Only valid with worker processes
+        worker_options = dict(prefetch_factor=prefetch_factor or 2, persistent_workers=persistent_workers)
+    sampler = DistributedSampler(dataset, shuffle=shuffle) if distributed else None
+    dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=shuffle and sampler is None, sampler=sampler,
+                            num_workers=num_workers, pin_memory=pin_memory, **worker_options)
+
+    return dataloader
 
-    return dataloader
\ No newline at end of file
+def subsample_loader(dataloader, fraction, seed=0):
+    """Same DataLoader over a fixed random fraction of its dataset (e.g. a cheaper validation set).
+    The subset is drawn once, so every epoch is scored on the same samples."""
+    if fraction >= 1:
+        return dataloader
+    dataset = dataloader.dataset
+    size = max(1, int(len(dataset) * fraction))
+    indices = torch.randperm(len(dataset), generator=torch.Generator().manual_seed(seed))[:size].tolist()
+    worker_options = {}
+    if dataloader.num_workers > 0:
+        worker_options = dict(prefetch_factor=dataloader.prefetch_factor, persistent_workers=dataloader.persistent_workers)
+    subset = Subset(dataset, sorted(indices))
+    sampler = DistributedSampler(subset, shuffle=False) if isinstance(dataloader.sampler, DistributedSampler) else None
+    return DataLoader(subset, batch_size=dataloader.batch_size, shuffle=False, sampler=sampler,
+                      num_workers=dataloader.num_workers, pin_memory=dataloader.pin_memory, **worker_options)
@@ -0,0 +1,182 @@
+"""
+Vector store backends for the RAG collection.
+
+Both return search results as dicts with id, score (cosine similarity), drugName and document:
+- ChromaStore: a collection on the Chroma HTTP server (what load() has always used).
+- LocalVectorStore: an embedded index in a directory, searched in process with no server. Bulk
+  built from the embedding files, it holds
+    vectors.npy        unit-normalized float32 matrix, memory-mapped, rows grouped by IVF list
+    centroids.npy      IVF (k-means) centroids and list_offsets.npy, the rows of each list
+    rows.jsonl         id, drugName and document of each row, read by byte range (row_offsets.npy)
+    drug_positions.npy rows grouped by drugName (drug_offsets.npy, drug_names.json), for filtering
+  Unfiltered searches scan the nprobe lists closest to the query (IVF), or every row with
+  exact=True. Searches filtered on drugName are always exact over that drug's rows.
+"""
+
+import os
+import json
+import time
+import shutil
+import numpy as np
+
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores, k):
+    """Indices of the k highest scores, best first."""
+    if len(scores) > k:
+        candidates = np.argpartition(-scores, k)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def train_ivf(sample, nlist, iterations=10, seed=0):
+    """Spherical k-means centroids of unit vectors."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        counts = np.bincount(assignment, minlength=nlist)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(sample[np.argsort(assignment, kind="stable")], starts[~empty])
+        # Empty lists restart from random points rather than staying unused
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        centroids = normalize(sums).astype(np.float32)
+    return centroids
+
+
+class ChromaStore:
+    def __init__(self, host, port, collection_name):
+        import chromadb
+        self.client = chromadb.HttpClient(host=host, port=port)
+        self.collection = self.client.get_or_create_collection(name=collection_name, metadata={"hnsw:space": "cosine"})
+
+    def search(self, vector, k=5, drug_name=None):
+        where = {"drugName": drug_name} if drug_name else None
+        results = self.collection.query(query_embeddings=[list(vector)], n_results=k, where=where)
+        return [{"id": id_, "score": 1 - distance, "drugName": metadata["drugName"], "document": document}
+                for id_, distance, metadata, document in zip(results["ids"][0], results["distances"][0],
+                                                             results["metadatas"][0], results["documents"][0])]
+
+
+class LocalVectorStore:
+    def __init__(self, path, nprobe=16):
+        self.path = path
+        self.nprobe = nprobe
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.centroids = np.load(os.path.join(path, "centroids.npy"))
+        self.list_offsets = np.load(os.path.join(path, "list_offsets.npy"))
+        self.row_ids = np.load(os.path.join(path, "row_ids.npy"), mmap_mode="r")
+        self.row_offsets = np.load(os.path.join(path, "row_offsets.npy"), mmap_mode="r")
+        self.drug_positions = np.load(os.path.join(path, "drug_positions.npy"), mmap_mode="r")
+        self.drug_offsets = np.load(os.path.join(path, "drug_offsets.npy"))
+        with open(os.path.join(path, "drug_names.json")) as f:
+            self.drug_codes = {name: code for code, name in enumerate(json.load(f))}
+        # Rows are read with pread, so concurrent searches need no lock around a file position
+        self.rows_fd = os.open(os.path.join(path, "rows.jsonl"), os.O_RDONLY)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @staticmethod
+    def build(path, batches, dimensionality, nlist=None, sample_size=65536, seed=0):
+        """Writes an index at path from (ids, drug_names, documents, vectors) batches.
+
+        nlist defaults to about sqrt(rows); the IVF centroids are trained on up to sample_size
+        rows. The index is written next to path and swapped in when complete.
+        """
+        start = time.perf_counter()
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        # Pass 1: normalized vectors in arrival order, rows.jsonl with its offsets, drug codes
+        drug_codes, codes, row_offsets, count = {}, [], [], 0
+        with open(os.path.join(tmp, "unsorted.f32"), "wb") as vector_file, open(os.path.join(tmp, "rows.jsonl"), "wb") as rows:
+            for ids, drug_names, documents, vectors in batches:
+                vectors = normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, dimensionality))
+                vector_file.write(vectors.astype(np.float32).tobytes())
+                for id_, drug_name, document in zip(ids, drug_names, documents):
+                    row_offsets.append(rows.tell())
+                    rows.write((json.dumps({"id": id_, "drugName": drug_name, "document": document}) + "\n").encode())
+                    codes.append(drug_codes.setdefault(drug_name, len(drug_codes)))
+                count += len(vectors)
+            row_offsets.append(rows.tell())
+        if not count:
+            raise ValueError("No embeddings to index")
+        unsorted = np.memmap(os.path.join(tmp, "unsorted.f32"), dtype=np.float32, mode="r", shape=(count, dimensionality))
+
+        # Pass 2: IVF lists, trained on a sample and assigned in blocks
+        nlist = min(count, nlist or max(1, int(np.sqrt(count))))
+        rng = np.random.default_rng(seed)
+        sample = unsorted[np.sort(rng.choice(count, min(count, max(sample_size, nlist)), replace=False))]
+        centroids = train_ivf(np.asarray(sample), nlist, seed=seed)
+        assignment = np.concatenate([np.argmax(unsorted[i:i + 65536] @ centroids.T, axis=1)
+                                     for i in range(0, count, 65536)])
+        row_ids = np.argsort(assignment, kind="stable")
+
+        # Pass 3: vectors rewritten so each list is one contiguous block
+        vectors = np.lib.format.open_memmap(os.path.join(tmp, "vectors.npy"), mode="w+", dtype=np.float32,
+                                            shape=(count, dimensionality))
+        for i in range(0, count, 65536):
+            vectors[i:i + 65536] = unsorted[row_ids[i:i + 65536]]
+        vectors.flush()
+        del vectors, unsorted
+        os.remove(os.path.join(tmp, "unsorted.f32"))
+
+        codes = np.asarray(codes, dtype=np.int32)[row_ids]
+        drug_positions = np.argsort(codes, kind="stable")
+        np.save(os.path.join(tmp, "centroids.npy"), centroids)
+        np.save(os.path.join(tmp, "list_offsets.npy"), np.searchsorted(assignment[row_ids], np.arange(nlist + 1)))
+        np.save(os.path.join(tmp, "row_ids.npy"), row_ids)
+        np.save(os.path.join(tmp, "row_offsets.npy"), np.asarray(row_offsets, dtype=np.int64))
+        np.save(os.path.join(tmp, "drug_positions.npy"), drug_positions)
+        np.save(os.path.join(tmp, "drug_offsets.npy"), np.searchsorted(codes[drug_positions], np.arange(len(drug_codes) + 1)))
+        with open(os.path.join(tmp, "drug_names.json"), "w") as f:
+            json.dump(list(drug_codes), f)
+
+        if os.path.exists(path):
+            shutil.rmtree(path + ".old", ignore_errors=True)
+            os.replace(path, path + ".old")
+        os.replace(tmp, path)
+        shutil.rmtree(path + ".old", ignore_errors=True)
+        print(f"Indexed {count} vectors in {nlist} lists, {len(drug_codes)} drugs, at {path} "
+              f"({time.perf_counter() - start:.1f}s)")
+
+    def search_positions(self, query, k=5, drug_name=None, nprobe=None, exact=False):
+        """(positions, scores) of the k rows most similar to query."""
+        nprobe = nprobe or self.nprobe
+        query = normalize(np.asarray(query, dtype=np.float32))
+        if drug_name is not None:
+            code = self.drug_codes.get(drug_name)
+            if code is None:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            positions = np.sort(self.drug_positions[self.drug_offsets[code]:self.drug_offsets[code + 1]])
+            scores = self.vectors[positions] @ query
+        elif exact or nprobe >= len(self.centroids):
+            positions = np.arange(len(self.vectors))
+            scores = np.concatenate([self.vectors[i:i + 65536] @ query for i in range(0, len(self.vectors), 65536)])
+        else:
+            lists = top_k(self.centroids @ query, nprobe)
+            positions = np.concatenate([np.arange(self.list_offsets[l], self.list_offsets[l + 1]) for l in lists])
+            scores = np.concatenate([self.vectors[self.list_offsets[l]:self.list_offsets[l + 1]] @ query for l in lists])
+        best = top_k(scores, k)
+        return positions[best], scores[best]
+
+    def row(self, position):
+        row = self.row_ids[position]
+        start, end = int(self.row_offsets[row]), int(self.row_offsets[row + 1])
+        return json.loads(os.pread(self.rows_fd, end - start, start))
+
+    def search(self, vector, k=5, drug_name=None, nprobe=None, exact=False):
+        positions, scores = self.search_positions(vector, k, drug_name, nprobe, exact)
+        return [dict(self.row(position), score=float(score)) for position, score in zip(positions, scores)]
+
+    def close(self):
+        os.close(self.rows_fd)